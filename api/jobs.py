@@ -0,0 +1,197 @@
+"""
+测试运行任务队列
+职责：POST /run 只负责入队并立即返回 job_id，由固定数量的后台线程按优先级执行，
+      请求处理线程不再被整套测试占住；相同参数的排队/运行中任务合并为一个（single-flight）
+      运行中的进度事件可订阅（POST /run/stream），后加入的订阅者先回放已产生的事件
+"""
+import asyncio
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = ("queued", "running")
+
+# 每个任务保留用于回放的进度事件上限（一个用例一条）
+MAX_REPLAY = 10_000
+
+
+@dataclass
+class Job:
+    """一次测试运行任务"""
+    id: str
+    key: str
+    params: dict
+    priority: int = 0
+    status: str = "queued"          # queued / running / done / failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    events: deque = field(default_factory=lambda: deque(maxlen=MAX_REPLAY), repr=False)
+    listeners: list = field(default_factory=list, repr=False)     # queue.Queue / AsyncListener
+
+    def final_event(self) -> dict:
+        if self.status == "done":
+            return {"type": "result", **self.result}
+        return {"type": "error", "detail": self.error}
+
+    def summary(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class AsyncListener:
+    """
+    订阅端在事件循环上时使用：工作线程的 put 转交给 asyncio.Queue，
+    读取方 await get()，流式接口不必为每个客户端占住一个线程池线程
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def put(self, item):
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except RuntimeError:        # 事件循环已关闭（客户端断开后的收尾阶段）
+            pass
+
+    async def get(self):
+        return await self._queue.get()
+
+
+class JobQueue:
+    """
+    优先级任务队列（priority 越大越先执行，同优先级先进先出）
+
+    handler(params, on_event) -> result dict；抛出异常或返回 {"error": "..."} 视为失败
+    on_event 接收进度事件，转发给该任务的订阅者
+    """
+
+    def __init__(self, handler: Callable[[dict, Callable[[dict], None]], dict],
+                 concurrency: int = 1, max_history: int = 200):
+        self._handler = handler
+        self._concurrency = max(1, concurrency)
+        self._max_history = max_history
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._active: dict[str, Job] = {}         # key → 排队/运行中的 job
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self._concurrency):
+            t = threading.Thread(target=self._work, name=f"run-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"JobQueue: started {self._concurrency} workers")
+
+    # ── 生产端 ───────────────────────────────────────────
+
+    def submit(self, params: dict, priority: int = 0) -> tuple[Job, bool]:
+        """入队；已有相同参数的排队/运行中任务时直接返回它。返回 (job, 是否新建)"""
+        key = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            existing = self._active.get(key)
+            if existing is not None:
+                return existing, False
+            job = Job(id=uuid.uuid4().hex, key=key, params=params, priority=priority)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._prune()
+        self._queue.put((-priority, next(self._seq), job))
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, limit: int = 50) -> list[dict]:
+        with self._lock:
+            jobs = list(self._jobs.values())[-limit:]
+        return [j.summary() for j in reversed(jobs)]
+
+    def subscribe(self, job: Job, events=None):
+        """
+        订阅任务进度：先回放已产生的事件，之后实时推送；
+        任务结束时推送最终事件（{"type": "result", ...} 或 {"type": "error", ...}）和 None
+        events：带 put() 的接收端，默认新建 queue.Queue；异步接口传入 AsyncListener
+        """
+        events = queue.Queue() if events is None else events
+        with self._lock:
+            for event in job.events:
+                events.put(event)
+            if job.status in PENDING:
+                job.listeners.append(events)
+            else:
+                events.put(job.final_event())
+                events.put(None)
+        return events
+
+    def unsubscribe(self, job: Job, events):
+        """订阅者提前离开（客户端断开）"""
+        with self._lock:
+            if events in job.listeners:
+                job.listeners.remove(events)
+
+    def _emit(self, job: Job, event: dict):
+        with self._lock:
+            job.events.append(event)
+            for listener in job.listeners:
+                listener.put(event)
+
+    # ── 消费端（后台线程）────────────────────────────────
+
+    def _work(self):
+        while True:
+            _, _, job = self._queue.get()
+            with self._lock:
+                job.status, job.started_at = "running", time.time()
+            try:
+                result = self._handler(job.params, lambda event: self._emit(job, event))
+                error = result["error"] if isinstance(result.get("error"), str) else None
+            except Exception as e:
+                logger.exception(f"JobQueue: job {job.id} failed")
+                result, error = None, f"{type(e).__name__}: {e}"
+            with self._lock:
+                # 结果 / 错误先于状态写入且同在锁内：任何人读到 done / failed 时结果都已就绪
+                if error is None:
+                    job.result = result
+                else:
+                    job.error = error
+                job.finished_at = time.time()
+                job.status = "failed" if error is not None else "done"
+                self._active.pop(job.key, None)
+                for listener in job.listeners:
+                    listener.put(job.final_event())
+                    listener.put(None)
+                job.listeners.clear()
+                job.events.clear()
+            self._queue.task_done()
+
+    def _prune(self):
+        """只保留最近 max_history 个已结束任务（调用方持锁）"""
+        finished = [j.id for j in self._jobs.values() if j.status not in PENDING]
+        for job_id in finished[:max(0, len(finished) - self._max_history)]:
+            del self._jobs[job_id]
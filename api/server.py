@@ -2,9 +2,19 @@
 REST API 层
 脱离 AI 独立使用：CI/CD、前端、脚本均可调用
 启动：uvicorn api.server:app --reload --port 8080
+
+可选常驻执行池（省去每次启动 pytest 子进程的开销）：
+  WARM_EXECUTORS=2 WARM_EXECUTOR_MAX_RUNS=50 uvicorn api.server:app --port 8080
+
+POST /run 异步入队，立即返回 job_id；并发数由 RUN_CONCURRENCY 控制（默认 1）
+POST /run/stream 同样入队，并以 NDJSON 推送该任务的进度
 """
+import asyncio
+import json
+import os
+
 from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 import sys
@@ -12,6 +22,8 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from core import TestRunner, TestStorage, Reporter
+from core.executor import WarmExecutor
+from api.jobs import AsyncListener, JobQueue
 
 app = FastAPI(
     title="pytest Test Platform API",
@@ -19,8 +31,18 @@ app = FastAPI(
     version="1.0.0",
 )
 
-runner = TestRunner()
+WARM_EXECUTORS = int(os.environ.get("WARM_EXECUTORS", "0"))
+WARM_EXECUTOR_MAX_RUNS = int(os.environ.get("WARM_EXECUTOR_MAX_RUNS", "50"))
+RUN_CONCURRENCY = int(os.environ.get("RUN_CONCURRENCY", "1"))
+
+executor = None
+if WARM_EXECUTORS > 0:
+    executor = WarmExecutor(size=WARM_EXECUTORS, max_runs=WARM_EXECUTOR_MAX_RUNS,
+                            warmup=["tests/"])
+    executor.start()
+
 storage = TestStorage()
+runner = TestRunner(storage=storage, executor=executor)
 reporter = Reporter()
 
 
@@ -28,17 +50,83 @@ class RunRequest(BaseModel):
     path: str = "tests/"
     markers: Optional[str] = None
     test_id: Optional[str] = None
+    coverage: bool = False
+    changed_since: Optional[str] = None     # git 版本：只运行受影响用例
+    failure_first: bool = False             # 最近失败 / flaky / 新增用例优先
+    fail_fast: Optional[int] = None         # 确认 N 个失败后中止
+    priority: int = 0                       # 越大越先执行，不参与去重
+
+
+def _execute(params: dict, on_event) -> dict:
+    """任务队列后台线程：执行测试，保存结果并生成报告"""
+    result = runner.run(**params, on_event=on_event)
+    if not isinstance(result.get("error"), str):
+        storage.save(result)
+        reporter.generate_html(result, storage.get_trend())
+    return result
 
 
-@app.post("/run", summary="执行测试")
+jobs = JobQueue(_execute, concurrency=RUN_CONCURRENCY)
+jobs.start()
+
+
+@app.post("/run", status_code=202, summary="提交测试任务")
 def run_tests(req: RunRequest):
-    """触发 pytest 执行，保存结果并返回摘要"""
-    result = runner.run(path=req.path, markers=req.markers, test_id=req.test_id)
-    if "error" in result:
-        raise HTTPException(status_code=500, detail=result["error"])
-    storage.save(result)
-    reporter.generate_html(result, storage.get_trend())
-    return result
+    """入队后立即返回 job_id；相同参数的任务正在排队/运行时直接复用"""
+    job, created = jobs.submit(req.model_dump(exclude={"priority"}), priority=req.priority)
+    return {"job_id": job.id, "status": job.status, "deduplicated": not created}
+
+
+@app.get("/jobs", summary="最近的测试任务")
+def list_jobs(limit: int = Query(50, ge=1, le=200)):
+    return jobs.list(limit)
+
+
+@app.get("/jobs/{job_id}", summary="任务状态")
+def job_status(job_id: str):
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"job {job_id!r} 不存在或已过期")
+    return job.summary()
+
+
+@app.get("/jobs/{job_id}/result", summary="任务结果")
+def job_result(job_id: str):
+    """完成返回运行结果；未完成返回 202 + 当前状态；失败返回 500"""
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"job {job_id!r} 不存在或已过期")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != "done":
+        return JSONResponse(status_code=202, content=job.summary())
+    return job.result
+
+
+@app.post("/run/stream", summary="执行测试（NDJSON 实时进度）")
+async def run_tests_stream(req: RunRequest):
+    """
+    与 POST /run 一样入队（受 RUN_CONCURRENCY 与优先级约束，相同参数合并为一个任务），
+    逐行推送该任务的事件（application/x-ndjson）：
+      {"type": "job", "job_id": ..., "status": ..., "deduplicated": bool}   第一条
+      {"type": "collected", "count": N}
+      {"type": "test", "nodeid": ..., "outcome": ..., "progress": 0-100}
+      {"type": "result", ...}   最后一条，内容同 GET /jobs/{job_id}/result；出错时为 {"type": "error", "detail": ...}
+    """
+    job, created = jobs.submit(req.model_dump(exclude={"priority"}), priority=req.priority)
+    # 在事件循环上等待事件：整个运行期间不占用线程池线程（否则并发流会饿死 /health 等同步接口）
+    events = jobs.subscribe(job, AsyncListener(asyncio.get_running_loop()))
+
+    async def stream():
+        head = {"type": "job", "job_id": job.id, "status": job.status, "deduplicated": not created}
+        try:
+            yield json.dumps(head, ensure_ascii=False) + "\n"
+            while (event := await events.get()) is not None:
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        finally:
+            jobs.unsubscribe(job, events)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 @app.get("/report/last", summary="最近一次报告")
@@ -64,6 +152,11 @@ def failure_stats(limit: int = Query(50, ge=1, le=200)):
     return storage.get_failure_stats(limit)
 
 
+@app.get("/report/durations/stats", summary="用例耗时统计")
+def duration_stats(limit: int = Query(20, ge=1, le=200)):
+    return storage.get_duration_stats(limit)
+
+
 @app.get("/report/html", summary="查看 HTML 报告", response_class=FileResponse)
 def html_report():
     p = Path("reports/report.html")
@@ -0,0 +1,4 @@
+"""
+性能基准脚本（不随平台运行，按需手动执行）
+  python -m benchmarks.<name> --help
+"""
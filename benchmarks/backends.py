@@ -0,0 +1,108 @@
+"""
+存储引擎对比：sqlite vs memory
+同一批合成 payload 分别写入两个引擎，比较写入吞吐与各查询方法的耗时（取 --repeat 次最快）
+
+  python -m benchmarks.backends --runs 2000 --tests 500 --fail-rate 0.02
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from benchmarks.synthetic import make_payload, nodeids
+from master.core.backend import BACKENDS, open_backend
+
+PROJECT = "bench"
+
+
+def _queries(storage, latest: str, previous: str) -> dict:
+    """查询名 → 无参调用；覆盖 StorageBackend 的全部读方法"""
+    return {
+        "get_runs": lambda: storage.get_runs(project=PROJECT, limit=50),
+        "get_run": lambda: storage.get_run(latest),
+        "get_previous_run_id": lambda: storage.get_previous_run_id(latest),
+        "diff_runs": lambda: storage.diff_runs(previous, latest),
+        "get_trend": lambda: storage.get_trend(project=PROJECT, limit=10),
+        "get_workers": lambda: storage.get_workers(),
+        "get_failure_stats": lambda: storage.get_failure_stats(project=PROJECT, limit=100),
+        "get_failure_clusters": lambda: storage.get_failure_clusters(project=PROJECT),
+        "search_rank": lambda: storage.search_failures("timeout OR refused", project=PROJECT),
+        "search_recent": lambda: storage.search_failures("field_1*", order="recent"),
+        "get_flaky": lambda: storage.get_flaky(project=PROJECT),
+        "get_slowdowns": lambda: storage.get_slowdowns(project=PROJECT),
+        "get_duration_stats": lambda: storage.get_duration_stats(project=PROJECT),
+        "get_outcome_history": lambda: storage.get_outcome_history(project=PROJECT),
+    }
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _bench(name: str, payloads: list[dict], db_path: str, args) -> dict:
+    storage = open_backend(name, db_path, sketch_window=args.sketch_window)
+    try:
+        start = time.perf_counter()
+        for i in range(0, len(payloads), args.batch):
+            chunk = payloads[i:i + args.batch]
+            if len(chunk) == 1:
+                storage.save_run(chunk[0])
+            else:
+                storage.save_runs(chunk)
+        ingest = time.perf_counter() - start
+        latest, previous = payloads[-1]["run_id"], payloads[-2]["run_id"]
+        queries = {q: round(_best(fn, args.repeat) * 1000, 3)
+                   for q, fn in _queries(storage, latest, previous).items()}
+    finally:
+        storage.close()
+    return {
+        "ingest": {"seconds": round(ingest, 3), "runs_per_second": round(len(payloads) / ingest, 1)},
+        "queries_ms": queries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--tests", type=int, default=500)
+    parser.add_argument("--fail-rate", type=float, default=0.02)
+    parser.add_argument("--batch", type=int, default=1, help="每次写入的运行数（>1 时用 save_runs）")
+    parser.add_argument("--sketch-window", type=int, default=3600)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # payload 预先生成，写入计时不含合成开销；两个引擎写入完全相同的数据
+    rng = random.Random(args.seed)
+    ids = nodeids(args.tests)
+    payloads = [make_payload(ids, rng, i, project=PROJECT, fail_rate=args.fail_rate)
+                for i in range(args.runs)]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in filter(None, (b.strip() for b in args.backends.split(","))):
+            results[name] = _bench(name, payloads, f"{tmp}/{name}.db", args)
+
+    out = {"params": vars(args), "backends": results}
+    if {"sqlite", "memory"} <= results.keys():
+        sql, mem = results["sqlite"], results["memory"]
+        out["speedup"] = {
+            "ingest": round(sql["ingest"]["seconds"] / max(mem["ingest"]["seconds"], 1e-9), 1),
+            **{q: round(ms / max(mem["queries_ms"][q], 1e-3), 1)
+               for q, ms in sql["queries_ms"].items()},
+        }
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
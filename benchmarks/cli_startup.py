@@ -0,0 +1,97 @@
+"""
+CLI 冷启动耗时
+每个子命令作为独立进程运行多次，取中位数，减去空解释器启动时间得到 CLI 自身开销；
+任一命令开销超过 --budget-ms 时返回非零退出码（可放进 CI）
+查询类命令分别测本地库与 --master（进程内启动的本地 Master）两种模式
+
+  python -m benchmarks.cli_startup --repeat 15 --budget-ms 60
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+from benchmarks.synthetic import make_payload, nodeids, start_local_master
+
+CLI = str(ROOT / "cli.py")
+
+
+def _wall(cmd: list[str], cwd: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}, check=False)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def _seed_local(cwd: Path, runs: int, tests: int):
+    import random
+    from core.storage import TestStorage
+
+    storage = TestStorage(str(cwd / "reports" / "history.db"))
+    rng, ids = random.Random(0), nodeids(tests)
+    for i in range(runs):
+        payload = make_payload(ids, rng, i, fail_rate=0.05)
+        storage.save({k: v for k, v in payload.items() if k != "tests"})
+    storage.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=60,
+                        help="CLI 自身开销上限（中位数，已扣除解释器启动）")
+    parser.add_argument("--runs", type=int, default=200, help="本地库 / Master 预置的运行数")
+    parser.add_argument("--tests", type=int, default=200)
+    parser.add_argument("--no-master", action="store_true", help="不测 --master 模式")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = Path(tmp)
+        _seed_local(cwd, args.runs, args.tests)
+        commands = {
+            "--help": ["--help"],
+            "report": ["report"],
+            "trend": ["trend"],
+            "failures": ["failures"],
+            "stats": ["stats"],
+        }
+        if not args.no_master:
+            url = start_local_master(str(cwd / "master.db"), runs=args.runs, tests=args.tests,
+                                     project="bench")
+            for name in ("report", "trend", "failures", "stats"):
+                commands[f"{name} --master"] = [name, "--master", url, "--project", "bench"]
+
+        python = _wall([sys.executable, "-c", "pass"], tmp, args.repeat)
+        results = {}
+        for name, argv in commands.items():
+            wall = _wall([sys.executable, CLI, *argv], tmp, args.repeat)
+            overhead = (wall - python) * 1000
+            results[name] = {
+                "wall_ms": round(wall * 1000, 1),
+                "overhead_ms": round(overhead, 1),
+                "within_budget": overhead <= args.budget_ms,
+            }
+
+    print(json.dumps({
+        "params": vars(args),
+        "python_startup_ms": round(python * 1000, 1),
+        "commands": results,
+    }, indent=2, ensure_ascii=False))
+    over = [name for name, r in results.items() if not r["within_budget"]]
+    if over:
+        print(f"over budget ({args.budget_ms} ms): {', '.join(over)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+摘要 vs HTML 报告的代价对比
+同一份合成数据上分别生成 /digest 与 /report/html 的内容，比较字节数、估算 token 数与耗时
+
+  python -m benchmarks.digest_cost --runs 50 --tests 2000 --fail-rate 0.05
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from benchmarks.synthetic import populate
+from master.core.digest import build_digest
+from master.core.renderer import Renderer
+from master.core.storage import MasterStorage
+
+
+def _html(storage, renderer, project):
+    """与 GET /report/html 相同的数据组装"""
+    runs = storage.get_runs(project=project, limit=1)
+    runs[0]["failures"] = storage.get_run(runs[0]["run_id"])["failures"]
+    return renderer.render_report(runs, storage.get_trend(project=project, limit=10),
+                                  storage.get_failure_stats(project=project, limit=20),
+                                  storage.get_workers(), project=project)
+
+
+def _measure(fn, repeat: int) -> tuple[float, int]:
+    best, size = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+        size = len(out.encode("utf-8"))
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--tests", type=int, default=2000)
+    parser.add_argument("--fail-rate", type=float, default=0.05)
+    parser.add_argument("--budget", type=int, default=4000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = MasterStorage(f"{tmp}/bench.db")
+        populate(storage, args.runs, args.tests, fail_rate=args.fail_rate)
+        renderer = Renderer()
+
+        html_s, html_b = _measure(lambda: _html(storage, renderer, "bench"), args.repeat)
+        dig_s, dig_b = _measure(
+            lambda: json.dumps(build_digest(storage, "bench", "main", args.budget),
+                               ensure_ascii=False, separators=(",", ":")),
+            args.repeat,
+        )
+        storage.close()
+
+    # 粗略 token 估算：约 4 字节 / token
+    print(json.dumps({
+        "params": vars(args),
+        "html":   {"bytes": html_b, "approx_tokens": html_b // 4, "seconds": round(html_s, 4)},
+        "digest": {"bytes": dig_b, "approx_tokens": dig_b // 4, "seconds": round(dig_s, 4)},
+        "ratio_bytes": round(html_b / max(dig_b, 1), 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
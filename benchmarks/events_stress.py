@@ -0,0 +1,127 @@
+"""
+/events SSE 压力测试
+启动 N 个并发订阅者（其中一部分故意消费缓慢），同时上报 M 次运行，统计：
+  - 每个正常订阅者收到的事件数、上报完成到收到事件的延迟 p50/p99
+  - 被服务端判定为慢消费者而断开（dropped）的订阅者数
+
+  python -m benchmarks.events_stress --subscribers 300 --runs 200 --slow 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from benchmarks.synthetic import make_payload, nodeids, start_local_master
+
+
+async def _subscriber(client: httpx.AsyncClient, idx: int, slow: bool, sent: dict,
+                      stats: dict, ready: asyncio.Event, expected: int):
+    received, latencies = 0, []
+    try:
+        async with client.stream("GET", "/events") as r:
+            stats["connected"] += 1
+            if stats["connected"] == stats["target"]:
+                ready.set()
+            event = None
+            async for line in r.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: ") and event == "run":
+                    run_id = json.loads(line[6:])["run_id"]
+                    if run_id in sent:
+                        latencies.append(time.perf_counter() - sent[run_id])
+                    received += 1
+                    if slow:
+                        await asyncio.sleep(1)
+                    if received >= expected:
+                        break
+                elif line.startswith("data: ") and event == "dropped":
+                    stats["dropped"] += 1
+                    break
+    except httpx.HTTPError as e:
+        stats["errors"] += 1
+        stats.setdefault("error_samples", []).append(f"{type(e).__name__}: {e}"[:200])
+    if not slow:
+        stats["received"].append(received)
+        stats["latencies"].extend(latencies)
+
+
+async def _run(url: str, args) -> dict:
+    stats = {"connected": 0, "target": args.subscribers, "dropped": 0, "errors": 0,
+             "received": [], "latencies": []}
+    sent: dict[str, float] = {}
+    ready = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.subscribers + 10)
+    async with httpx.AsyncClient(base_url=url, timeout=None, limits=limits) as client:
+        n_slow = int(args.subscribers * args.slow)
+        tasks = [asyncio.create_task(_subscriber(client, i, i < n_slow, sent, stats, ready, args.runs))
+                 for i in range(args.subscribers)]
+        await asyncio.wait_for(ready.wait(), timeout=60)
+        await asyncio.sleep(0.5)                     # 等订阅在服务端登记完成
+
+        import random
+        rng, ids = random.Random(0), nodeids(args.tests)
+        start = time.perf_counter()
+        for i in range(args.runs):
+            payload = make_payload(ids, rng, i, fail_rate=0.02)
+            sent[payload["run_id"]] = time.perf_counter()
+            r = await client.post("/results", json=payload)
+            r.raise_for_status()
+            sent[payload["run_id"]] = time.perf_counter()    # 以入库完成为起点
+        ingest_s = time.perf_counter() - start
+
+        done, pending = await asyncio.wait(tasks, timeout=args.wait)
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    lat = sorted(stats["latencies"]) or [0.0]
+    received = stats["received"] or [0]
+    return {
+        "params": vars(args),
+        "ingest_runs_per_s": round(args.runs / ingest_s, 1),
+        "fast_subscribers": len(stats["received"]),
+        "events_expected_each": args.runs,
+        "events_received_min": min(received),
+        "events_received_avg": round(statistics.mean(received), 1),
+        "complete_subscribers": sum(r >= args.runs for r in received),
+        "latency_ms_p50": round(lat[len(lat) // 2] * 1000, 2),
+        "latency_ms_p99": round(lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000, 2),
+        "slow_subscribers": int(args.subscribers * args.slow),
+        "dropped": stats["dropped"],
+        "errors": stats["errors"],
+        "error_samples": stats.get("error_samples", [])[:3],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--master", default=None, help="已有 Master 地址；不指定则启动本地 Master")
+    parser.add_argument("--subscribers", type=int, default=300)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--tests", type=int, default=200, help="每次运行的用例数")
+    parser.add_argument("--slow", type=float, default=0.05, help="慢消费者比例")
+    parser.add_argument("--buffer", type=int, default=32, help="本地 Master 的每订阅者缓冲（EVENTS_BUFFER）")
+    parser.add_argument("--wait", type=float, default=30, help="上报结束后最多等待秒数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.master:
+            url = args.master
+        else:
+            os.environ["EVENTS_BUFFER"] = str(args.buffer)
+            url = start_local_master(f"{tmp}/bench.db")
+        result = asyncio.run(_run(url, args))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
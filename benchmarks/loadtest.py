@@ -0,0 +1,194 @@
+"""
+Master 负载测试：模拟 Worker 集群上报 + 看板轮询
+  - N 个并发 Worker 持续 POST /results（用例数、失败条数、信息长度、项目/分支分布可配）
+  - M 个看板按间隔轮询 /trend、/workers、/failures/stats、/report/html
+输出 JSON：各接口吞吐、p50/p99 延迟、错误率，附 git 提交号，便于跨提交对比
+
+  python -m benchmarks.loadtest --workers 20 --dashboards 5 --duration 30 --output load.json
+  python -m benchmarks.loadtest --master http://your-master:8080 ...
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+from benchmarks.synthetic import make_payload, nodeids
+
+DASHBOARD_PATHS = ("/trend", "/workers", "/failures/stats", "/report/html")
+
+
+class _Recorder:
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.statuses: dict[str, dict[str, int]] = {}
+
+    def add(self, name: str, seconds: float, status: str):
+        self.samples.setdefault(name, []).append(seconds)
+        counts = self.statuses.setdefault(name, {})
+        counts[status] = counts.get(status, 0) + 1
+        if not status.startswith(("2", "3")):
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        result = {}
+        for name, values in sorted(self.samples.items()):
+            ordered = sorted(values)
+            errors = self.errors.get(name, 0)
+            result[name] = {
+                "requests": len(values),
+                "errors": errors,
+                "error_rate": round(errors / len(values), 4),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+                "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+                "status": self.statuses[name],
+            }
+        return result
+
+
+async def _timed(client: httpx.AsyncClient, rec: _Recorder, name: str, method: str,
+                 path: str, **kwargs):
+    start = time.perf_counter()
+    try:
+        r = await client.request(method, path, **kwargs)
+        status = str(r.status_code)
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    rec.add(name, time.perf_counter() - start, status)
+
+
+async def _worker(client, rec, idx: int, args, deadline: float):
+    """一个 Worker：预生成若干 payload 轮流上报，每次换新的 run_id"""
+    rng = random.Random(idx)
+    ids = nodeids(args.tests)
+    project = f"proj-{idx % args.projects}"
+    pool = [make_payload(ids, rng, i, project=project, branch=f"branch-{rng.randrange(args.branches)}",
+                         worker_id=f"load-worker-{idx}", failures=args.failures,
+                         message_bytes=args.message_bytes)
+            for i in range(4)]
+    i = 0
+    while time.perf_counter() < deadline:
+        payload = dict(pool[i % len(pool)], run_id=uuid.uuid4().hex)
+        await _timed(client, rec, "POST /results", "POST", "/results", json=payload)
+        i += 1
+        if args.worker_interval:
+            await asyncio.sleep(args.worker_interval)
+
+
+async def _dashboard(client, rec, idx: int, args, deadline: float):
+    rng = random.Random(1000 + idx)
+    while time.perf_counter() < deadline:
+        path = DASHBOARD_PATHS[rng.randrange(len(DASHBOARD_PATHS))]
+        params = {"project": f"proj-{rng.randrange(args.projects)}"}
+        await _timed(client, rec, f"GET {path}", "GET", path, params=params)
+        await asyncio.sleep(args.dashboard_interval)
+
+
+async def _run(url: str, args) -> dict:
+    rec = _Recorder()
+    limits = httpx.Limits(max_connections=args.workers + args.dashboards + 5)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(
+            *(_worker(client, rec, i, args, deadline) for i in range(args.workers)),
+            *(_dashboard(client, rec, i, args, deadline) for i in range(args.dashboards)),
+        )
+        elapsed = time.perf_counter() - start
+    endpoints = rec.summary(elapsed)
+    ingest = endpoints.get("POST /results", {})
+    return {
+        "commit": _git_head(),
+        "params": vars(args),
+        "elapsed_s": round(elapsed, 2),
+        "ingest_runs_per_s": ingest.get("rps", 0),
+        "ingest_failures_per_s": round(ingest.get("rps", 0) * args.failures, 1),
+        "endpoints": endpoints,
+    }
+
+
+def _git_head() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def _spawn_master(db_path: str, admission: bool = False) -> tuple[subprocess.Popen, str]:
+    """独立进程启动本地 Master（避免与压测客户端争用 GIL）；默认关闭上报限速以测吞吐上限"""
+    env = {**os.environ, "MASTER_DB": db_path}
+    if not admission:
+        env.update(ADMISSION_RATE="0", ADMISSION_MAX_PENDING="0")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "master.api.server:app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("本地 Master 启动失败")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--master", default=None, help="已有 Master 地址；不指定则启动本地 Master（临时库）")
+    parser.add_argument("--workers", type=int, default=10, help="并发 Worker 数")
+    parser.add_argument("--dashboards", type=int, default=3, help="并发看板数")
+    parser.add_argument("--duration", type=float, default=20, help="压测时长（秒）")
+    parser.add_argument("--tests", type=int, default=500, help="每次运行的用例数")
+    parser.add_argument("--failures", type=int, default=10, help="每次运行的失败条数")
+    parser.add_argument("--message-bytes", type=int, default=500, help="每条失败信息长度")
+    parser.add_argument("--projects", type=int, default=3)
+    parser.add_argument("--branches", type=int, default=4)
+    parser.add_argument("--worker-interval", type=float, default=0, help="Worker 两次上报间隔（秒）")
+    parser.add_argument("--dashboard-interval", type=float, default=1.0, help="看板轮询间隔（秒）")
+    parser.add_argument("--admission", action="store_true",
+                        help="本地 Master 保留默认上报准入限制（观察 429 与各 Worker 公平性）")
+    parser.add_argument("--output", default=None, help="结果写入文件（JSON）")
+    args = parser.parse_args()
+
+    proc = None
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            if args.master:
+                url = args.master
+            else:
+                proc, url = _spawn_master(f"{tmp}/load.db", args.admission)
+            result = asyncio.run(_run(url, args))
+        finally:
+            if proc:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+MCP 排查流程端到端延迟：逐个工具调用 vs query_batch
+直接调用 mcp/server.py 的工具入口：逐个调用走 _run_tool，批量走 query_batch 的 _run_batch，
+子查询按 _ROUTES 映射到 Master GET，测的是 MCP 层真实的参数处理、并发与错误收集开销。
+响应缓存默认关闭，保证每次都打到 Master（--cache 打开，观察重复视图的收益）。
+--latency-ms 在每个请求前注入固定延迟，模拟 MCP 与 Master 之间的网络往返
+
+  python -m benchmarks.mcp_batch --latency-ms 20
+  python -m benchmarks.mcp_batch --master http://your-master:8080
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from benchmarks.synthetic import start_local_master
+
+# 常见排查流程：每项为一次 MCP 工具调用 (工具名, 参数)
+FLOWS = {
+    "what_broke_on_branch": [
+        ("get_digest", {"project": "bench", "branch": "main"}),
+        ("get_summary", {"project": "bench", "limit": 10}),
+        ("get_failure_stats", {"project": "bench"}),
+        ("get_workers", {}),
+    ],
+    "worker_health": [
+        ("get_workers", {}),
+        ("get_summary", {"limit": 10}),
+        ("get_report", {"project": "bench", "trend_limit": 5}),
+    ],
+    "triage_failures": [
+        ("get_failure_stats", {"project": "bench", "limit": 20}),
+        ("search_failures", {"q": "AssertionError", "project": "bench", "limit": 20}),
+        ("get_digest", {"project": "bench"}),
+    ],
+}
+
+
+def load_mcp_server():
+    """
+    按文件加载 mcp/server.py。仓库里的 mcp/ 与 MCP SDK 同名，
+    先在不含仓库根目录的 sys.path 下导入 SDK，让它占住 mcp 包名
+    """
+    saved = sys.path[:]
+    sys.path[:] = [p for p in sys.path if Path(p or ".").resolve() != ROOT]
+    for name in [m for m in sys.modules if m == "mcp" or m.startswith("mcp.")]:
+        del sys.modules[name]
+    try:
+        import mcp      # noqa: F401
+    finally:
+        sys.path[:] = saved
+    spec = importlib.util.spec_from_file_location("platform_mcp_server", ROOT / "mcp" / "server.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _DelayTransport(httpx.AsyncBaseTransport):
+    """每个请求前等待 delay 秒，模拟网络往返"""
+
+    def __init__(self, delay: float):
+        self._inner = httpx.AsyncHTTPTransport()
+        self._delay = delay
+
+    async def handle_async_request(self, request):
+        await asyncio.sleep(self._delay)
+        return await self._inner.handle_async_request(request)
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+
+async def _bench(server, url: str, latency: float, repeat: int) -> dict:
+    # 与 _get_client 相同的连接池配置，只换上注入延迟的 transport
+    server.MASTER_URL = url
+    server._client = httpx.AsyncClient(
+        base_url=url, timeout=server.TIMEOUT, transport=_DelayTransport(latency),
+        limits=httpx.Limits(max_connections=server.MAX_CONNS,
+                            max_keepalive_connections=server.MAX_CONNS),
+        headers={"Accept": "text/html,application/json"},
+    )
+    results = {}
+    try:
+        for name, calls in FLOWS.items():
+            queries = [{"tool": tool, "arguments": args} for tool, args in calls]
+            warm = await server._run_batch(queries)                 # 预热连接，同时确认流程可用
+            failed = [r for r in warm["results"] if "error" in r]
+            if failed:
+                raise RuntimeError(f"{name}: {failed[0]['tool']} 失败：{failed[0]['error']}")
+            seq, par = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for tool, args in calls:
+                    await server._run_tool(tool, args)
+                seq.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                await server._run_batch(queries)
+                par.append(time.perf_counter() - start)
+            results[name] = {
+                "calls": len(calls),
+                "sequential_ms": round(statistics.median(seq) * 1000, 1),
+                "batch_ms": round(statistics.median(par) * 1000, 1),
+                "speedup": round(statistics.median(seq) / statistics.median(par), 2),
+            }
+    finally:
+        await server._client.aclose()
+        server._client = None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--master", default=None, help="已有 Master 地址；不指定则启动本地合成数据 Master")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--tests", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--cache", action="store_true", help="保留 MCP 响应缓存（默认关闭）")
+    args = parser.parse_args()
+
+    server = load_mcp_server()
+    if not args.cache:
+        server.CACHE_TTL.clear()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.master or start_local_master(f"{tmp}/bench.db", args.runs, args.tests,
+                                                fail_rate=0.02)
+        flows = asyncio.run(_bench(server, url, args.latency_ms / 1000, args.repeat))
+    print(json.dumps({"params": vars(args), "flows": flows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+热路径微基准 + 回归对比
+在 10k / 100k / 1M 次运行的合成库上计时：
+  - MasterStorage: save_run / get_runs / get_trend / get_workers / get_failure_stats / get_run
+  - TestStorage.get_failure_stats
+  - Renderer.render_report、core.reporter.Reporter.generate_html
+  - AsyncCollector 从 submit 到落库（含生成报告）的延迟
+合成库按 (规模, 用例数, 种子) 缓存在 --data-dir，首次构建较慢（1M 约 20 分钟），之后复用；
+写入类基准在库的副本上进行，缓存库保持不变
+
+  python -m benchmarks.microbench run --sizes 10k,100k --output benchmarks/baselines/main.json
+  python -m benchmarks.microbench compare benchmarks/baselines/main.json new.json --threshold 0.2
+"""
+import argparse
+import json
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+from benchmarks.synthetic import make_payload, nodeids
+from core.collector import AsyncCollector, RunResult
+from core.reporter import Reporter
+from core.storage import TestStorage
+from master.core.renderer import Renderer
+from master.core.storage import MasterStorage
+
+PROJECTS = 5
+BRANCHES = ("main", "develop", "release")
+
+
+def _parse_size(text: str) -> int:
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def _label(n: int) -> str:
+    if n >= 1_000_000 and n % 1_000_000 == 0:
+        return f"{n // 1_000_000}M"
+    if n >= 1_000 and n % 1_000 == 0:
+        return f"{n // 1_000}k"
+    return str(n)
+
+
+# ── 合成库 ───────────────────────────────────────────────
+
+def _build(data_dir: Path, runs: int, tests: int, seed: int) -> tuple[Path, Path]:
+    """构建（或复用）Master 库与本地 TestStorage 库"""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    master_db = data_dir / f"master-{_label(runs)}-t{tests}-s{seed}.db"
+    local_db = data_dir / f"local-{_label(runs)}-t{tests}-s{seed}.db"
+    if master_db.exists() and local_db.exists():
+        return master_db, local_db
+
+    for p in (master_db, local_db):
+        p.unlink(missing_ok=True)
+    rng = random.Random(seed)
+    ids = nodeids(tests)
+    master_tmp = master_db.with_suffix(".building")
+    local_tmp = local_db.with_suffix(".building")
+    master_tmp.unlink(missing_ok=True)
+    local_tmp.unlink(missing_ok=True)
+
+    master = MasterStorage(str(master_tmp))
+    local = TestStorage(str(local_tmp))
+    for conn in (master.conn, local.conn):
+        conn.execute("PRAGMA synchronous=OFF")      # 构建期不需要持久性保证
+    start = time.perf_counter()
+    for i in range(runs):
+        payload = make_payload(ids, rng, i, project=f"proj-{i % PROJECTS}",
+                               branch=BRANCHES[i % len(BRANCHES)], fail_rate=0.05)
+        master.save_run(payload)
+        # 本地库只保留汇总与失败（与 Worker 单机模式一致），不存逐用例耗时
+        local.save({k: v for k, v in payload.items() if k != "tests"})
+        if (i + 1) % 10_000 == 0:
+            print(f"  building {_label(runs)}: {i + 1}/{runs} "
+                  f"({time.perf_counter() - start:.0f}s)", file=sys.stderr)
+    master.conn.close()
+    local.conn.close()
+    master_tmp.rename(master_db)
+    local_tmp.rename(local_db)
+    return master_db, local_db
+
+
+# ── 计时 ─────────────────────────────────────────────────
+
+def _stats(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "median_ms": round(statistics.median(ordered) * 1000, 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 4),
+        "min_ms": round(ordered[0] * 1000, 4),
+    }
+
+
+def _time(fn, repeat: int, setup=None) -> dict:
+    """setup() 的返回值作为 fn 的参数，不计入耗时"""
+    fn(setup() if setup else None)              # 预热
+    samples = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - start)
+    return _stats(samples)
+
+
+def _bench_size(master_db: Path, local_db: Path, runs: int, tests: int,
+                repeat: int, seed: int) -> dict:
+    results = {}
+    rng = random.Random(seed + 1)
+    ids = nodeids(tests)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        # 读路径：直接用缓存库（只读查询）
+        master = MasterStorage(str(master_db))
+        run_ids = [r[0] for r in master.conn.execute(
+            "SELECT run_id FROM runs WHERE id % ? = 0 LIMIT 1000", (max(1, runs // 1000),)
+        )]
+        results["master.get_runs"] = _time(lambda _: master.get_runs(limit=50), repeat)
+        results["master.get_runs[project]"] = _time(
+            lambda _: master.get_runs(project="proj-1", branch="main", limit=50), repeat)
+        results["master.get_trend"] = _time(lambda _: master.get_trend(project="proj-1"), repeat)
+        results["master.get_workers"] = _time(lambda _: master.get_workers(), repeat)
+        results["master.get_failure_stats"] = _time(
+            lambda _: master.get_failure_stats(project="proj-1"), repeat)
+        results["master.get_run"] = _time(lambda rid: master.get_run(rid), repeat,
+                                          setup=lambda: rng.choice(run_ids))
+
+        renderer = Renderer()
+        last = master.get_runs(project="proj-1", limit=1)
+        last[0]["failures"] = master.get_run(last[0]["run_id"])["failures"]
+        trend = master.get_trend(project="proj-1", limit=10)
+        stats = master.get_failure_stats(project="proj-1", limit=20)
+        workers = master.get_workers()
+        results["renderer.render_report"] = _time(
+            lambda _: renderer.render_report(last, trend, stats, workers, project="proj-1"), repeat)
+        master.conn.close()
+
+        local = TestStorage(str(local_db))
+        results["local.get_failure_stats"] = _time(lambda _: local.get_failure_stats(), repeat)
+        reporter = Reporter(str(tmp / "reports"))
+        result, local_trend = local.get_last(), local.get_trend()
+        results["reporter.generate_html"] = _time(
+            lambda _: reporter.generate_html(result, local_trend), repeat)
+        local.conn.close()
+
+        # 写路径：在副本上进行
+        master_copy = tmp / "master.db"
+        shutil.copy(master_db, master_copy)
+        master = MasterStorage(str(master_copy))
+        offset = runs
+        counter = iter(range(offset, offset + repeat + 1))
+        results["master.save_run"] = _time(
+            lambda payload: master.save_run(payload), repeat,
+            setup=lambda: make_payload(ids, rng, next(counter), project="proj-1", fail_rate=0.05))
+        master.conn.close()
+
+        local_copy = tmp / "local.db"
+        shutil.copy(local_db, local_copy)
+        local = TestStorage(str(local_copy))
+        collector = AsyncCollector(local, Reporter(str(tmp / "collector")))
+        collector.start()
+
+        def submit_to_persist(result: RunResult):
+            collector.submit(result)
+            collector._queue.join()             # task_done 在 _persist 完成后调用
+
+        results["collector.submit_to_persist"] = _time(
+            submit_to_persist, repeat,
+            setup=lambda: RunResult(**{k: v for k, v in make_payload(
+                ids, rng, 0, fail_rate=0.05).items()
+                if k in RunResult.__dataclass_fields__}))
+        collector.stop()
+        local.conn.close()
+    return results
+
+
+def _git_head() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def cmd_run(args) -> int:
+    sizes = [_parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    report = {
+        "commit": _git_head(),
+        "python": platform.python_version(),
+        "params": {"tests": args.tests, "repeat": args.repeat, "seed": args.seed},
+        "sizes": {},
+    }
+    for runs in sizes:
+        master_db, local_db = _build(Path(args.data_dir), runs, args.tests, args.seed)
+        print(f"benchmarking {_label(runs)} runs ...", file=sys.stderr)
+        report["sizes"][_label(runs)] = _bench_size(master_db, local_db, runs, args.tests,
+                                                    args.repeat, args.seed)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
+    return 0
+
+
+# ── 对比 ─────────────────────────────────────────────────
+
+def compare(base: dict, new: dict, threshold: float, metric: str = "median_ms") -> list[dict]:
+    """逐项比较，返回两边都有的条目；new / base - 1 > threshold 记为回归"""
+    rows = []
+    for size, benches in new.get("sizes", {}).items():
+        for name, stats in benches.items():
+            old = base.get("sizes", {}).get(size, {}).get(name)
+            if not old:
+                continue
+            change = stats[metric] / max(old[metric], 1e-9) - 1
+            rows.append({
+                "size": size, "bench": name,
+                "base": old[metric], "new": stats[metric],
+                "change": round(change, 4),
+                "regression": change > threshold,
+            })
+    return rows
+
+
+def cmd_compare(args) -> int:
+    base = json.loads(Path(args.base).read_text(encoding="utf-8"))
+    new = json.loads(Path(args.new).read_text(encoding="utf-8"))
+    rows = compare(base, new, args.threshold, args.metric)
+    if args.json:
+        print(json.dumps({"base": base.get("commit"), "new": new.get("commit"),
+                          "threshold": args.threshold, "metric": args.metric,
+                          "results": rows}, indent=2))
+    else:
+        print(f"{base.get('commit', '?')} → {new.get('commit', '?')}  "
+              f"({args.metric}, threshold +{args.threshold:.0%})")
+        for r in rows:
+            flag = "REGRESSION" if r["regression"] else ""
+            print(f"{r['size']:>6}  {r['bench']:<32} {r['base']:>10.3f} → {r['new']:>10.3f} ms"
+                  f"  {r['change']:+7.1%}  {flag}")
+    regressions = [r for r in rows if r["regression"]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) past +{args.threshold:.0%}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="运行基准并输出 JSON")
+    run.add_argument("--sizes", default="10k,100k,1M", help="逗号分隔的运行次数，支持 k / M 后缀")
+    run.add_argument("--tests", type=int, default=20, help="每次运行的用例数")
+    run.add_argument("--repeat", type=int, default=50, help="每项计时次数")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--data-dir", default=str(ROOT / "benchmarks" / ".data"), help="合成库缓存目录")
+    run.add_argument("--output", default=None, help="结果写入文件（作为基线保存）")
+    run.set_defaults(func=cmd_run)
+
+    cmp = sub.add_parser("compare", help="与基线对比，超过阈值返回非零退出码")
+    cmp.add_argument("base")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=0.2, help="允许的相对变慢比例")
+    cmp.add_argument("--metric", default="median_ms", choices=("median_ms", "p95_ms", "min_ms"))
+    cmp.add_argument("--json", action="store_true", help="以 JSON 输出对比结果")
+    cmp.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
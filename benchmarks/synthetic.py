@@ -0,0 +1,95 @@
+"""
+合成数据：生成 Worker 上报 payload 并写入 MasterStorage，供各基准脚本复用
+数据形态：固定一批用例，每次运行有少量稳定失败、少量随机翻转（flaky），错误信息分几类
+"""
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+_MESSAGES = (
+    "AssertionError: assert {n} == {m}",
+    "TimeoutError: request to http://svc-{n}.internal:8080/api timed out after {m}s",
+    "KeyError: 'field_{n}'",
+    "ConnectionRefusedError: [Errno 111] Connection refused (port {m})",
+    "ValueError: invalid literal for int() with base 10: 'x{n}'",
+)
+
+
+def nodeids(tests: int, files: int = 50) -> list[str]:
+    return [f"tests/test_mod{i % files}.py::test_case_{i}" for i in range(tests)]
+
+
+def make_payload(ids: list[str], rng: random.Random, index: int, project: str = "bench",
+                 branch: str = "main", worker_id: str = None, fail_rate: float = 0.01,
+                 flaky_rate: float = 0.005, base_time: datetime = None,
+                 failures: int = None, message_bytes: int = 0) -> dict:
+    """
+    生成第 index 次运行的上报 payload（结构与 RunPayload 一致）
+    failures 指定时固定失败条数（忽略 fail_rate / flaky_rate）；message_bytes 把失败信息补足到该长度（模拟长 traceback）
+    """
+    n_failures = failures
+    tests, failures = [], []
+    stable = int(len(ids) * fail_rate) if n_failures is None else n_failures
+    flaky = int(len(ids) * flaky_rate) if n_failures is None else 0
+    for i, nodeid in enumerate(ids):
+        duration = round(rng.expovariate(1 / 0.05), 4)
+        failed = i < stable or (stable <= i < stable + flaky and rng.random() < 0.5)
+        tests.append({"nodeid": nodeid, "outcome": "failed" if failed else "passed",
+                      "duration": duration})
+        if failed:
+            msg = _MESSAGES[i % len(_MESSAGES)].format(n=rng.randint(0, 999), m=rng.randint(0, 99))
+            if len(msg) < message_bytes:
+                frames = "".join(f'\n  File "src/module_{k}.py", line {rng.randint(1, 500)}, in func_{k}'
+                                 for k in range(message_bytes // 50 + 1))
+                msg = (frames + "\n" + msg)[-message_bytes:]
+            failures.append({"nodeid": nodeid, "duration": duration, "message": msg})
+    total = len(tests)
+    failed = len(failures)
+    ts = (base_time or datetime(2026, 1, 1)) + timedelta(minutes=index)
+    return {
+        "run_id": uuid.UUID(int=rng.getrandbits(128)).hex,
+        "worker_id": worker_id or f"worker-{index % 4}",
+        "project": project,
+        "branch": branch,
+        "timestamp": ts.isoformat(timespec="seconds"),
+        "passed": total - failed,
+        "failed": failed,
+        "total": total,
+        "duration": round(sum(t["duration"] for t in tests), 3),
+        "pass_rate": round((total - failed) / total * 100, 2) if total else 0,
+        "failures": failures,
+        "tests": tests,
+    }
+
+
+def populate(storage, runs: int, tests: int, seed: int = 0, **kwargs) -> list[str]:
+    """向 storage 写入 runs 次运行，返回 run_id 列表（按写入顺序）"""
+    rng = random.Random(seed)
+    ids = nodeids(tests)
+    return [storage.save_run(make_payload(ids, rng, i, **kwargs)) for i in range(runs)]
+
+
+def start_local_master(db_path: str, runs: int = 0, tests: int = 0, **kwargs) -> str:
+    """
+    在后台线程启动一个使用 db_path 的 Master（可先写入合成数据），返回 URL
+    进程内只能启动一次：master.api.server 的 storage 是模块级单例
+    """
+    import uvicorn
+    import master.api.server as server
+    from master.core.storage import MasterStorage
+
+    server.storage = MasterStorage(db_path)
+    if runs:
+        populate(server.storage, runs, tests, **kwargs)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    uv = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=port,
+                                       log_level="warning"))
+    threading.Thread(target=uv.run, daemon=True).start()
+    while not uv.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
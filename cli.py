@@ -7,19 +7,28 @@
   python cli.py run --path tests/unit      # 指定目录
   python cli.py run --markers smoke        # 按 marker 运行
   python cli.py run --test-id tests/test_math.py::test_add  # 单个测试
+  python cli.py run --coverage             # 采集覆盖率，更新覆盖映射
+  python cli.py run --changed-since main   # 只运行受变更影响的用例
+  python cli.py run --progress             # 实时输出每个用例结果
+  python cli.py run --failure-first --fail-fast 3  # 最近失败优先，3 个失败即中止
   python cli.py report                     # 查看最近结果
   python cli.py trend                      # 查看趋势
   python cli.py failures                   # 查看失败用例
   python cli.py stats                      # 高频失败统计
+  python cli.py trend --master http://your-master:8080 --project my-service
+                                           # report / trend / failures / stats 改读 Master 共享历史
+  python cli.py import ci-artifacts/ --project my-service --branch main
+                                           # 批量导入历史 json-report 到 Master 库（可重复执行）
+
+导入按子命令延迟：查询类命令只读打开本地库，不加载 pytest
 """
 import argparse
 import json
-import subprocess
+import os
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
-from core import TestRunner, TestStorage, Reporter
 
 
 def print_json(data):
@@ -27,8 +36,10 @@ def print_json(data):
 
 
 def cmd_run(args):
-    runner = TestRunner()
+    from core import Reporter, TestRunner, TestStorage
+
     storage = TestStorage()
+    runner = TestRunner(storage=storage)
     reporter = Reporter()
 
     print(f"▶ 执行测试：{args.path or args.test_id or 'tests/'}")
@@ -36,12 +47,25 @@ def cmd_run(args):
         path=args.path or "tests/",
         markers=args.markers,
         test_id=args.test_id,
+        coverage=args.coverage,
+        changed_since=args.changed_since,
+        on_event=_print_progress if args.progress else None,
+        failure_first=args.failure_first,
+        fail_fast=args.fail_fast,
     )
 
-    if "error" in result:
+    if isinstance(result.get("error"), str):
         print(f"✗ 错误：{result['error']}")
         sys.exit(1)
 
+    if "impact" in result:
+        ia = result["impact"]
+        if ia["mode"] == "impact":
+            print(f"  影响分析：{ia['changed_files']} 个变更文件 → 选中 {ia['selected']} 项，"
+                  f"选择耗时 {ia['overhead']}s（全量估算 {ia['full_suite_estimate']}s）")
+        else:
+            print(f"  影响分析回退全量：{ia['reason']}")
+
     storage.save(result)
     html_path = reporter.generate_html(result, storage.get_trend())
 
@@ -65,9 +89,37 @@ def cmd_run(args):
     return result["exit_code"]
 
 
+def _print_progress(event: dict):
+    if event["type"] == "collected":
+        print(f"  收集到 {event['count']} 个用例")
+    elif event["type"] == "test":
+        mark = "✓" if event["outcome"] in ("passed", "xfailed") else "✗"
+        print(f"  [{event.get('progress', 0):>3}%] {mark} {event['nodeid']}", flush=True)
+
+
+# ── 数据来源：本地只读库 / Master ─────────────────────────
+
+def _local_storage():
+    """只读打开本地历史库；库不存在返回 None（查询不应创建 reports/）"""
+    from core.storage import TestStorage
+    try:
+        return TestStorage(readonly=True)
+    except FileNotFoundError:
+        return None
+
+
+def _last_run(args, failures: bool = False):
+    if args.client:
+        runs = args.client.get("/results", project=args.project, branch=args.branch, limit=1)
+        if not runs:
+            return None
+        return args.client.get(f"/results/{runs[0]['run_id']}") if failures else runs[0]
+    storage = _local_storage()
+    return storage.get_last() if storage else None
+
+
 def cmd_report(args):
-    storage = TestStorage()
-    data = storage.get_last()
+    data = _last_run(args)
     if not data:
         print("暂无测试记录")
         return
@@ -75,8 +127,11 @@ def cmd_report(args):
 
 
 def cmd_trend(args):
-    storage = TestStorage()
-    trend = storage.get_trend(args.limit)
+    if args.client:
+        trend = args.client.get("/trend", project=args.project, limit=args.limit)
+    else:
+        storage = _local_storage()
+        trend = storage.get_trend(args.limit) if storage else []
     print(f"\n最近 {len(trend)} 次测试趋势：\n")
     for r in trend:
         bar = "█" * int(r["pass_rate"] / 5)
@@ -85,8 +140,7 @@ def cmd_trend(args):
 
 
 def cmd_failures(args):
-    storage = TestStorage()
-    data = storage.get_last()
+    data = _last_run(args, failures=True)
     if not data:
         print("暂无测试记录")
         return
@@ -100,16 +154,51 @@ def cmd_failures(args):
 
 
 def cmd_stats(args):
-    storage = TestStorage()
-    stats = storage.get_failure_stats(args.limit)
+    if args.client:
+        # Master 按全部历史聚合，limit 为返回条数
+        stats = args.client.get("/failures/stats", project=args.project, limit=args.limit)
+        title = f"高频失败用例（Master {args.project or '全部项目'}）"
+    else:
+        storage = _local_storage()
+        stats = storage.get_failure_stats(args.limit) if storage else []
+        title = f"高频失败用例（最近 {args.limit} 次运行）"
     if not stats:
         print("暂无失败记录")
         return
-    print(f"\n高频失败用例（最近 {args.limit} 次运行）：\n")
+    print(f"\n{title}：\n")
     for s in stats[:10]:
         print(f"  {s['fail_count']:>3}次  {s['nodeid']}")
 
 
+def cmd_import(args):
+    from master.core.importer import discover, import_reports
+    from master.core.storage import DatabaseLocked
+
+    files = discover(args.dir, args.pattern)
+    if not files:
+        print(f"未找到报告文件：{args.dir}/**/{args.pattern}")
+        return 1
+    db = args.db or os.environ.get("MASTER_DB", "master/data/results.db")
+    print(f"▶ 导入 {len(files)} 个文件 → {db}")
+
+    def progress(stats: dict):
+        done = stats["imported"] + stats["skipped"] + stats["errors"]
+        print(f"  {done}/{stats['files']}  导入 {stats['imported']}  跳过 {stats['skipped']}  "
+              f"错误 {stats['errors']}", flush=True)
+
+    try:
+        stats = import_reports(db, files, project=args.project, branch=args.branch,
+                               worker_id=args.worker_id, processes=args.jobs,
+                               batch_size=args.batch_size, on_progress=progress)
+    except DatabaseLocked as e:
+        print(f"✗ {e}")
+        return 1
+    print(f"\n完成：导入 {stats['imported']}，已存在跳过 {stats['skipped']}，错误 {stats['errors']}")
+    for e in stats["error_samples"]:
+        print(f"  ✗ {e['path']}: {e['error']}")
+    return 1 if stats["errors"] else 0
+
+
 def main():
     parser = argparse.ArgumentParser(description="pytest 测试平台 CLI")
     sub = parser.add_subparsers(dest="cmd")
@@ -119,21 +208,44 @@ def main():
     p_run.add_argument("--path", help="测试路径")
     p_run.add_argument("--markers", "-m", help="marker 表达式")
     p_run.add_argument("--test-id", help="单个测试 nodeid")
+    p_run.add_argument("--coverage", action="store_true", help="采集 per-test 覆盖率，更新覆盖映射")
+    p_run.add_argument("--changed-since", metavar="GIT_REV", help="只运行受该版本以来变更影响的用例")
+    p_run.add_argument("--progress", action="store_true", help="实时输出每个用例结果")
+    p_run.add_argument("--failure-first", action="store_true",
+                       help="按历史排序：最近失败/flaky/新增优先，其余按耗时升序")
+    p_run.add_argument("--fail-fast", type=int, metavar="N", help="确认 N 个失败后中止运行")
+
+    # 查询类命令的公共参数：--master 时改读 Master
+    remote = argparse.ArgumentParser(add_help=False)
+    remote.add_argument("--master", metavar="URL", help="从 Master JSON 接口读取共享历史")
+    remote.add_argument("--project", help="项目过滤（--master 模式）")
+    remote.add_argument("--branch", help="分支过滤（--master 模式，report / failures）")
 
     # report
-    sub.add_parser("report", help="查看最近一次结果")
+    sub.add_parser("report", parents=[remote], help="查看最近一次结果")
 
     # trend
-    p_trend = sub.add_parser("trend", help="查看通过率趋势")
+    p_trend = sub.add_parser("trend", parents=[remote], help="查看通过率趋势")
     p_trend.add_argument("--limit", type=int, default=10)
 
     # failures
-    sub.add_parser("failures", help="查看最近失败用例")
+    sub.add_parser("failures", parents=[remote], help="查看最近失败用例")
 
     # stats
-    p_stats = sub.add_parser("stats", help="高频失败统计")
+    p_stats = sub.add_parser("stats", parents=[remote], help="高频失败统计")
     p_stats.add_argument("--limit", type=int, default=50)
 
+    # import
+    p_import = sub.add_parser("import", help="批量导入历史 json-report 到 Master 库")
+    p_import.add_argument("dir", help="报告文件所在目录（递归查找）")
+    p_import.add_argument("--pattern", default="*.json", help="文件名匹配模式")
+    p_import.add_argument("--db", help="Master 库路径（默认 MASTER_DB 或 master/data/results.db）")
+    p_import.add_argument("--project", default="")
+    p_import.add_argument("--branch", default="")
+    p_import.add_argument("--worker-id", default="import")
+    p_import.add_argument("--jobs", "-j", type=int, default=None, help="解析进程数（默认 CPU 数）")
+    p_import.add_argument("--batch-size", type=int, default=500, help="每个事务写入的运行数")
+
     args = parser.parse_args()
     if not args.cmd:
         parser.print_help()
@@ -145,8 +257,22 @@ def main():
         "trend": cmd_trend,
         "failures": cmd_failures,
         "stats": cmd_stats,
+        "import": cmd_import,
     }
-    exit_code = dispatch[args.cmd](args) or 0
+    if not getattr(args, "master", None):
+        args.client = None
+        sys.exit(dispatch[args.cmd](args) or 0)
+
+    from core.master_client import MasterClient, MasterError
+    with MasterClient(args.master) as client:
+        args.client = client
+        try:
+            exit_code = dispatch[args.cmd](args) or 0
+        except MasterError as e:
+            print(f"✗ {e}")
+            exit_code = 1
+        if client.stale:
+            print("⚠ Master 不可达，以上为本地缓存数据", file=sys.stderr)
     sys.exit(exit_code)
 
 
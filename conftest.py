@@ -5,13 +5,16 @@ pytest hooks — 异步数据采集
 """
 import time
 import pytest
-from core.collector import AsyncCollector, RunResult
+from core.collector import (AsyncCollector, RunResult, failure_from_report, record_report,
+                            tests_from_records)
 from core.storage import TestStorage
 from core.reporter import Reporter
 
 # ── 全局采集器（session 级单例）────────────────────────────
 
 _collector: AsyncCollector | None = None
+_session_start: float = 0.0
+_tests: dict[str, list] = {}   # nodeid → [outcome, duration]
 
 
 def _get_collector() -> AsyncCollector:
@@ -28,9 +31,16 @@ def _get_collector() -> AsyncCollector:
 
 def pytest_sessionstart(session):
     """测试 session 开始：启动后台消费线程"""
+    global _session_start
+    _session_start = time.monotonic()
     _get_collector().start()
 
 
+def pytest_runtest_logreport(report):
+    """每个阶段回调：只在内存中累加 outcome + 耗时"""
+    record_report(_tests, report)
+
+
 def pytest_sessionfinish(session, exitstatus):
     """
     测试 session 结束：
@@ -38,6 +48,9 @@ def pytest_sessionfinish(session, exitstatus):
     2. 调用 stop() 等待后台线程消费完毕（最多 5s）
     """
     collector = _get_collector()
+    if session.config.option.collectonly:
+        collector.stop(timeout=5.0)     # collect-only 不是一次测试运行，不入库
+        return
     tr = session.testscollected   # 可能为 0（收集阶段失败）
 
     # 从 terminalreporter 获取统计（如果可用）
@@ -50,19 +63,10 @@ def pytest_sessionfinish(session, exitstatus):
     skipped = len(stats.get("skipped", []))
     total   = passed + failed + error + skipped
 
-    # 收集失败详情
-    failures = [
-        {
-            "nodeid": r.nodeid,
-            "duration": round(getattr(r, "duration", 0), 3),
-            "message": str(getattr(r, "longrepr", ""))[:800],
-        }
-        for r in stats.get("failed", [])
-    ]
+    # 收集失败详情：只取 longrepr 引用，类型 / 位置 / 信息由后台线程按预算提取
+    failures = [failure_from_report(r) for r in stats.get("failed", [])]
 
-    duration = time.time() - session._setupstate._initialpathargs[0].__dict__.get(
-        "_start_time", time.time()
-    ) if hasattr(session, "_setupstate") else 0.0
+    duration = time.monotonic() - _session_start
 
     # 尝试从 json-report 插件获取精确 duration
     try:
@@ -81,6 +85,7 @@ def pytest_sessionfinish(session, exitstatus):
         duration=round(duration, 2),
         pass_rate=round(passed / max(total, 1) * 100, 1),
         failures=failures,
+        tests=tests_from_records(_tests),
     )
 
     # ✅ 非阻塞投入队列，hook 立即返回
@@ -1,6 +1,24 @@
-from .runner import TestRunner
-from .storage import TestStorage
-from .reporter import Reporter
-from .collector import AsyncCollector, RunResult
+"""
+按需导入：`import core` 不加载 pytest / 存储 / 报告等模块，首次访问对应名称时才导入
+CLI 的只读子命令因此无需承担 TestRunner（pytest）的导入开销
+"""
+import importlib
+
+_EXPORTS = {
+    "TestRunner": ".runner",
+    "TestStorage": ".storage",
+    "Reporter": ".reporter",
+    "AsyncCollector": ".collector",
+    "RunResult": ".collector",
+}
 
 __all__ = ["TestRunner", "TestStorage", "Reporter", "AsyncCollector", "RunResult"]
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
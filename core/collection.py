@@ -0,0 +1,332 @@
+"""
+用例收集索引
+职责：持久化「测试文件 → nodeid / marker / 参数化 ID」索引，按文件 mtime + 内容哈希判断是否失效
+      marker 表达式与 nodeid 选择直接在索引上求值，不再为每次运行做 collect-only
+      只有变更过的文件才重新收集；conftest.py 或 pytest 配置文件变化时全部重新收集（可能影响 marker / 参数化）
+
+哪些文件算测试文件按项目的 pytest 配置判断（python_files、--doctest-modules、--doctest-glob、
+norecursedirs），索引键与 nodeid 一样相对 rootdir；传给 pytest 的参数再换算回相对当前目录
+
+同一模块也是 pytest 插件：`-p core.collection` 且设置 PYTEST_PLATFORM_COLLECT_OUT 时，
+收集结束后把用例信息写入该 JSON 文件
+"""
+import configparser
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import shlex
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import tomllib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+COLLECT_OUT_ENV = "PYTEST_PLATFORM_COLLECT_OUT"
+
+_collect_errors: list[str] = []
+
+
+# ── pytest 插件侧（子进程内运行）────────────────────────────
+
+def pytest_collectreport(report):
+    if report.failed and report.nodeid:
+        _collect_errors.append(report.nodeid.split("::", 1)[0])
+
+
+def pytest_collection_finish(session):
+    out = os.environ.get(COLLECT_OUT_ENV)
+    if not out:
+        return
+    # 收集失败的文件以文件路径作为「用例」入索引，保证选择时仍交给 pytest 报错
+    items = [
+        {"nodeid": path, "file": path, "markers": [], "param_id": None, "error": True}
+        for path in dict.fromkeys(_collect_errors)
+    ] + [
+        {
+            "nodeid": item.nodeid,
+            "file": item.nodeid.split("::", 1)[0],
+            "markers": sorted({m.name for m in item.iter_markers()}),
+            "param_id": getattr(getattr(item, "callspec", None), "id", None),
+        }
+        for item in session.items
+    ]
+    Path(out).write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+
+
+# ── pytest 配置 ───────────────────────────────────────────
+
+_INI_FILES = ("pytest.ini", ".pytest.ini", "pyproject.toml", "tox.ini", "setup.cfg")
+
+
+@dataclass
+class PytestConfig:
+    """与收集范围相关的 pytest 配置（默认值同 pytest）"""
+    rootdir: Path
+    inifile: Optional[Path] = None
+    python_files: list[str] = field(default_factory=lambda: ["test_*.py", "*_test.py"])
+    doctest_modules: bool = False
+    doctest_globs: list[str] = field(default_factory=lambda: ["test*.txt"])
+    norecursedirs: list[str] = field(default_factory=lambda: [
+        "*.egg", ".*", "_darcs", "build", "CVS", "dist", "node_modules", "venv", "{arch}"])
+
+    def is_test_file(self, path: Path) -> bool:
+        if path.suffix == ".py":
+            return self.doctest_modules or _matches(path, self.python_files)
+        return _matches(path, self.doctest_globs)
+
+
+def _matches(path: Path, patterns: list[str]) -> bool:
+    """同 pytest fnmatch_ex：不含路径分隔符的模式只匹配文件名"""
+    return any(fnmatch.fnmatch(path.name if "/" not in p else path.as_posix(), p)
+               for p in patterns)
+
+
+def _ini_section(path: Path) -> Optional[dict]:
+    """读取配置文件中的 pytest 段；pytest.ini 即使没有 [pytest] 段也算命中"""
+    if path.name == "pyproject.toml":
+        with open(path, "rb") as f:
+            return tomllib.load(f).get("tool", {}).get("pytest", {}).get("ini_options")
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read(path, encoding="utf-8")
+    section = "tool:pytest" if path.name == "setup.cfg" else "pytest"
+    if parser.has_section(section):
+        return dict(parser[section])
+    return {} if path.name in ("pytest.ini", ".pytest.ini") else None
+
+
+def _split(value) -> list[str]:
+    return list(value) if isinstance(value, list) else str(value).split()
+
+
+def load_pytest_config(start: Path) -> PytestConfig:
+    """
+    按 pytest 的规则从 start 向上查找配置文件（同一目录内按 _INI_FILES 顺序），
+    其所在目录即 rootdir；找不到时 rootdir 取当前目录
+    """
+    start = start.resolve()
+    for directory in (start, *start.parents):
+        for name in _INI_FILES:
+            path = directory / name
+            if not path.is_file():
+                continue
+            try:
+                options = _ini_section(path)
+            except (OSError, ValueError, configparser.Error) as e:
+                logger.warning(f"CollectionIndex: 无法解析 {path}: {e}")
+                continue
+            if options is not None:
+                return _apply_options(PytestConfig(directory, path), options)
+    return _apply_options(PytestConfig(Path.cwd().resolve()), {})
+
+
+def _apply_options(config: PytestConfig, options: dict) -> PytestConfig:
+    if "python_files" in options:
+        config.python_files = _split(options["python_files"])
+    if "norecursedirs" in options:
+        config.norecursedirs = _split(options["norecursedirs"])
+    addopts = _split(options.get("addopts", "")) if isinstance(options.get("addopts"), list) \
+        else shlex.split(str(options.get("addopts", "")))
+    addopts += shlex.split(os.environ.get("PYTEST_ADDOPTS", ""))
+    globs = []
+    for i, opt in enumerate(addopts):
+        if opt == "--doctest-modules":
+            config.doctest_modules = True
+        elif opt.startswith("--doctest-glob="):
+            globs.append(opt.split("=", 1)[1])
+        elif opt == "--doctest-glob" and i + 1 < len(addopts):
+            globs.append(addopts[i + 1])
+    if globs:
+        config.doctest_globs = globs
+    return config
+
+
+# ── 索引 ─────────────────────────────────────────────────
+
+def _digest(path: Path) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+class CollectionIndex:
+    def __init__(self, db_path: str = "reports/collection.db"):
+        Path(db_path).parent.mkdir(exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()    # 并发运行时串行化刷新
+        self.config = load_pytest_config(Path.cwd())
+        self._init_db()
+
+    def _init_db(self):
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path   TEXT PRIMARY KEY,       -- 相对 rootdir 的路径（与 nodeid 前缀一致）
+                mtime  REAL    NOT NULL,
+                size   INTEGER NOT NULL,
+                digest TEXT    NOT NULL,       -- sha1，mtime 变化但内容未变时免收集
+                items  TEXT    DEFAULT '[]'    -- [{nodeid, markers, param_id}]，conftest 为空
+            )
+        """)
+        self.conn.commit()
+
+    # ── 查询 ─────────────────────────────────────────────
+
+    def select(self, path: str = "tests/", markers: str = None,
+               test_id: str = None) -> Optional[list[str]]:
+        """
+        在索引上解析选择条件，返回需要运行的 nodeid 列表（已换算为相对当前目录的 pytest 参数）
+        返回 None 表示无法在索引上解析（如 marker 表达式非法），调用方应交给 pytest 自行处理
+        """
+        root = (test_id or path).split("::", 1)[0]
+        with self._lock:
+            if not self.refresh(root):
+                return None
+            rows = self.conn.execute("SELECT path, items FROM files ORDER BY path").fetchall()
+        prefix = self._key(Path(root))
+        if test_id and test_id != root:
+            test_id = prefix + test_id[len(root):]
+
+        expression = None
+        if markers:
+            from _pytest.mark.expression import Expression   # 与 pytest -m 同一套求值器
+            try:
+                expression = Expression.compile(markers)
+            except Exception as e:   # ParseError 等：交给 pytest 报错
+                logger.warning(f"CollectionIndex: marker 表达式无法解析 {markers!r}: {e}")
+                return None
+
+        selected = []
+        for row in rows:
+            if not (row["path"] == prefix or row["path"].startswith(prefix + "/") or prefix in ("", ".")):
+                continue
+            for item in json.loads(row["items"]):
+                nodeid = item["nodeid"]
+                if test_id and test_id != root and not (
+                    nodeid == test_id or nodeid.startswith((test_id + "::", test_id + "["))
+                ):
+                    continue
+                if expression is not None and not item.get("error"):
+                    marks = set(item["markers"])
+                    if not expression.evaluate(lambda name, **kwargs: name in marks):
+                        continue
+                selected.append(self._arg(nodeid))
+        if test_id and test_id != root and not selected:
+            return None       # 索引里找不到该 nodeid，交给 pytest 报 not found
+        return selected
+
+    # ── 刷新 ─────────────────────────────────────────────
+
+    def refresh(self, root: str = "tests/") -> bool:
+        """
+        扫描 root 下的测试文件与 conftest，只重新收集内容变化的文件；收集失败返回 False
+        conftest 与 pytest 配置文件视为全局依赖：任一变化时 root 下全部重新收集
+        """
+        base = Path(root)
+        self.config = load_pytest_config(base if base.is_dir() else base.parent)
+        rootdir = self.config.rootdir
+        if base.is_file():
+            candidates = [base]
+        elif base.is_dir():
+            candidates = self._walk(base)
+        else:
+            return False
+        # 上级目录（rootdir 以内）的 conftest 同样影响收集
+        candidates += [p / "conftest.py" for p in base.resolve().parents
+                       if (p / "conftest.py").exists() and p.is_relative_to(rootdir)]
+        if self.config.inifile is not None:
+            candidates.append(self.config.inifile)
+        seen = {self._key(p) for p in candidates}
+
+        cached = {r["path"]: r for r in self.conn.execute("SELECT path, mtime, size, digest FROM files")}
+        stale, touched = [], []
+        for p in candidates:
+            rel, st = self._key(p), p.stat()
+            row = cached.get(rel)
+            if row and row["mtime"] == st.st_mtime and row["size"] == st.st_size:
+                continue
+            digest = _digest(p)
+            if row and row["digest"] == digest:
+                touched.append((st.st_mtime, st.st_size, rel))    # 仅 mtime 变化
+                continue
+            stale.append((rel, st.st_mtime, st.st_size, digest))
+
+        # 删除 root 范围内已不再是测试文件的条目（文件删除或 python_files 变化）
+        prefix = self._key(base)
+        removed = [p for p in cached if p not in seen and base.is_dir()
+                   and (prefix == "." or p.startswith(prefix + "/"))]
+
+        if any(self._is_global(rel) for rel, *_ in stale):
+            stale_paths = {rel for rel, *_ in stale}
+            stale += [(self._key(p), p.stat().st_mtime, p.stat().st_size, _digest(p))
+                      for p in candidates if self._key(p) not in stale_paths]
+
+        items = self._collect([rel for rel, *_ in stale
+                               if not self._is_global(rel)]) if stale else {}
+        if items is None:
+            return False
+
+        self.conn.executemany("UPDATE files SET mtime=?, size=? WHERE path=?", touched)
+        self.conn.executemany("DELETE FROM files WHERE path=?", ((p,) for p in removed))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO files (path, mtime, size, digest, items) VALUES (?,?,?,?,?)",
+            ((rel, mtime, size, digest, json.dumps(items.get(rel, []), ensure_ascii=False))
+             for rel, mtime, size, digest in stale),
+        )
+        self.conn.commit()
+        if stale:
+            logger.info(f"CollectionIndex: 重新收集 {len(stale)} 个文件")
+        return True
+
+    def _collect(self, files: list[str]) -> Optional[dict[str, list[dict]]]:
+        """对指定文件执行一次 collect-only，返回 {文件: [item]}"""
+        if not files:
+            return {}
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "items.json"
+            env = {**os.environ, COLLECT_OUT_ENV: str(out)}
+            cmd = [sys.executable, "-m", "pytest", "--collect-only", "-q",
+                   "-p", "core.collection", "-p", "no:cacheprovider",
+                   *(self._arg(f) for f in files)]
+            proc = subprocess.run(cmd, capture_output=True, text=True, env=env)
+            if not out.exists():
+                logger.warning(f"CollectionIndex: 收集失败 (exit={proc.returncode})")
+                return None
+            grouped: dict[str, list[dict]] = {}
+            for item in json.loads(out.read_text(encoding="utf-8")):
+                grouped.setdefault(item.pop("file"), []).append(item)
+            return grouped
+
+    def _walk(self, base: Path) -> list[Path]:
+        """base 下的测试文件与 conftest，跳过 norecursedirs"""
+        found = []
+        for directory, dirs, files in os.walk(base):
+            dirs[:] = sorted(d for d in dirs
+                             if not any(fnmatch.fnmatch(d, p) for p in self.config.norecursedirs))
+            for name in sorted(files):
+                p = Path(directory) / name
+                if name == "conftest.py" or self.config.is_test_file(p):
+                    found.append(p)
+        return found
+
+    def _is_global(self, key: str) -> bool:
+        inifile = self.config.inifile
+        return Path(key).name == "conftest.py" or (
+            inifile is not None and key == self._key(inifile))
+
+    def _key(self, path: Path) -> str:
+        """文件路径 → 相对 rootdir 的索引键（与 pytest nodeid 的文件部分一致）"""
+        try:
+            return path.resolve().relative_to(self.config.rootdir).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+    def _arg(self, key: str) -> str:
+        """索引键 / nodeid（相对 rootdir）→ 在当前目录下传给 pytest 的参数"""
+        file, sep, rest = key.partition("::")
+        return Path(os.path.relpath(self.config.rootdir / file)).as_posix() + sep + rest
@@ -6,13 +6,23 @@
 import json
 import logging
 import queue
+import re
 import threading
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional
+from typing import Iterable, Optional
 
 logger = logging.getLogger(__name__)
 
+# 失败信息预算（UTF-8 字节）：只遍历 longrepr 结构取所需部分，不格式化整个 traceback
+MESSAGE_BUDGET = 800
+
+_IDENT = re.compile(r"^[A-Za-z_][\w.]*$")
+# 崩溃信息首行 "ValueError: ..." / 无信息的 "ValueError"
+_EXC_HEAD = re.compile(r"^([A-Za-z_][\w.]*)(?::(?:\s|$)|$)")
+# 文本中的 "E   SomeError: ..." 行
+_EXC_LINE = re.compile(r"^(?:E\s+)?([A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt|Warning|Failed))\b")
+
 
 @dataclass
 class RunResult:
@@ -26,6 +36,165 @@ class RunResult:
     duration: float = 0.0
     pass_rate: float = 0.0
     failures: list = field(default_factory=list)
+    tests: list = field(default_factory=list)    # [{nodeid, outcome, duration}]
+
+
+def record_report(tests: dict, report) -> None:
+    """
+    pytest_runtest_logreport 中调用：按 nodeid 累加各阶段耗时并归并 outcome
+    tests: nodeid → [outcome, duration]，只做内存操作
+    """
+    entry = tests.setdefault(report.nodeid, ["passed", 0.0])
+    entry[1] += getattr(report, "duration", 0) or 0
+    if report.failed:
+        if entry[0] != "failed":
+            entry[0] = "failed" if report.when == "call" else "error"
+    elif report.skipped:
+        entry[0] = "xfailed" if hasattr(report, "wasxfail") else "skipped"
+    elif report.when == "call" and hasattr(report, "wasxfail"):
+        entry[0] = "xpassed"
+
+
+def failure_from_report(report) -> dict:
+    """sessionfinish 中调用：只保存 longrepr 引用，字段提取推迟到后台线程（_persist）"""
+    return {
+        "nodeid": report.nodeid,
+        "duration": round(getattr(report, "duration", 0) or 0, 3),
+        "longrepr": getattr(report, "longrepr", None),
+    }
+
+
+def describe_failure(longrepr, budget: int = MESSAGE_BUDGET) -> dict:
+    """
+    longrepr → {exc_type, location, message}，message 不超过 budget 字节
+    只取最终异常（链尾）的崩溃帧：从 ">" 所在源码行开始，连同 "E" 行，到预算为止；
+    native 风格从最后一个 "File" 帧开始；纯文本没有帧结构，取末尾（异常信息在最后）
+    """
+    if longrepr is None:
+        return {"exc_type": "", "location": "", "message": ""}
+    if isinstance(longrepr, tuple):                 # (path, lineno, reason)，skip 形式
+        path, lineno, reason = longrepr
+        return {"exc_type": "", "location": f"{path}:{lineno}",
+                "message": _bounded(str(reason)[:budget].splitlines(), budget)}
+
+    chain = getattr(longrepr, "chain", None)
+    if chain:
+        reprtraceback, reprcrash, _ = chain[-1]
+    else:
+        reprtraceback = getattr(longrepr, "reprtraceback", None)
+        reprcrash = getattr(longrepr, "reprcrash", None)
+    entries = getattr(reprtraceback, "reprentries", None) or []
+    if isinstance(longrepr, str) or (not entries and reprcrash is None):
+        # 纯文本（收集错误等）或插件自定义 repr：后者只能整体格式化
+        text = longrepr if isinstance(longrepr, str) else str(longrepr)
+        message = _bounded_tail(text[-budget:].splitlines(keepends=True), budget)
+        return {"exc_type": _exc_from_lines(reversed(message.splitlines())),
+                "location": "", "message": message}
+
+    entry = entries[-1] if entries else None
+    lines = list(getattr(entry, "lines", None) or [])
+    crash_message = (getattr(reprcrash, "message", "") or "")[:budget]
+    fileloc = getattr(entry, "reprfileloc", None)
+    if getattr(entry, "style", None) == "native":   # native 风格：整段 traceback 文本
+        message = _native_crash(lines, budget)
+    else:                                           # long/short 有帧结构；line/no 只有 "E" 行
+        start = next((i for i, l in enumerate(lines) if l.startswith(">")),
+                     next((i for i, l in enumerate(lines) if l.startswith("E")), 0))
+        message = _bounded(lines[start:] or crash_message.splitlines(), budget)
+
+    if fileloc is not None:
+        location = f"{fileloc.path}:{fileloc.lineno}"
+    elif reprcrash is not None:
+        location = f"{reprcrash.path}:{reprcrash.lineno}"
+    else:
+        location = ""
+    return {"exc_type": _exc_type(fileloc, crash_message, message),
+            "location": location, "message": message}
+
+
+def _native_crash(chunks: list[str], budget: int) -> str:
+    """native 文本块：从最后一个 "  File" 块（崩溃帧）开始取到预算，超长异常信息保留开头"""
+    start = next((i for i in range(len(chunks) - 1, -1, -1)
+                  if chunks[i].startswith('  File "')), None)
+    if start is None:
+        return _bounded_tail(chunks, budget)
+    lines = [line for chunk in chunks[start:] for line in chunk[:budget + 1].splitlines()]
+    return _bounded(lines, budget)
+
+
+def _exc_type(fileloc, crash_message: str, message: str) -> str:
+    # long 风格的位置行为 "test_x.py:6: AssertionError"；short 风格为 "in test_x"，不可用
+    name = getattr(fileloc, "message", "") or ""
+    if _IDENT.match(name):
+        return name
+    first = crash_message.split("\n", 1)[0]
+    if first.startswith("assert"):
+        return "AssertionError"
+    m = _EXC_HEAD.match(first)
+    if m:
+        return m.group(1)
+    return _exc_from_lines(message.splitlines())
+
+
+def _exc_from_lines(lines: Iterable[str]) -> str:
+    for line in lines:
+        m = _EXC_LINE.match(line.strip())
+        if m:
+            return m.group(1)
+    return ""
+
+
+def _bounded(lines: Iterable[str], budget: int) -> str:
+    """按行拼接直到 budget 字节；超长的单行截断（先按字符截再编码，代价只与预算相关）"""
+    out, used = [], 0
+    for line in lines:
+        line = line[:budget]
+        size = len(line.encode("utf-8")) + 1
+        if used + size > budget:
+            rest = budget - used - 1
+            if rest > 0:
+                out.append(line.encode("utf-8")[:rest].decode("utf-8", "ignore"))
+            break
+        out.append(line)
+        used += size
+    return "\n".join(out)
+
+
+def _bounded_tail(chunks: list[str], budget: int) -> str:
+    """从末尾取文本块（自带换行）直到 budget 字节"""
+    out, used = [], 0
+    for chunk in reversed(chunks):
+        chunk = chunk[-budget:]
+        size = len(chunk.encode("utf-8"))
+        if used + size > budget:
+            rest = budget - used
+            if rest > 0:
+                out.append(chunk.encode("utf-8")[-rest:].decode("utf-8", "ignore"))
+            break
+        out.append(chunk)
+        used += size
+    return "".join(reversed(out)).strip("\n")
+
+
+def _finish_failure(failure: dict) -> dict:
+    """把 failure_from_report 的结果转换为可序列化的字段"""
+    if "longrepr" not in failure:
+        return failure
+    done = {k: v for k, v in failure.items() if k != "longrepr"}
+    try:
+        done.update(describe_failure(failure["longrepr"]))
+    except Exception as e:
+        logger.warning(f"AsyncCollector: describe failure {failure.get('nodeid')} failed: {e}")
+        done.update({"exc_type": "", "location": "", "message": ""})
+    return done
+
+
+def tests_from_records(tests: dict) -> list[dict]:
+    """record_report 的累加结果 → [{nodeid, outcome, duration}]"""
+    return [
+        {"nodeid": nodeid, "outcome": outcome, "duration": round(duration, 4)}
+        for nodeid, (outcome, duration) in tests.items()
+    ]
 
 
 class AsyncCollector:
@@ -110,16 +279,9 @@ class AsyncCollector:
 
     def _persist(self, result: RunResult):
         """实际 I/O：写存储 + 生成报告"""
-        data = {
-            "passed": result.passed,
-            "failed": result.failed,
-            "error": result.error,
-            "skipped": result.skipped,
-            "total": result.total,
-            "duration": result.duration,
-            "pass_rate": result.pass_rate,
-            "failures": result.failures,
-        }
+        # 使用 vars() 而非固定字段：Worker 追加的 run_id / worker_id 等属性需一并上报
+        data = dict(vars(result))
+        data["failures"] = [_finish_failure(f) for f in result.failures]
         self._storage.save(data)
         if self._reporter:
             trend = self._storage.get_trend()
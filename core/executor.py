@@ -0,0 +1,243 @@
+"""
+常驻 pytest 执行池（可选）
+职责：维护若干预先 import 好 pytest 及插件的子进程，通过本地管道接收运行请求，
+      省去每次 `python -m pytest` 的解释器启动、插件加载与模块导入开销
+
+要点：
+  - 子进程内复用已导入的测试模块；源文件 mtime 变化时整体剔除项目模块后重新导入
+  - conftest 模块每次运行前剔除，避免 session 级全局状态串到下一次运行
+  - 每个子进程运行 max_runs 次后回收重建，限制状态泄漏
+  - 覆盖率运行不走执行池（已导入模块的 import 期代码无法被重新统计）
+"""
+import atexit
+import logging
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# ── 子进程侧 ──────────────────────────────────────────────
+
+def _project_modules(root: str) -> dict[str, str]:
+    """当前已导入、且源文件位于项目目录内（排除 site-packages）的模块 → 文件路径"""
+    found = {}
+    for name, mod in list(sys.modules.items()):
+        path = getattr(mod, "__file__", None)
+        if path and path.startswith(root) and "site-packages" not in path:
+            found[name] = path
+    return found
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return -1.0
+
+
+def _evict_stale(root: str, snapshot: dict[str, float]):
+    """
+    conftest 每次都剔除；任一项目模块源文件有变化时剔除全部项目模块
+    （模块间依赖关系未知，整体重新导入最稳妥）
+    """
+    modules = _project_modules(root)
+    changed = any(_mtime(p) != snapshot.get(n) for n, p in modules.items() if n in snapshot)
+    for name, path in modules.items():
+        if changed or Path(path).name == "conftest.py":
+            sys.modules.pop(name, None)
+
+
+class _PipeWriter:
+    """子进程 stdout 替身：按行通过管道发回父进程（("line", text)）"""
+    encoding = "utf-8"
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._buf = ""
+
+    def write(self, text: str) -> int:
+        self._buf += text
+        *lines, self._buf = self._buf.split("\n")
+        for line in lines:
+            self._conn.send(("line", line))
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+    def close_line(self):
+        if self._buf:
+            self._conn.send(("line", self._buf))
+            self._buf = ""
+
+
+def _worker_main(conn, root: str, max_runs: int, warmup: list[str]):
+    import pytest   # 预导入：后续每次运行只付出执行本身的开销
+
+    with open(os.devnull, "w") as devnull:
+        stdout = sys.stdout
+        if warmup:
+            # 预先收集一次，导入测试模块；--noconftest 避免触发上报 hooks
+            sys.stdout = devnull
+            pytest.main(["--collect-only", "-q", "--noconftest", "-p", "no:cacheprovider", *warmup])
+            sys.stdout = stdout
+
+        snapshot = {n: _mtime(p) for n, p in _project_modules(root).items()}
+        for _ in range(max_runs):
+            try:
+                args = conn.recv()
+            except EOFError:
+                break
+            if args is None:
+                break
+            _evict_stale(root, snapshot)
+            writer = _PipeWriter(conn)
+            sys.stdout = writer
+            try:
+                code = int(pytest.main(list(args)))
+            except Exception as e:   # pytest 内部异常：回报给父进程，不让子进程带病运行
+                code = -1
+                logger.error(f"WarmExecutor worker: pytest.main 异常: {e}")
+            finally:
+                writer.close_line()
+                sys.stdout = stdout
+            snapshot = {n: _mtime(p) for n, p in _project_modules(root).items()}
+            conn.send(("exit", code))
+    conn.close()
+
+
+# ── 父进程侧 ──────────────────────────────────────────────
+
+class _Worker:
+    def __init__(self, ctx, root: str, max_runs: int, warmup: list[str]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, root, max_runs, warmup),
+            name="pytest-warm-worker",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+        self.max_runs = max_runs
+
+    @property
+    def retired(self) -> bool:
+        return self.runs >= self.max_runs or not self.process.is_alive()
+
+    def call(self, args: list[str], timeout: Optional[float],
+             on_line: Optional[Callable[[str], None]] = None) -> int:
+        self.conn.send(args)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self.conn.poll(remaining):
+                raise TimeoutError(f"pytest 运行超时（{timeout}s）")
+            kind, value = self.conn.recv()
+            if kind == "exit":
+                self.runs += 1
+                return value
+            if on_line is not None:
+                on_line(value)
+
+    def close(self, kill: bool = False):
+        try:
+            if kill:
+                self.process.kill()
+            elif self.process.is_alive():
+                self.conn.send(None)
+            self.process.join(timeout=5)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.conn.close()
+
+
+class WarmExecutor:
+    """
+    常驻执行池
+
+    用法：
+        executor = WarmExecutor(size=2, max_runs=50, warmup=["tests/"])
+        executor.start()
+        exit_code = executor.run(["tests/", "-q", "--json-report", ...])
+    """
+
+    def __init__(self, size: int = 2, max_runs: int = 50, warmup: list[str] = None,
+                 root: str = None):
+        self.size = size
+        self.max_runs = max_runs
+        self.warmup = warmup or []
+        self.root = str(Path(root or os.getcwd()).resolve())
+        # spawn：父进程（uvicorn）有多线程，fork 不安全
+        self._ctx = mp.get_context("spawn")
+        self._idle: queue.Queue = queue.Queue()
+        self._workers: set[_Worker] = set()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+        atexit.register(self.shutdown)
+        logger.info(f"WarmExecutor: started {self.size} workers (max_runs={self.max_runs})")
+
+    def shutdown(self):
+        if not self._started:
+            return
+        self._started = False
+        with self._lock:
+            workers, self._workers = self._workers, set()
+        for w in workers:
+            w.close()
+        logger.debug("WarmExecutor: stopped")
+
+    def run(self, args: list[str], timeout: Optional[float] = None,
+            on_line: Optional[Callable[[str], None]] = None) -> int:
+        """
+        在空闲子进程中执行 pytest.main(args)，返回退出码；无空闲进程时排队等待
+        on_line: 逐行接收 pytest 终端输出
+        """
+        if not self._started:
+            raise RuntimeError("WarmExecutor 未启动")
+        worker = self._idle.get()
+        try:
+            return worker.call(args, timeout, on_line)
+        except (EOFError, OSError, TimeoutError) as e:
+            worker.close(kill=True)
+            raise RuntimeError(f"常驻执行进程异常: {e}") from e
+        finally:
+            self._release(worker)
+
+    # ── 内部实现 ─────────────────────────────────────────
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._ctx, self.root, self.max_runs, self.warmup)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _release(self, worker: _Worker):
+        """归还子进程；达到 max_runs 或已退出的进程回收并补充新进程"""
+        if worker.retired:
+            with self._lock:
+                self._workers.discard(worker)
+            worker.close()
+            if not self._started:
+                return
+            worker = self._spawn()
+        self._idle.put(worker)
@@ -0,0 +1,162 @@
+"""
+测试影响分析（Test Impact Analysis）
+职责：
+  1. 覆盖率运行后，从 pytest-cov 的 per-test context 数据构建「源文件 → 覆盖用例」映射
+  2. 根据 git 变更文件，从映射中选出受影响的用例；映射过期时回退全量运行
+"""
+import fnmatch
+import logging
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# 映射超过该天数视为过期，回退全量运行
+MAX_AGE_DAYS = float(os.environ.get("IMPACT_MAX_AGE_DAYS", "7"))
+# 不影响任何用例的非 Python 文件（fnmatch 模式，逗号分隔）；
+# 其余非 .py 变更（pytest.ini、fixture 数据、模板、依赖等）覆盖率追踪不到，回退全量运行
+IGNORE_PATTERNS = [p.strip() for p in os.environ.get(
+    "IMPACT_IGNORE", "*.md,*.rst,docs/*,LICENSE*,.gitignore"
+).split(",") if p.strip()]
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        proc = subprocess.run(["git", *args], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"impact: git {args[0]} 执行失败: {e}")
+        return None
+    return proc.stdout if proc.returncode == 0 else None
+
+
+def head_revision() -> str:
+    return (_git("rev-parse", "HEAD") or "").strip()
+
+
+def changed_files(rev: str) -> Optional[list[str]]:
+    """相对 rev 的变更文件（含工作区改动与未跟踪文件），路径相对当前目录；git 失败返回 None"""
+    diff = _git("diff", "--name-only", "--relative", rev)
+    if diff is None:
+        return None
+    untracked = _git("ls-files", "--others", "--exclude-standard") or ""
+    files = {p for p in (diff + untracked).splitlines() if p}
+    return sorted(files)
+
+
+def is_test_file(path: str) -> bool:
+    name = Path(path).name
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def is_ignored(path: str) -> bool:
+    return any(fnmatch.fnmatch(path, pattern) for pattern in IGNORE_PATTERNS)
+
+
+def build_coverage_map(coverage_file: Path, root: Path = None) -> dict[str, list[str]]:
+    """
+    读取 `--cov-context=test` 产生的覆盖率数据，返回 {相对路径: [nodeid, ...]}
+    context 形如 "tests/test_x.py::test_a|run"，去掉阶段后缀即为 nodeid
+    """
+    from coverage import CoverageData   # pytest-cov 的依赖，仅覆盖率模式需要
+
+    root = (root or Path.cwd()).resolve()
+    data = CoverageData(basename=str(coverage_file))
+    data.read()
+    mapping: dict[str, list[str]] = {}
+    for measured in data.measured_files():
+        rel = os.path.relpath(measured, root)
+        if rel.startswith(".."):
+            continue
+        nodeids = set()
+        for contexts in (data.contexts_by_lineno(measured) or {}).values():
+            for ctx in contexts:
+                nodeid = ctx.split("|", 1)[0]
+                if nodeid:
+                    nodeids.add(nodeid)
+        if nodeids:
+            mapping[Path(rel).as_posix()] = sorted(nodeids)
+    return mapping
+
+
+def under(nodeid: str, root: Optional[str]) -> bool:
+    """nodeid / 文件是否位于 root（目录、文件或 nodeid 前缀）之下；root 为空表示不限"""
+    if not root:
+        return True
+    if "::" in root:
+        return nodeid == root or nodeid.startswith((root + "::", root + "["))
+    file = os.path.normpath(nodeid.split("::", 1)[0])
+    root = os.path.normpath(root.split("::", 1)[0])
+    return root == "." or file == root or file.startswith(root + os.sep)
+
+
+def select(storage, changed_since: str, path: str = None) -> dict:
+    """
+    计算受影响用例；path 限定只选择该目录 / 文件下的用例
+
+    返回：
+      mode:     "impact"（按映射选择）或 "full"（映射过期/不可用，回退全量）
+      reason:   回退原因
+      targets:  传给 pytest 的 nodeid / 文件列表（mode=impact 时有效）
+      changed_files / selected / overhead / full_suite_estimate
+    """
+    started = time.perf_counter()
+    result = {"mode": "full", "reason": "", "targets": [], "changed_files": 0, "selected": 0}
+
+    def finish(reason: str = "") -> dict:
+        result["reason"] = reason
+        result["overhead"] = round(time.perf_counter() - started, 4)
+        # 以历史平均耗时之和估算全量时间，用于衡量选择开销
+        stats = storage.get_duration_stats(limit=5)
+        result["full_suite_estimate"] = round(sum(s["avg"] for s in stats), 2)
+        if reason:
+            logger.info(f"impact: 回退全量运行 — {reason}")
+        return result
+
+    meta = storage.get_coverage_meta()
+    if not meta:
+        return finish("覆盖映射不存在，请先执行一次 --coverage 运行")
+    age_days = (time.time() - meta["updated_at"]) / 86400
+    if age_days > MAX_AGE_DAYS:
+        return finish(f"覆盖映射已 {age_days:.1f} 天未更新")
+    if meta["revision"] and _git("merge-base", "--is-ancestor", meta["revision"], "HEAD") is None:
+        return finish(f"覆盖映射基于 {meta['revision'][:10]}，不在当前 HEAD 历史中")
+
+    files = changed_files(changed_since)
+    if files is None:
+        return finish(f"无法获取相对 {changed_since} 的变更文件")
+    result["changed_files"] = len(files)
+
+    other = [f for f in files if not f.endswith(".py") and not is_ignored(f)]
+    if other:
+        return finish(f"非 Python 文件 {other[0]} 等 {len(other)} 个发生变更，影响范围无法确定")
+    py_files = [f for f in files if f.endswith(".py")]
+    if any(Path(f).name == "conftest.py" for f in py_files):
+        return finish("conftest.py 发生变更，影响范围无法确定")
+
+    covering = storage.get_covering_tests(py_files)
+    # 构建映射时已存在但无用例覆盖的文件，变更不影响任何用例
+    known = set((_git("ls-tree", "-r", "--name-only", meta["revision"]) or "").splitlines()) \
+        if meta["revision"] else set()
+    nodeids: set[str] = set()
+    extra_files: list[str] = []
+    for f in py_files:
+        if f in covering:
+            nodeids.update(covering[f])
+        elif is_test_file(f):
+            if Path(f).exists() and under(f, path):
+                extra_files.append(f)      # 新增测试文件：整文件运行
+            elif Path(f).exists() and under(path, f):
+                extra_files.append(path)   # path 指向新增测试文件中的某个用例
+        elif Path(f).exists() and f not in known:
+            return finish(f"{f} 为新增文件，不在覆盖映射中")
+
+    # 过滤已删除文件中的用例，避免 pytest 报 not found
+    existing = [n for n in sorted(nodeids) if Path(n.split("::", 1)[0]).exists()]
+    existing = [n for n in existing if n.split("::", 1)[0] not in extra_files and under(n, path)]
+    result["mode"] = "impact"
+    result["targets"] = extra_files + existing
+    result["selected"] = len(result["targets"])
+    return finish()
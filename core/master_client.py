@@ -0,0 +1,148 @@
+"""
+Master 只读客户端（CLI --master 模式）
+职责：通过 Master JSON 接口读取共享历史
+  - 单个 HTTP 长连接（http.client keep-alive），一次命令内的多个请求复用同一连接
+  - 本地响应缓存：按 URL 保存 ETag + 响应体，带 If-None-Match 请求，304 直接用缓存；
+    Master 不可达时退回缓存（标记 stale）
+只用标准库：CLI 冷启动时间敏感，不引入 httpx
+"""
+import http.client
+import json
+import logging
+import os
+import socket
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlencode, urlsplit
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.environ.get("MASTER_CACHE", "reports/master_cache.json")
+CACHE_ENTRIES = int(os.environ.get("MASTER_CACHE_ENTRIES", "200"))
+TIMEOUT = float(os.environ.get("MASTER_TIMEOUT", "10"))
+
+
+class MasterError(Exception):
+    """Master 请求失败且没有可用缓存"""
+
+
+class MasterClient:
+    def __init__(self, base_url: str, cache_path: Optional[str] = CACHE_PATH,
+                 timeout: float = TIMEOUT):
+        parts = urlsplit(base_url if "://" in base_url else f"http://{base_url}")
+        self._scheme = parts.scheme
+        self._netloc = parts.netloc
+        self._prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.stale = False                  # 本次是否有响应来自过期缓存
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self._cache_path = Path(cache_path) if cache_path else None
+        self._cache: Optional[dict] = None
+        self._dirty = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+        self._save_cache()
+
+    # ── 请求 ─────────────────────────────────────────────
+
+    def get(self, path: str, **params) -> object:
+        """GET 并解析 JSON；None 值的参数不发送"""
+        query = urlencode({k: v for k, v in params.items() if v is not None})
+        target = f"{self._prefix}{path}" + (f"?{query}" if query else "")
+        key = f"{self._netloc}{target}"
+        cached = self._load_cache().get(key)
+        headers = {"Accept": "application/json"}
+        if cached:
+            headers["If-None-Match"] = cached["etag"]
+        try:
+            status, etag, body = self._request(target, headers)
+        except (OSError, http.client.HTTPException) as e:
+            if cached:
+                logger.warning(f"MasterClient: {e}; using cached response for {target}")
+                self.stale = True
+                return cached["body"]
+            raise MasterError(f"无法连接 Master {self._netloc}: {e}") from e
+
+        if status == 304 and cached:
+            return cached["body"]
+        if status != 200:
+            raise MasterError(f"HTTP {status} {target}: {body[:200].decode(errors='replace')}")
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise MasterError(f"响应非 JSON: {target}") from e
+        if etag:
+            self._store(key, etag, data)
+        return data
+
+    def _request(self, target: str, headers: dict) -> tuple[int, str, bytes]:
+        """复用长连接；服务端关闭空闲连接时重连一次"""
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request("GET", target, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+                if resp.getheader("Connection", "").lower() == "close":
+                    self._reset()
+                return resp.status, resp.getheader("ETag", ""), body
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._reset()
+                if attempt == 2:
+                    raise
+        raise AssertionError("unreachable")
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            cls = (http.client.HTTPSConnection if self._scheme == "https"
+                   else http.client.HTTPConnection)
+            self._conn = cls(self._netloc, timeout=self.timeout)
+            self._conn.connect()
+            self._conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return self._conn
+
+    def _reset(self):
+        if self._conn:
+            self._conn.close()
+        self._conn = None
+
+    # ── 本地缓存 ─────────────────────────────────────────
+
+    def _load_cache(self) -> dict:
+        if self._cache is None:
+            self._cache = {}
+            if self._cache_path and self._cache_path.exists():
+                try:
+                    self._cache = json.loads(self._cache_path.read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    logger.warning(f"MasterClient: ignoring unreadable cache {self._cache_path}")
+        return self._cache
+
+    def _store(self, key: str, etag: str, body):
+        cache = self._load_cache()
+        cache.pop(key, None)                # 重新插入到末尾：按最近写入淘汰
+        cache[key] = {"etag": etag, "body": body}
+        while len(cache) > CACHE_ENTRIES:
+            cache.pop(next(iter(cache)))
+        self._dirty = True
+
+    def _save_cache(self):
+        if not (self._dirty and self._cache_path):
+            return
+        try:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self._cache_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._cache, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self._cache_path)
+            self._dirty = False
+        except OSError as e:
+            logger.warning(f"MasterClient: failed to write cache {self._cache_path}: {e}")
@@ -0,0 +1,67 @@
+"""
+基于历史的用例排序（failure-first）
+职责：根据 TestStorage 最近的 outcome 历史给用例分桶，让最可能失败的用例最先运行：
+  0. 最近一次运行失败的用例
+  1. 最近 N 次内出现过通过/失败翻转的 flaky 用例
+  2. 新用例（无历史）或所在文件在上次运行后被修改的用例
+  3. 其余用例，按平均耗时升序（越快越先出信号）
+
+同一模块也是 pytest 插件：`-p core.ordering --order-file=<plan.json>` 时在收集完成后重排用例
+"""
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+RECENT_FAILED, FLAKY, NEW_OR_CHANGED, REST = range(4)
+_FAILED = ("failed", "error")
+
+
+def build_plan(storage, window: int = 20) -> dict:
+    """从 TestStorage 生成排序计划：{"tests": {nodeid: [bucket, avg]}, "since": epoch}"""
+    tests = {}
+    for nodeid, h in storage.get_outcome_history(limit=window).items():
+        seq = h["outcomes"]
+        failed = [o in _FAILED for o in seq]
+        if failed[0]:
+            bucket = RECENT_FAILED
+        elif any(a != b for a, b in zip(failed, failed[1:])):
+            bucket = FLAKY
+        else:
+            bucket = REST
+        tests[nodeid] = [bucket, round(h["avg"], 4)]
+
+    last = storage.get_last()
+    since = datetime.fromisoformat(last["timestamp"]).timestamp() if last else time.time()
+    return {"tests": tests, "since": since}
+
+
+# ── pytest 插件侧 ────────────────────────────────────────
+
+def pytest_addoption(parser):
+    parser.addoption("--order-file", default=None,
+                     help="pytest-platform 排序计划（build_plan 生成的 JSON）")
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    path = config.getoption("--order-file")
+    if not path:
+        return
+    plan = json.loads(Path(path).read_text(encoding="utf-8"))
+    tests, since = plan["tests"], plan["since"]
+    changed: dict[Path, bool] = {}
+
+    def key(item) -> tuple:
+        bucket, avg = tests.get(item.nodeid, (NEW_OR_CHANGED, 0.0))
+        if bucket == REST:
+            fspath = Path(item.path)
+            if fspath not in changed:
+                changed[fspath] = fspath.stat().st_mtime > since
+            if changed[fspath]:
+                bucket = NEW_OR_CHANGED
+        return bucket, avg
+
+    items.sort(key=key)     # 稳定排序：同桶同耗时保持收集顺序
@@ -3,6 +3,8 @@
 职责：基于存储数据生成 HTML 报告（无 AI 依赖）
 """
 import json
+import os
+import threading
 from datetime import datetime
 from pathlib import Path
 
@@ -71,6 +73,7 @@ class Reporter:
     def __init__(self, output_dir: str = "reports"):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
+        self._lock = threading.Lock()     # 并发运行（RUN_CONCURRENCY>1）共用同一个 report.html
 
     def generate_html(self, result: dict, trend: list) -> Path:
         failures_html = self._render_failures(result.get("failures", []))
@@ -87,7 +90,11 @@ class Reporter:
             trend_html=trend_html,
         )
         out = self.output_dir / "report.html"
-        out.write_text(html, encoding="utf-8")
+        # 先写临时文件再原子替换：读者（GET /report/html）不会读到写了一半的报告
+        with self._lock:
+            tmp = out.with_name(f".report-{threading.get_ident()}.html")
+            tmp.write_text(html, encoding="utf-8")
+            os.replace(tmp, out)
         return out
 
     def _render_failures(self, failures: list) -> str:
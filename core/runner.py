@@ -4,18 +4,54 @@
 脱离 AI 可独立运行
 """
 import json
+import logging
+import os
+import re
 import subprocess
 import sys
+import uuid
 from pathlib import Path
+from typing import Callable, Optional
+
+from core import impact, ordering
+from core.collection import CollectionIndex
+
+logger = logging.getLogger(__name__)
+
+# 命令行参数总长上限：超过时改为传文件路径（配合 -m 由 pytest 过滤）
+ARGV_BUDGET = 100_000
+# 整个测试套件的根目录：只有完整跑完它的覆盖率运行才整体替换覆盖映射
+SUITE_ROOT = "tests/"
+
+# pytest -v 的单个用例结果行，如 "tests/test_a.py::test_x PASSED   [ 20%]"
+_RESULT_LINE = re.compile(
+    r"^(?P<nodeid>\S+::.+?) (?P<outcome>PASSED|FAILED|ERROR|SKIPPED|XFAIL|XPASS)\b"
+    r"(?:.*\[\s*(?P<progress>\d+)%\])?"
+)
+_COLLECTED_LINE = re.compile(r"collected (?P<count>\d+) items?")
+_OUTCOMES = {"PASSED": "passed", "FAILED": "failed", "ERROR": "error",
+             "SKIPPED": "skipped", "XFAIL": "xfailed", "XPASS": "xpassed"}
+
+# json-report 中用不到、又可能非常大的字段
+_REPORT_OMIT = ["collectors", "keywords", "streams", "log", "warnings"]
+_READ_CHUNK = 1 << 16
 
 
 class TestRunner:
-    def __init__(self, report_dir: str = "reports"):
+    def __init__(self, report_dir: str = "reports", storage=None, executor=None,
+                 use_index: bool = True):
         self.report_dir = Path(report_dir)
         self.report_dir.mkdir(exist_ok=True)
         self.last_report_path = self.report_dir / "last.json"
+        self.storage = storage     # TestStorage，影响分析模式需要
+        self.executor = executor   # WarmExecutor，可选：复用常驻 pytest 进程
+        # 收集索引：marker / nodeid 选择直接在索引上解析
+        self.index = CollectionIndex(str(self.report_dir / "collection.db")) if use_index else None
 
-    def run(self, path: str = "tests/", markers: str = None, test_id: str = None) -> dict:
+    def run(self, path: str = SUITE_ROOT, markers: str = None, test_id: str = None,
+            coverage: bool = False, changed_since: str = None,
+            on_event: Optional[Callable[[dict], None]] = None,
+            failure_first: bool = False, fail_fast: Optional[int] = None) -> dict:
         """
         执行测试，返回结构化结果
 
@@ -23,26 +59,226 @@ class TestRunner:
             path: 测试路径，默认 tests/
             markers: pytest marker 表达式，如 "smoke" / "not slow"
             test_id: 单个测试 nodeid，如 "tests/test_math.py::test_add"
+            coverage: 采集 per-test 覆盖率并更新覆盖映射
+            changed_since: git 版本，只运行受该版本以来变更影响的用例
+            on_event: 进度回调，逐条接收 {"type": "collected"|"test", ...} 事件
+            failure_first: 按历史排序：最近失败 → flaky → 新增/修改 → 其余按耗时升序
+            fail_fast: 确认 N 个失败后中止运行（pytest --maxfail）
         """
+        # 只有不带任何筛选、不会提前中止的全套件运行才能整体替换覆盖映射
+        full_run = not (test_id or markers or fail_fast) and _same_path(path, SUITE_ROOT)
+        targets = [test_id or path]
+        selection = None
+        if self.index is not None and (markers or test_id) and not changed_since:
+            nodeids = self.index.select(path=path, markers=markers, test_id=test_id)
+            # 索引未选中任何用例时同样交给 pytest：索引可能漏收（配置 / 插件差异），不能据此伪造空运行
+            if nodeids:
+                targets = self._target_args(nodeids)
+                if len(targets) == len(nodeids):
+                    markers = None      # 已在索引上求值
+        if changed_since:
+            if self.storage is None:
+                return {"error": "影响分析模式需要 TestRunner(storage=...)"}
+            selection = impact.select(self.storage, changed_since, path=path)
+            if selection["mode"] == "impact":
+                if not selection["targets"]:
+                    return self._empty_result(selection)
+                targets = self._target_args(selection["targets"])
+            else:
+                coverage = True    # 回退全量时顺便重建映射
+
+        # 每次运行使用独立的报告 / 覆盖率文件，允许多个运行并发
+        run_key = uuid.uuid4().hex[:12]
+        report_path = self.report_dir / f".run-{run_key}.json"
+        coverage_file = self.report_dir / f".coverage-{run_key}"
         cmd = [
             sys.executable, "-m", "pytest",
-            test_id or path,
+            *targets,
             "-v", "--tb=short",
             f"--json-report",
-            f"--json-report-file={self.last_report_path}",
+            f"--json-report-file={report_path}",
+            "--json-report-omit", *_REPORT_OMIT,
         ]
         if markers:
             cmd += ["-m", markers]
+        order_file = self.report_dir / f".order-{run_key}.json"
+        if fail_fast:
+            cmd += [f"--maxfail={fail_fast}"]
+        env = None
+        if coverage:
+            cmd += ["--cov=.", "--cov-context=test", "--cov-report="]
+            env = {**os.environ, "COVERAGE_FILE": str(coverage_file)}
+
+        on_line = self._line_parser(on_event) if on_event else None
+        # 临时文件（排序计划 / 报告 / 覆盖率）无论成功、出错还是提前返回都要清理
+        try:
+            if failure_first and self.storage is not None:
+                order_file.write_text(json.dumps(ordering.build_plan(self.storage)),
+                                      encoding="utf-8")
+                cmd += ["-p", "core.ordering", f"--order-file={order_file}"]
+            if self.executor is not None and not coverage:
+                try:
+                    returncode = self.executor.run(cmd[3:], on_line=on_line)  # 去掉 "python -m pytest"
+                except RuntimeError as e:
+                    return {"error": str(e)}
+            else:
+                returncode = self._stream(cmd, env, on_line)
+
+            if not report_path.exists():
+                return {"error": "报告文件未生成，请确认 pytest-json-report 已安装"}
+
+            normalized = self._normalize(self._read_report(report_path), returncode)
+            os.replace(report_path, self.last_report_path)
+            if coverage:
+                partial = selection is not None and selection["mode"] == "impact"
+                self._update_coverage_map(coverage_file, normalized, full=full_run and not partial)
+        finally:
+            for leftover in (order_file, report_path, coverage_file):
+                leftover.unlink(missing_ok=True)
+        if selection is not None:
+            normalized["impact"] = {k: v for k, v in selection.items() if k != "targets"}
+        return normalized
+
+    # ── 输出流与报告解析 ─────────────────────────────────
+
+    @staticmethod
+    def _stream(cmd: list[str], env: Optional[dict],
+                on_line: Optional[Callable[[str], None]]) -> int:
+        """逐行读取子进程输出（不在内存中累积），返回退出码"""
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              text=True, errors="replace", bufsize=1, env=env) as proc:
+            for line in proc.stdout:
+                if on_line is not None:
+                    on_line(line.rstrip("\n"))
+        return proc.returncode
+
+    @staticmethod
+    def _line_parser(on_event: Callable[[dict], None]) -> Callable[[str], None]:
+        """把 pytest -v 输出行转换为进度事件"""
+        def parse(line: str):
+            m = _RESULT_LINE.match(line)
+            if m:
+                event = {"type": "test", "nodeid": m["nodeid"],
+                         "outcome": _OUTCOMES[m["outcome"]]}
+                if m["progress"]:
+                    event["progress"] = int(m["progress"])
+                on_event(event)
+                return
+            m = _COLLECTED_LINE.search(line)
+            if m:
+                on_event({"type": "collected", "count": int(m["count"])})
+        return parse
+
+    @staticmethod
+    def _read_report(path: Path) -> dict:
+        """
+        增量解析 json-report：顶层字段逐个解码，tests 数组逐元素解码并立即裁剪，
+        峰值内存只与单个用例相关，而不是整份报告
+        """
+        decoder = json.JSONDecoder()
+        with open(path, encoding="utf-8") as f:
+            buf, pos, eof = f.read(_READ_CHUNK), 0, False
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+            def refill() -> bool:
+                nonlocal buf, pos, eof
+                more = f.read(_READ_CHUNK)
+                buf, pos, eof = buf[pos:] + more, 0, not more
+                return bool(more)
 
-        if not self.last_report_path.exists():
-            return {"error": "报告文件未生成，请确认 pytest-json-report 已安装"}
+            def peek() -> str:
+                nonlocal pos
+                while True:
+                    while pos < len(buf) and buf[pos] in " \t\r\n":
+                        pos += 1
+                    if pos < len(buf):
+                        return buf[pos]
+                    if not refill():
+                        return ""
 
-        data = json.loads(self.last_report_path.read_text(encoding="utf-8"))
-        return self._normalize(data, result.returncode)
+            def value():
+                nonlocal pos
+                while True:
+                    peek()
+                    try:
+                        obj, end = decoder.raw_decode(buf, pos)
+                    except json.JSONDecodeError:
+                        if refill():
+                            continue
+                        raise
+                    # 值之后必须紧跟分隔符；否则数字等可能在缓冲区边界被截断，补读后重试
+                    rest = buf[end:].lstrip()
+                    if not eof and (not rest or rest[0] not in ",]}:") and refill():
+                        continue
+                    pos = end
+                    return obj
 
-    def _normalize(self, raw: dict, exit_code: int) -> dict:
+            def expect(ch: str):
+                nonlocal pos
+                if peek() != ch:
+                    raise ValueError(f"json-report 格式错误：期望 {ch!r}")
+                pos += 1
+
+            report: dict = {}
+            expect("{")
+            while peek() != "}":
+                key = value()
+                expect(":")
+                if key == "tests":
+                    tests = []
+                    expect("[")
+                    while peek() != "]":
+                        tests.append(TestRunner._slim_test(value()))
+                        if peek() == ",":
+                            expect(",")
+                    expect("]")
+                    report[key] = tests
+                else:
+                    report[key] = value()
+                if peek() == ",":
+                    expect(",")
+            return report
+
+    @staticmethod
+    def _slim_test(t: dict) -> dict:
+        """只保留 _normalize 需要的字段"""
+        slim = {"nodeid": t["nodeid"], "outcome": t.get("outcome", "")}
+        for stage in ("setup", "call", "teardown"):
+            if stage in t:
+                slim[stage] = {"duration": t[stage].get("duration", 0)}
+        if "longrepr" in t.get("call", {}):
+            slim["call"]["longrepr"] = (t["call"]["longrepr"] or "")[:800]
+        return slim
+
+    @staticmethod
+    def _target_args(nodeids: list[str]) -> list[str]:
+        """nodeid 过多超出命令行长度时，退化为所在文件列表"""
+        if sum(len(n) + 1 for n in nodeids) <= ARGV_BUDGET:
+            return nodeids
+        return list(dict.fromkeys(n.split("::", 1)[0] for n in nodeids))
+
+    def _update_coverage_map(self, coverage_file: Path, result: dict, full: bool):
+        """
+        覆盖率运行结束后更新覆盖映射；全套件运行整体替换，
+        其余（子目录 / 筛选 / --maxfail 提前中止 / 影响分析）只替换实际运行过的用例
+        """
+        if self.storage is None or not coverage_file.exists():
+            return
+        try:
+            mapping = impact.build_coverage_map(coverage_file)
+        except ImportError:
+            logger.warning("TestRunner: 未安装 coverage，跳过覆盖映射更新")
+            return
+        ran = None if full else [t["nodeid"] for t in result.get("tests", [])]
+        self.storage.save_coverage_map(mapping, impact.head_revision(), ran=ran)
+
+    def _empty_result(self, selection: dict) -> dict:
+        """影响分析未选中任何用例：不启动 pytest"""
+        result = self._normalize({"summary": {"total": 0}}, 0)
+        result["impact"] = {k: v for k, v in selection.items() if k != "targets"}
+        return result
+
+    @staticmethod
+    def _normalize(raw: dict, exit_code: int) -> dict:
         summary = raw.get("summary", {})
         tests = raw.get("tests", [])
         failures = [
@@ -53,6 +289,16 @@ class TestRunner:
             }
             for t in tests if t.get("outcome") == "failed"
         ]
+        # 全量用例 outcome + 耗时（setup/call/teardown 之和），供耗时历史使用
+        timings = [
+            {
+                "nodeid": t["nodeid"],
+                "outcome": t.get("outcome", ""),
+                "duration": round(sum(t.get(stage, {}).get("duration", 0)
+                                      for stage in ("setup", "call", "teardown")), 4),
+            }
+            for t in tests
+        ]
         total = summary.get("total", 1)
         passed = summary.get("passed", 0)
         return {
@@ -65,4 +311,9 @@ class TestRunner:
             "pass_rate": round(passed / total * 100, 1) if total else 0,
             "exit_code": exit_code,
             "failures": failures,
+            "tests": timings,
         }
+
+
+def _same_path(a: str, b: str) -> bool:
+    return os.path.normpath(a) == os.path.normpath(b)
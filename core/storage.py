@@ -3,15 +3,40 @@
 职责：持久化每次运行结果，支持趋势查询
 使用 SQLite，无外部依赖
 """
+import functools
 import json
 import sqlite3
+import threading
+import time
+from array import array
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+from core import timings
+
+
+def _serialized(fn):
+    """同一连接上的事务与游标不能交错：API 的任务线程（RUN_CONCURRENCY>1）与请求线程共用一个连接"""
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return fn(self, *args, **kwargs)
+    return wrapper
+
 
 class TestStorage:
-    def __init__(self, db_path: str = "reports/history.db"):
+    def __init__(self, db_path: str = "reports/history.db", readonly: bool = False):
+        """readonly：只读打开已有库，不建目录、不建表（库不存在抛 FileNotFoundError），供查询类命令使用"""
+        self._lock = threading.RLock()
+        if readonly:
+            path = Path(db_path)
+            if not path.exists():
+                raise FileNotFoundError(db_path)
+            self.conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True,
+                                        check_same_thread=False)
+            self.conn.row_factory = sqlite3.Row
+            return
         Path(db_path).parent.mkdir(exist_ok=True)
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
@@ -32,39 +57,65 @@ class TestStorage:
                 failures  TEXT    DEFAULT '[]'
             )
         """)
+        self.conn.executescript(timings.SCHEMA)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS coverage_map (
+                path     TEXT PRIMARY KEY,           -- 源文件相对路径
+                test_ids BLOB NOT NULL               -- array('I')，覆盖该文件的用例
+            );
+
+            CREATE TABLE IF NOT EXISTS coverage_meta (
+                id         INTEGER PRIMARY KEY CHECK (id = 1),
+                revision   TEXT DEFAULT '',          -- 构建映射时的 git HEAD
+                updated_at REAL NOT NULL
+            );
+        """)
         self.conn.commit()
 
+    @_serialized
     def save(self, result: dict) -> int:
-        cur = self.conn.execute("""
-            INSERT INTO runs
-              (timestamp, passed, failed, error, skipped, total, duration, pass_rate, failures)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            datetime.now().isoformat(timespec="seconds"),
-            result.get("passed", 0),
-            result.get("failed", 0),
-            result.get("error", 0),
-            result.get("skipped", 0),
-            result.get("total", 0),
-            result.get("duration", 0),
-            result.get("pass_rate", 0),
-            json.dumps(result.get("failures", []), ensure_ascii=False),
-        ))
+        try:
+            cur = self.conn.execute("""
+                INSERT INTO runs
+                  (timestamp, passed, failed, error, skipped, total, duration, pass_rate, failures)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                datetime.now().isoformat(timespec="seconds"),
+                result.get("passed", 0),
+                result.get("failed", 0),
+                result.get("error", 0),
+                result.get("skipped", 0),
+                result.get("total", 0),
+                result.get("duration", 0),
+                result.get("pass_rate", 0),
+                json.dumps(result.get("failures", []), ensure_ascii=False),
+            ))
+            if result.get("tests"):
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO run_timings VALUES (?, ?, ?, ?, ?)",
+                    (str(cur.lastrowid), *timings.pack(self.conn, result["tests"])),
+                )
+        except Exception:
+            self.conn.rollback()
+            raise
         self.conn.commit()
         return cur.lastrowid
 
+    @_serialized
     def get_last(self) -> Optional[dict]:
         row = self.conn.execute(
             "SELECT * FROM runs ORDER BY id DESC LIMIT 1"
         ).fetchone()
         return self._row_to_dict(row) if row else None
 
+    @_serialized
     def get_history(self, limit: int = 20) -> list[dict]:
         rows = self.conn.execute(
             "SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,)
         ).fetchall()
         return [self._row_to_dict(r) for r in rows]
 
+    @_serialized
     def get_trend(self, limit: int = 10) -> list[dict]:
         rows = self.conn.execute(
             "SELECT timestamp, passed, failed, total, pass_rate FROM runs ORDER BY id DESC LIMIT ?",
@@ -72,6 +123,7 @@ class TestStorage:
         ).fetchall()
         return [dict(r) for r in reversed(rows)]
 
+    @_serialized
     def get_failure_stats(self, limit: int = 50) -> list[dict]:
         """统计最近 N 次中失败频率最高的用例"""
         rows = self.conn.execute(
@@ -86,6 +138,81 @@ class TestStorage:
             key=lambda x: -x["fail_count"]
         )
 
+    @_serialized
+    def get_duration_stats(self, limit: int = 20) -> list[dict]:
+        """最近 N 次运行中每个用例的耗时统计（avg/p50/p95/max/last），一次返回整套用例"""
+        rows = self.conn.execute("""
+            SELECT t.test_ids, t.outcomes, t.durations
+            FROM run_timings t JOIN runs r ON t.run_id = CAST(r.id AS TEXT)
+            ORDER BY r.id DESC LIMIT ?
+        """, (limit,)).fetchall()
+        return timings.summarize(self.conn, rows)
+
+    @_serialized
+    def get_outcome_history(self, limit: int = 20) -> dict[str, dict]:
+        """最近 N 次运行中每个用例的 outcome 序列（新→旧）与平均耗时，用于排序调度"""
+        rows = self.conn.execute("""
+            SELECT t.test_ids, t.outcomes, t.durations
+            FROM run_timings t JOIN runs r ON t.run_id = CAST(r.id AS TEXT)
+            ORDER BY r.id DESC LIMIT ?
+        """, (limit,)).fetchall()
+        return timings.outcome_history(self.conn, rows)
+
+    # ── 覆盖映射（测试影响分析）─────────────────────────────
+
+    @_serialized
+    def save_coverage_map(self, mapping: dict[str, list[str]], revision: str = "",
+                          ran: list[str] = None):
+        """
+        保存「源文件 → 覆盖用例」映射
+        ran 为 None 表示全量运行，整体替换；否则只替换这些用例的覆盖关系
+        只有全量运行刷新 coverage_meta（revision / updated_at）：部分更新的映射不能算作新鲜
+        """
+        all_nodeids = sorted({n for v in mapping.values() for n in v} | set(ran or []))
+        ids = dict(zip(all_nodeids, timings.intern_nodeids(self.conn, all_nodeids)))
+        merged: dict[str, set[int]] = {}
+        if ran is not None:
+            ran_ids = {ids[n] for n in ran}
+            for row in self.conn.execute("SELECT path, test_ids FROM coverage_map"):
+                kept = set(array("I", row["test_ids"])) - ran_ids
+                if kept:
+                    merged[row["path"]] = kept
+        for path, nodeids in mapping.items():
+            merged.setdefault(path, set()).update(ids[n] for n in nodeids)
+
+        self.conn.execute("DELETE FROM coverage_map")
+        self.conn.executemany(
+            "INSERT INTO coverage_map (path, test_ids) VALUES (?, ?)",
+            ((path, array("I", sorted(v)).tobytes()) for path, v in merged.items()),
+        )
+        if ran is None:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO coverage_meta (id, revision, updated_at) VALUES (1, ?, ?)",
+                (revision, time.time()),
+            )
+        self.conn.commit()
+
+    @_serialized
+    def get_covering_tests(self, paths: list[str]) -> dict[str, list[str]]:
+        """返回映射中存在的 path → 覆盖它的 nodeid 列表"""
+        found: dict[str, array] = {}
+        for path in paths:
+            row = self.conn.execute(
+                "SELECT test_ids FROM coverage_map WHERE path=?", (path,)
+            ).fetchone()
+            if row:
+                found[path] = array("I", row["test_ids"])
+        names = timings.resolve_ids(self.conn, (i for v in found.values() for i in v))
+        return {path: [names[i] for i in v if i in names] for path, v in found.items()}
+
+    @_serialized
+    def get_coverage_meta(self) -> Optional[dict]:
+        row = self.conn.execute(
+            "SELECT revision, updated_at, (SELECT COUNT(*) FROM coverage_map) AS files "
+            "FROM coverage_meta WHERE id=1"
+        ).fetchone()
+        return dict(row) if row else None
+
     def _row_to_dict(self, row: sqlite3.Row) -> dict:
         d = dict(row)
         d["failures"] = json.loads(d.get("failures") or "[]")
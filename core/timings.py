@@ -0,0 +1,176 @@
+"""
+用例级耗时列存
+职责：把一次运行中每个用例的 outcome / duration 压成数组列（每次运行一行），
+      供 TestStorage 与 MasterStorage 共用，避免「一个用例一行」的膨胀
+格式：nodeid 先驻留为整数 ID，再以 array 字节串存储
+"""
+import sqlite3
+import statistics
+from array import array
+from typing import Callable, Iterable, Iterator, Optional
+
+# outcome 编码：一个用例一个字节
+OUTCOMES = ("passed", "failed", "error", "skipped", "xfailed", "xpassed")
+OUTCOME_CODES = {name: code for code, name in enumerate(OUTCOMES)}
+
+# SQLite 单条语句参数上限保守取值
+_CHUNK = 900
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS test_ids (
+        id     INTEGER PRIMARY KEY AUTOINCREMENT,
+        nodeid TEXT    NOT NULL UNIQUE
+    );
+
+    CREATE TABLE IF NOT EXISTS run_timings (
+        run_id    TEXT    PRIMARY KEY,        -- 关联 runs
+        count     INTEGER NOT NULL,
+        test_ids  BLOB    NOT NULL,           -- array('I')
+        outcomes  BLOB    NOT NULL,           -- array('B')
+        durations BLOB    NOT NULL            -- array('f')，单位秒
+    );
+"""
+
+
+def intern_nodeids(conn: sqlite3.Connection, nodeids: list[str],
+                   cache: Optional[dict[str, int]] = None) -> list[int]:
+    """
+    将 nodeid 映射为稳定的整数 ID（不存在则插入），顺序与入参一致
+    用例集合很少变化：先查后插，只插入新出现的；cache 供批量写入在多次调用间复用（ID 一经分配不会改变）
+    """
+    mapping = cache if cache is not None else {}
+    unknown = [n for n in dict.fromkeys(nodeids) if n not in mapping]
+    if unknown:
+        mapping.update(lookup_ids(conn, unknown))
+        missing = [n for n in unknown if n not in mapping]
+        if missing:
+            conn.executemany(
+                "INSERT OR IGNORE INTO test_ids (nodeid) VALUES (?)",
+                ((n,) for n in missing),
+            )
+            mapping.update(lookup_ids(conn, missing))
+    return [mapping[n] for n in nodeids]
+
+
+def lookup_ids(conn: sqlite3.Connection, nodeids: Iterable[str]) -> dict[str, int]:
+    """nodeid → 整数 ID（只查不插，未驻留的 nodeid 不出现在结果中）"""
+    mapping: dict[str, int] = {}
+    unique = list(dict.fromkeys(nodeids))
+    for i in range(0, len(unique), _CHUNK):
+        chunk = unique[i:i + _CHUNK]
+        marks = ",".join("?" * len(chunk))
+        for row in conn.execute(
+            f"SELECT id, nodeid FROM test_ids WHERE nodeid IN ({marks})", chunk
+        ):
+            mapping[row[1]] = row[0]
+    return mapping
+
+
+def resolve_ids(conn: sqlite3.Connection, ids: Iterable[int]) -> dict[int, str]:
+    """整数 ID → nodeid"""
+    unique = list(set(ids))
+    result: dict[int, str] = {}
+    for i in range(0, len(unique), _CHUNK):
+        chunk = unique[i:i + _CHUNK]
+        marks = ",".join("?" * len(chunk))
+        for row in conn.execute(
+            f"SELECT id, nodeid FROM test_ids WHERE id IN ({marks})", chunk
+        ):
+            result[row[0]] = row[1]
+    return result
+
+
+def pack(conn: sqlite3.Connection, tests: list[dict],
+         cache: Optional[dict[str, int]] = None) -> tuple[int, bytes, bytes, bytes]:
+    """[{nodeid, outcome, duration}] → (count, test_ids, outcomes, durations)"""
+    ids = array("I", intern_nodeids(conn, [t["nodeid"] for t in tests], cache))
+    outcomes, durations = encode(tests)
+    return len(ids), ids.tobytes(), outcomes.tobytes(), durations.tobytes()
+
+
+def encode(tests: list[dict]) -> tuple[array, array]:
+    """[{nodeid, outcome, duration}] → (outcomes, durations) 数组（nodeid 由调用方驻留）"""
+    outcomes = array("B", (OUTCOME_CODES.get(t.get("outcome", ""), OUTCOME_CODES["error"])
+                           for t in tests))
+    durations = array("f", (float(t.get("duration", 0) or 0) for t in tests))
+    return outcomes, durations
+
+
+def unpack(ids_blob: bytes, outcomes_blob: bytes,
+           durations_blob: bytes) -> tuple[array, array, array]:
+    ids, outcomes, durations = array("I"), array("B"), array("f")
+    ids.frombytes(ids_blob)
+    outcomes.frombytes(outcomes_blob)
+    durations.frombytes(durations_blob)
+    return ids, outcomes, durations
+
+
+def iter_tests(rows: Iterable[sqlite3.Row]) -> Iterator[tuple[int, int, float]]:
+    """逐行解码 run_timings，产出 (test_id, outcome_code, duration)"""
+    for row in rows:
+        yield from zip(*unpack(row["test_ids"], row["outcomes"], row["durations"]))
+
+
+def summarize(conn: sqlite3.Connection, rows: Iterable[sqlite3.Row]) -> list[dict]:
+    """
+    汇总多次运行（rows 按时间倒序）的用例耗时统计
+    返回按平均耗时降序排列的列表
+    """
+    return summarize_tests(iter_tests(rows), lambda ids: resolve_ids(conn, ids))
+
+
+def summarize_tests(tests: Iterable[tuple[int, int, float]],
+                    resolve: Callable[[Iterable[int]], dict[int, str]]) -> list[dict]:
+    """summarize 的存储无关部分：tests 为按时间倒序的 (test_id, outcome_code, duration)"""
+    samples: dict[int, list[float]] = {}
+    fails: dict[int, int] = {}
+    failed_codes = (OUTCOME_CODES["failed"], OUTCOME_CODES["error"])
+    for test_id, outcome, duration in tests:
+        if outcome == OUTCOME_CODES["skipped"]:
+            continue
+        samples.setdefault(test_id, []).append(duration)
+        if outcome in failed_codes:
+            fails[test_id] = fails.get(test_id, 0) + 1
+
+    names = resolve(samples)
+    stats = []
+    for test_id, values in samples.items():
+        ordered = sorted(values)
+        stats.append({
+            "nodeid": names.get(test_id, ""),
+            "runs": len(values),
+            "avg": round(sum(values) / len(values), 4),
+            "p50": round(statistics.median(ordered), 4),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+            "max": round(ordered[-1], 4),
+            "last": round(values[0], 4),
+            "fail_count": fails.get(test_id, 0),
+        })
+    stats.sort(key=lambda s: -s["avg"])
+    return stats
+
+
+def outcome_history(conn: sqlite3.Connection, rows: Iterable[sqlite3.Row]) -> dict[str, dict]:
+    """
+    多次运行（rows 按时间倒序）的逐用例 outcome 序列
+    返回 {nodeid: {"outcomes": [outcome, ...]（新→旧）, "avg": 平均耗时}}，跳过的运行不计入
+    """
+    return outcome_history_tests(iter_tests(rows), lambda ids: resolve_ids(conn, ids))
+
+
+def outcome_history_tests(tests: Iterable[tuple[int, int, float]],
+                          resolve: Callable[[Iterable[int]], dict[int, str]]) -> dict[str, dict]:
+    """outcome_history 的存储无关部分"""
+    outcomes: dict[int, list[str]] = {}
+    totals: dict[int, float] = {}
+    skipped = OUTCOME_CODES["skipped"]
+    for test_id, outcome, duration in tests:
+        if outcome == skipped:
+            continue
+        outcomes.setdefault(test_id, []).append(OUTCOMES[outcome])
+        totals[test_id] = totals.get(test_id, 0.0) + duration
+    names = resolve(outcomes)
+    return {
+        names[test_id]: {"outcomes": seq, "avg": totals[test_id] / len(seq)}
+        for test_id, seq in outcomes.items() if test_id in names
+    }
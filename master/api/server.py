@@ -5,29 +5,69 @@ HTML 由 Master 内部 Renderer 生成，MCP 直接调用此接口获取完整
 
 启动：uvicorn master.api.server:app --host 0.0.0.0 --port 8080
 """
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
 import sys
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
 import logging
 
 from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.responses import HTMLResponse, JSONResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import (HTMLResponse, JSONResponse, PlainTextResponse, Response,
+                               StreamingResponse)
+from pydantic import BaseModel, Field, field_validator
 
 logger = logging.getLogger(__name__)
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
-from master.core.storage import MasterStorage
+from master.core.backend import open_backend
 from master.core.renderer import Renderer
+from master.core.digest import build_digest
+from master.core.events import EventBus
+from master.core.admission import Admission, Rejected, parse_rates, retry_after_header
+from master.core import metrics
 
 app = FastAPI(
     title="pytest-platform Master API",
     description="Master 数据服务：JSON 接口 + /report/html 聚合报告（Jinja2 渲染）",
     version="2.0.0",
 )
-storage = MasterStorage()
+MASTER_BACKEND = os.environ.get("MASTER_BACKEND", "sqlite")   # sqlite | memory（不落盘）
+MASTER_DB = os.environ.get("MASTER_DB", "master/data/results.db")
+SKETCH_WINDOW_SECONDS = int(os.environ.get("SKETCH_WINDOW_SECONDS", "86400"))
+SKETCH_RETENTION_WINDOWS = int(os.environ.get("SKETCH_RETENTION_WINDOWS", "30"))
+
+# /report/html 最多列出的失败聚类数，其余汇总为「+N 类未列出」
+REPORT_CLUSTERS = int(os.environ.get("REPORT_CLUSTERS", "100"))
+
+EVENTS_BUFFER = int(os.environ.get("EVENTS_BUFFER", "256"))
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get("EVENTS_MAX_SUBSCRIBERS", "1000"))
+EVENTS_HEARTBEAT = float(os.environ.get("EVENTS_HEARTBEAT", "15"))
+
+# 上报准入：每个 (worker_id, project) 每秒 ADMISSION_RATE 次、突发 ADMISSION_BURST 次（0 关闭限速）
+ADMISSION_RATE = float(os.environ.get("ADMISSION_RATE", "1"))
+ADMISSION_BURST = float(os.environ.get("ADMISSION_BURST", "20"))
+ADMISSION_OVERRIDES = os.environ.get("ADMISSION_OVERRIDES", "")      # worker@project=rate[/burst],...
+ADMISSION_MAX_PENDING = int(os.environ.get("ADMISSION_MAX_PENDING", "4"))
+# 排队等待写入的上限，须小于 Worker 的 WORKER_UPLOAD_TIMEOUT（默认 10s），否则 Worker 超时重传时原请求仍在排队
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "5"))
+ADMISSION_MAX_BUCKETS = int(os.environ.get("ADMISSION_MAX_BUCKETS", "10000"))   # 令牌桶数上限（LRU）
+ADMISSION_IDLE_TTL = float(os.environ.get("ADMISSION_IDLE_TTL", "600"))         # 闲置多久回收令牌桶（秒）
+
+storage = open_backend(MASTER_BACKEND, MASTER_DB, sketch_window=SKETCH_WINDOW_SECONDS,
+                       sketch_retention=SKETCH_RETENTION_WINDOWS)
+events = EventBus(buffer=EVENTS_BUFFER, max_subscribers=EVENTS_MAX_SUBSCRIBERS)
 renderer = Renderer()
+admission = Admission(rate=ADMISSION_RATE, burst=ADMISSION_BURST,
+                      overrides=parse_rates(ADMISSION_OVERRIDES),
+                      max_pending=ADMISSION_MAX_PENDING, queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+                      max_buckets=ADMISSION_MAX_BUCKETS, idle_ttl=ADMISSION_IDLE_TTL)
 
 
 # ── 全局异常处理 ──────────────────────────────────────────
@@ -41,12 +81,83 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 
+# ── 条件请求（ETag）──────────────────────────────────────
+
+# 不参与 ETag 的路径：健康检查与文档
+_ETAG_SKIP = ("/health", "/docs", "/redoc", "/openapi.json", "/events", "/metrics", "/admission")
+
+
+@app.middleware("http")
+async def etag_middleware(request: Request, call_next):
+    """
+    GET 查询的 ETag = 数据版本 + 请求路径/参数摘要；数据未变化时直接 304，不再查询与渲染。
+    任何上报写入都会推进数据版本，使全部旧 ETag 失效。
+    """
+    if request.method != "GET" or request.url.path.startswith(_ETAG_SKIP):
+        return await call_next(request)
+    target = f"{request.url.path}?{request.url.query}".encode()
+    etag = f'W/"{storage.data_version}-{hashlib.sha1(target).hexdigest()[:16]}"'
+    if etag in request.headers.get("if-none-match", ""):
+        metrics.ETAG_REQUESTS.inc(1, "hit")
+        return Response(status_code=304, headers={"ETag": etag})
+    metrics.ETAG_REQUESTS.inc(1, "miss")
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers["ETag"] = etag
+    return response
+
+
+# ── 指标 ─────────────────────────────────────────────────
+
+metrics.REGISTRY.gauge("master_event_subscribers", "当前 /events 订阅者数",
+                       lambda: events.subscribers)
+metrics.REGISTRY.gauge("master_event_dropped_total", "因消费过慢被断开的订阅者累计数",
+                       lambda: events.dropped, kind="counter")
+metrics.REGISTRY.gauge("master_event_published_total", "已发布事件累计数",
+                       lambda: events.published, kind="counter")
+metrics.REGISTRY.gauge("master_admission_pending", "等待写入闸门的上报请求数",
+                       lambda: admission.pending)
+
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    """按路由模板（而非实际路径）统计请求耗时，避免 run_id 等参数造成标签爆炸；最外层，含 304"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        if route is not None:
+            label = route.path
+        else:       # ETag 命中在路由之前就返回了
+            label = "etag_hit" if status == 304 else "unmatched"
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - start, request.method,
+                                     label, str(status))
+
+
+@app.get("/metrics", response_class=PlainTextResponse, summary="Prometheus 指标")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.REGISTRY.exposition(),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # ── 数据模型 ──────────────────────────────────────────────
 
 class FailureItem(BaseModel):
     nodeid: str
     duration: float = 0.0
     message: str = ""
+    exc_type: str = ""      # 异常类型，如 AssertionError
+    location: str = ""      # 崩溃位置 path:lineno
+
+
+class TestItem(BaseModel):
+    nodeid: str
+    outcome: str = ""
+    duration: float = 0.0
 
 
 class RunPayload(BaseModel):
@@ -54,7 +165,7 @@ class RunPayload(BaseModel):
     worker_id: str = Field(..., description="Worker 标识，如 hostname 或容器 ID")
     project: str = ""
     branch: str = ""
-    timestamp: Optional[str] = None
+    timestamp: Optional[str] = Field(None, description="ISO 8601 时间，缺省为 Master 收到的时间")
     passed: int = 0
     failed: int = 0
     error: int = 0
@@ -63,16 +174,95 @@ class RunPayload(BaseModel):
     duration: float = 0.0
     pass_rate: float = 0.0
     failures: list[FailureItem] = []
+    tests: list[TestItem] = []
+
+    @field_validator("timestamp")
+    @classmethod
+    def _iso_timestamp(cls, value: Optional[str]) -> Optional[str]:
+        """入库后按字符串比较与分窗，格式不对在这里就拒绝（422），不要到写库时才出错"""
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"timestamp 不是 ISO 8601 格式：{value!r}") from None
+        return value or None
 
 
 # ── 上报接口（Worker 调用）────────────────────────────────
 
 @app.post("/results", status_code=201, summary="Worker 上报测试结果")
 def submit_result(payload: RunPayload):
-    run_id = storage.save_run(payload.model_dump())
+    """
+    先过 (worker_id, project) 令牌桶，再经公平写入闸门入库（闸门拒绝时令牌退还）；
+    被拒绝时返回 429 + Retry-After，Worker 按该时间退避重试
+    """
+    worker_id, project = payload.worker_id, payload.project
+    try:
+        with admission.admit(worker_id, project):
+            data = payload.model_dump()
+            run_id = storage.save_run(data)
+    except Rejected as e:
+        metrics.ADMISSION_REQUESTS.inc(1, worker_id, project, e.reason)
+        raise HTTPException(status_code=429, detail=f"上报过于频繁（{e.reason}），请稍后重试",
+                            headers={"Retry-After": retry_after_header(e.retry_after)}) from None
+    metrics.ADMISSION_REQUESTS.inc(1, worker_id, project, "accepted")
+    events.publish_run(data)
     return {"run_id": run_id, "status": "saved"}
 
 
+@app.get("/admission", summary="上报准入状态：各 Worker/项目的限速配置与放行/拒绝计数")
+def admission_status():
+    return {
+        "rate": admission.rate,
+        "burst": admission.burst,
+        "max_pending": admission.max_pending,
+        "pending": admission.pending,
+        "evicted": admission.evicted,
+        "workers": admission.snapshot(),
+    }
+
+
+# ── 实时事件（SSE）───────────────────────────────────────
+
+@app.get("/events", summary="实时事件流（SSE）：每次上报入库后推送")
+async def event_stream(
+    request: Request,
+    project: Optional[str] = None,
+    branch: Optional[str] = None,
+    worker_id: Optional[str] = None,
+    tests: bool = Query(False, description="同时推送逐用例批次（tests 事件）"),
+):
+    """
+    事件类型：run（运行摘要 + 失败 nodeid）、tests（逐用例批次，需 tests=true）
+    消费过慢导致缓冲区满时，服务端发送 dropped 事件并断开，客户端应重连后用 /results 补齐
+    """
+    sub = events.subscribe(project=project, branch=branch, worker_id=worker_id, tests=tests)
+    if sub is None:
+        raise HTTPException(status_code=503, detail="订阅者已达上限")
+
+    async def gen():
+        try:
+            yield "retry: 3000\n\n"
+            while not sub.dropped:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                sub.delivered += 1
+                data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+            if sub.dropped:
+                yield 'event: dropped\ndata: {"reason":"slow consumer"}\n\n'
+        finally:
+            events.unsubscribe(sub)
+
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 # ── JSON 查询接口（CI / 监控调用）────────────────────────
 
 @app.get("/results", summary="查询运行记录列表")
@@ -94,6 +284,24 @@ def get_result(run_id: str):
     return data
 
 
+@app.get("/diff", summary="两次运行的失败差异（新失败 / 已修复 / 持续失败）")
+def diff(
+    head: str = Query(..., description="目标运行 run_id"),
+    base: Optional[str] = Query(None, description="对比基准 run_id，默认同项目同分支的上一次运行"),
+    limit: int = Query(1000, ge=1, le=100000, description="每个列表最多返回条数（counts 不受影响）"),
+):
+    if base is None:
+        base = storage.get_previous_run_id(head)
+        if base is None:
+            raise HTTPException(status_code=404, detail=f"run_id {head!r} 不存在或没有上一次运行")
+    data = storage.diff_runs(base, head)
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"run_id {base!r} 或 {head!r} not found")
+    for key in ("new_failures", "fixed", "still_failing", "removed"):
+        data[key] = data[key][:limit]
+    return data
+
+
 @app.get("/trend", summary="通过率趋势")
 def trend(project: Optional[str] = None, limit: int = Query(10, ge=1, le=100)):
     return storage.get_trend(project=project, limit=limit)
@@ -109,6 +317,80 @@ def failure_stats(project: Optional[str] = None, limit: int = Query(100, ge=1, l
     return storage.get_failure_stats(project=project, limit=limit)
 
 
+@app.get("/failures/clusters", summary="失败聚类（同一根因的失败归为一类）")
+def failure_clusters(
+    project: Optional[str] = None,
+    branch: Optional[str] = None,
+    run_id: Optional[str] = None,
+    since: Optional[str] = Query(None, description="起始时间（ISO 格式）"),
+    limit: int = Query(50, ge=1, le=500),
+    sample: int = Query(5, ge=0, le=100, description="每类返回的示例 nodeid 数"),
+):
+    return storage.get_failure_clusters(project=project, branch=branch, run_id=run_id,
+                                        since=since, limit=limit, sample=sample)
+
+
+@app.get("/failures/search", summary="失败信息全文检索（FTS5）")
+def failure_search(
+    q: str = Query(..., min_length=1, description="FTS5 查询，如 ConnectionResetError 或 \"assert 1 == 2\""),
+    project: Optional[str] = None,
+    branch: Optional[str] = None,
+    since: Optional[str] = Query(None, description="起始时间（ISO 格式，含）"),
+    until: Optional[str] = Query(None, description="截止时间（ISO 格式，不含）"),
+    order: Literal["rank", "recent"] = "rank",
+    limit: int = Query(20, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+):
+    try:
+        return storage.search_failures(q, project=project, branch=branch, since=since,
+                                       until=until, order=order, limit=limit, offset=offset)
+    except (sqlite3.OperationalError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"无效的查询: {e}") from e
+
+
+@app.get("/flaky", summary="flaky 用例排行（通过/失败翻转率）")
+def flaky_tests(
+    project: Optional[str] = None,
+    min_runs: int = Query(5, ge=2, description="至少运行次数"),
+    min_flip_rate: float = Query(0.1, ge=0, le=1, description="近期翻转率下限"),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    return storage.get_flaky(project=project, min_runs=min_runs,
+                             min_flip_rate=min_flip_rate, limit=limit)
+
+
+@app.get("/slowdowns", summary="耗时回归：最新窗口 vs 基线窗口的 p50/p95")
+def slowdowns(
+    project: str = "",
+    baseline_windows: int = Query(7, ge=1, le=365, description="基线窗口数"),
+    min_ratio: float = Query(2.0, gt=1, description="p50 或 p95 放大倍数下限"),
+    min_count: int = Query(5, ge=1, description="两侧最少样本数"),
+    min_seconds: float = Query(0.01, ge=0, description="忽略当前 p50 低于此值的用例"),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    return storage.get_slowdowns(project=project, baseline_windows=baseline_windows,
+                                 min_ratio=min_ratio, min_count=min_count,
+                                 min_seconds=min_seconds, limit=limit)
+
+
+@app.get("/durations/stats", summary="用例耗时统计（最近 N 次运行）")
+def duration_stats(
+    project: Optional[str] = None,
+    branch: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=200),
+):
+    return storage.get_duration_stats(project=project, branch=branch, limit=limit)
+
+
+@app.get("/digest", summary="紧凑摘要（字节预算内的结构化 JSON，供 AI 消费）")
+def digest(
+    project: Optional[str] = None,
+    branch: Optional[str] = None,
+    budget: int = Query(4000, ge=512, le=65536, description="序列化后的字节上限"),
+):
+    return build_digest(storage, project=project, branch=branch, budget=budget)
+
+
 # ── HTML 聚合报告（MCP / 浏览器调用）────────────────────
 
 @app.get("/report/html", response_class=HTMLResponse, summary="聚合 HTML 报告（Jinja2 渲染）")
@@ -129,10 +411,13 @@ def html_report(
             detail = storage.get_run(runs[0]["run_id"])
             runs[0]["failures"] = detail.get("failures", []) if detail else []
 
+        clusters = storage.get_failure_clusters(run_id=runs[0]["run_id"],
+                                                limit=REPORT_CLUSTERS) if runs else []
         trend = storage.get_trend(project=project, limit=trend_limit)
         stats = storage.get_failure_stats(project=project, limit=20)
         wks   = storage.get_workers()
-        html  = renderer.render_report(runs, trend, stats, wks, project=project or "")
+        html  = renderer.render_report(runs, trend, stats, wks, project=project or "",
+                                       clusters=clusters)
         return HTMLResponse(content=html)
     except Exception as e:
         logger.exception("render /report/html failed")
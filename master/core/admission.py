@@ -0,0 +1,258 @@
+"""
+上报准入控制（POST /results）
+职责：防止单个失控 Worker 占满 Master 唯一的 SQLite 写入者
+  - 令牌桶：按 (worker_id, project) 限速，超出返回 429 + Retry-After
+  - 公平写入闸门：有竞争时按 Worker 轮转放行（而不是谁抢到锁谁写），
+    每个 Worker 排队的请求数有上限，超出同样 429，避免占满线程池
+  - 每个 (worker_id, project) 的放行 / 拒绝计数，供 /admission 与 /metrics 暴露
+  - 闲置超过 idle_ttl 的桶被回收，桶总数不超过 max_buckets（LRU），worker_id 任意取值也不会撑爆内存
+速率配置：默认值 + 覆盖表，覆盖项格式 `worker@project=rate[/burst]`，
+worker 或 project 可写 *，如 `ci-nightly=5/50,*@big-repo=2`
+"""
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+class Rejected(Exception):
+    """请求被拒绝；retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_rates(spec: str) -> dict[tuple[str, str], tuple[float, float]]:
+    """解析覆盖表 `worker@project=rate[/burst],...` → {(worker, project): (rate, burst)}"""
+    rates = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        key, _, value = item.partition("=")
+        worker, _, project = key.strip().partition("@")
+        rate, _, burst = value.partition("/")
+        try:
+            rate = float(rate)
+            burst = float(burst) if burst else max(1.0, rate)
+        except ValueError:
+            raise ValueError(f"无效的准入速率配置: {item!r}") from None
+        rates[(worker or "*", project or "*")] = (rate, burst)
+    return rates
+
+
+@dataclass
+class _Bucket:
+    rate: float                 # 每秒补充的令牌数；0 表示不限速
+    burst: float                # 桶容量
+    tokens: float
+    updated: float
+    accepted: int = 0
+    rejected: dict[str, int] = field(default_factory=dict)     # reason → 次数
+
+    def refill(self, now: float) -> float:
+        return min(self.burst, self.tokens + (now - self.updated) * self.rate)
+
+
+class Admission:
+    def __init__(self, rate: float = 1.0, burst: float = 20, overrides: Optional[dict] = None,
+                 max_pending: int = 4, queue_timeout: float = 5.0,
+                 max_buckets: int = 10000, idle_ttl: float = 600.0):
+        """
+        rate <= 0 关闭限速；max_pending <= 0 不限制排队数
+        queue_timeout 应小于 Worker 的上报超时（WORKER_UPLOAD_TIMEOUT），否则 Worker 已放弃的请求仍会入库
+        """
+        self.rate = rate
+        self.burst = burst
+        self.overrides = overrides or {}
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.max_buckets = max_buckets
+        self.idle_ttl = idle_ttl
+        self.evicted = 0
+        # OrderedDict 顺序即最近使用顺序，最久未用的在最前
+        self._buckets: OrderedDict[tuple[str, str], _Bucket] = OrderedDict()
+        self._lock = threading.Lock()
+        # 写入闸门：_owner 为当前持有者的票据；_queues 按 Worker 排队，OrderedDict 顺序即轮转顺序
+        self._gate = threading.Condition()
+        self._owner: Optional[object] = None
+        self._queues: OrderedDict[str, deque] = OrderedDict()
+        self._write_avg = 0.05          # 单次写入耗时的指数滑动平均（秒），用于估算排队 Retry-After
+
+    # ── 令牌桶 ───────────────────────────────────────────
+
+    def _limits(self, worker_id: str, project: str) -> tuple[float, float]:
+        for key in ((worker_id, project), (worker_id, "*"), ("*", project)):
+            if key in self.overrides:
+                return self.overrides[key]
+        return self.rate, self.burst
+
+    def acquire(self, worker_id: str, project: str):
+        """消耗一个令牌；不足时抛 Rejected（计入拒绝数）"""
+        now = time.monotonic()
+        key = (worker_id, project)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._evict(now)
+                rate, burst = self._limits(worker_id, project)
+                bucket = self._buckets[key] = _Bucket(rate, burst, burst, now)
+            else:
+                self._buckets.move_to_end(key)
+            if bucket.rate <= 0:
+                bucket.updated = now
+                return
+            bucket.tokens = bucket.refill(now)
+            bucket.updated = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return
+            bucket.rejected["rate"] = bucket.rejected.get("rate", 0) + 1
+            raise Rejected("rate", (1 - bucket.tokens) / bucket.rate)
+
+    def _refund(self, worker_id: str, project: str):
+        """退还 acquire 扣掉的令牌（请求在写入闸门被拒绝，没有真正写入）"""
+        with self._lock:
+            bucket = self._buckets.get((worker_id, project))
+            if bucket is not None and bucket.rate > 0:
+                bucket.tokens = min(bucket.burst, bucket.tokens + 1)
+
+    def _evict(self, now: float):
+        """
+        回收闲置的桶（调用方持有 _lock）：闲置超过 idle_ttl 且令牌已补满的桶，
+        丢弃后重建与原状态等价；超过 max_buckets 时再按 LRU 淘汰
+        """
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            idle = now - bucket.updated
+            full_after = (bucket.burst - bucket.tokens) / bucket.rate if bucket.rate > 0 else 0
+            if idle < max(self.idle_ttl, full_after) and len(self._buckets) < self.max_buckets:
+                break
+            del self._buckets[key]
+            self.evicted += 1
+
+    def _count(self, worker_id: str, project: str, reason: Optional[str] = None):
+        with self._lock:
+            bucket = self._buckets.get((worker_id, project))
+            if bucket is None:
+                return
+            if reason is None:
+                bucket.accepted += 1
+            else:
+                bucket.rejected[reason] = bucket.rejected.get(reason, 0) + 1
+
+    # ── 公平写入闸门 ─────────────────────────────────────
+
+    @contextmanager
+    def admit(self, worker_id: str, project: str):
+        """令牌桶 + 写入闸门；在闸门被拒绝（排队满 / 超时）时退还令牌，没写入的请求不计入限速"""
+        self.acquire(worker_id, project)
+        try:
+            self._wait_turn(worker_id, project)
+        except Rejected:
+            self._refund(worker_id, project)
+            raise
+        with self._holding(worker_id, project):
+            yield
+
+    @contextmanager
+    def write_slot(self, worker_id: str, project: str):
+        """
+        持有期间独占写入；有竞争时每个 Worker 轮流获得一次写入机会
+        该 Worker 排队数已满或等待超过 queue_timeout 时抛 Rejected
+        """
+        self._wait_turn(worker_id, project)
+        with self._holding(worker_id, project):
+            yield
+
+    def _wait_turn(self, worker_id: str, project: str):
+        """排队直到获得写入权；排队数已满或等待超时抛 Rejected"""
+        ticket = object()
+        with self._gate:
+            if self._owner is None and not self._queues:
+                self._owner = ticket
+            else:
+                queue = self._queues.get(worker_id)
+                if 0 < self.max_pending <= len(queue or ()):
+                    self._count(worker_id, project, "queue")
+                    raise Rejected("queue", self._queue_wait())
+                self._queues.setdefault(worker_id, deque()).append(ticket)
+                deadline = time.monotonic() + self.queue_timeout
+                while self._owner is not ticket:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._withdraw(worker_id, ticket)
+                        self._count(worker_id, project, "timeout")
+                        raise Rejected("timeout", self._queue_wait())
+                    self._gate.wait(remaining)
+
+    @contextmanager
+    def _holding(self, worker_id: str, project: str):
+        """已获得写入权：退出时记录耗时并交给下一个 Worker"""
+        start = time.perf_counter()
+        try:
+            yield
+            self._count(worker_id, project)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._gate:
+                self._write_avg = 0.9 * self._write_avg + 0.1 * elapsed
+                self._handoff()
+
+    def _handoff(self):
+        """把写入权交给轮转顺序中的下一个 Worker（调用方持有 _gate）"""
+        if not self._queues:
+            self._owner = None
+            return
+        worker_id, queue = next(iter(self._queues.items()))
+        self._owner = queue.popleft()
+        if queue:
+            self._queues.move_to_end(worker_id)
+        else:
+            del self._queues[worker_id]
+        self._gate.notify_all()
+
+    def _withdraw(self, worker_id: str, ticket: object):
+        queue = self._queues.get(worker_id)
+        if queue is not None:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[worker_id]
+
+    def _queue_wait(self) -> float:
+        """按当前排队总数与平均写入耗时估算等待时间"""
+        return (sum(len(q) for q in self._queues.values()) + 1) * self._write_avg
+
+    # ── 统计 ─────────────────────────────────────────────
+
+    @property
+    def pending(self) -> int:
+        return sum(len(q) for q in list(self._queues.values()))
+
+    def snapshot(self) -> list[dict]:
+        """各 (worker_id, project) 的限速配置、剩余令牌、放行与拒绝计数"""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._buckets.items())
+            rows = []
+            for (worker_id, project), b in items:
+                tokens = b.refill(now) if b.rate > 0 else None
+                rows.append({
+                    "worker_id": worker_id,
+                    "project": project,
+                    "rate": b.rate,
+                    "burst": b.burst,
+                    "tokens": round(tokens, 2) if tokens is not None else None,
+                    "accepted": b.accepted,
+                    "rejected": sum(b.rejected.values()),
+                    "rejected_by": dict(b.rejected),
+                    "pending": len(self._queues.get(worker_id, ())),
+                })
+        return sorted(rows, key=lambda r: (-r["rejected"], r["worker_id"], r["project"]))
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After 只接受整数秒，向上取整且至少 1"""
+    return str(max(1, math.ceil(seconds)))
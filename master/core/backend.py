@@ -0,0 +1,148 @@
+"""
+Master 存储后端接口
+职责：定义 Master API / 摘要 / 导入所依赖的查询与写入方法，具体引擎二选一：
+  - sqlite（默认）：MasterStorage，持久化到 MASTER_DB
+  - memory：MemoryStorage，进程内数组 + 索引，不落盘；用于测试、基准与临时 CI Master
+两个引擎遵循同一份契约（tests/test_storage_contract.py）
+"""
+import abc
+import contextlib
+import functools
+import threading
+import time
+from typing import Optional
+
+from master.core import metrics
+
+BACKENDS = ("sqlite", "memory")
+
+
+def serialized(fn):
+    """FastAPI 同步接口跑在线程池：引擎内部状态（SQLite 连接 / 内存索引）的所有访问串行化"""
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return fn(self, *args, **kwargs)
+    return wrapper
+
+
+class StorageBackend(abc.ABC):
+    def __init__(self, sketch_window: int = 86400, sketch_retention: int = 30):
+        self.sketch_window = sketch_window          # 耗时草图窗口（秒）
+        self.sketch_retention = sketch_retention    # 保留的窗口数
+        # 数据版本：进程启动时间 + 写入计数，任何写入后递增，用于生成 HTTP ETag
+        # （sqlite 引擎改用库中持久化的计数，见 MasterStorage.data_version）
+        self._epoch = f"{time.time_ns():x}"
+        self._writes = 0
+        self._version_lock = threading.Lock()
+        self._lock = threading.RLock()
+
+    @property
+    def data_version(self) -> str:
+        return f"{self._epoch}-{self._writes}"
+
+    def _bump_version(self):
+        with self._version_lock:
+            self._writes += 1
+
+    def _count_ingest(self, payloads: list[dict]):
+        metrics.INGEST_RUNS.inc(len(payloads))
+        metrics.INGEST_FAILURES.inc(sum(len(p.get("failures", [])) for p in payloads))
+        metrics.INGEST_TESTS.inc(sum(len(p.get("tests") or []) for p in payloads))
+
+    def close(self):
+        """释放引擎资源"""
+
+    @contextlib.contextmanager
+    def deferred_indexes(self):
+        """大批量导入期间推迟二级索引维护；不需要的引擎直接透传"""
+        yield
+
+    # ── 写入 ─────────────────────────────────────────────
+
+    @abc.abstractmethod
+    def save_run(self, payload: dict) -> str:
+        """
+        保存一次运行（RunPayload 结构），返回 run_id
+        同一 run_id 重复上报时整体覆盖（排到最新），flaky 统计与耗时草图只在首次上报时累加
+        """
+
+    @abc.abstractmethod
+    def save_runs(self, payloads: list[dict]) -> list[str]:
+        """批量保存，逐条语义与 save_run 相同；任一条出错时整批不生效"""
+
+    # ── 查询 ─────────────────────────────────────────────
+
+    @abc.abstractmethod
+    def get_runs(self, worker_id: str = None, project: str = None,
+                 branch: str = None, limit: int = 50) -> list[dict]:
+        """运行摘要列表，新→旧；空字符串过滤条件视为不过滤"""
+
+    @abc.abstractmethod
+    def get_run(self, run_id: str) -> Optional[dict]:
+        """运行摘要 + failures 明细（按上报顺序）；不存在返回 None"""
+
+    @abc.abstractmethod
+    def get_previous_run_id(self, run_id: str) -> Optional[str]:
+        """同项目、同分支上，run_id 之前最近的一次运行"""
+
+    @abc.abstractmethod
+    def diff_runs(self, base: str, head: str) -> Optional[dict]:
+        """两次运行的失败集合差异（new_failures / fixed / still_failing / removed，均按 nodeid 排序）"""
+
+    @abc.abstractmethod
+    def get_trend(self, project: str = None, limit: int = 10) -> list[dict]:
+        """最近 limit 次运行的通过率，旧→新"""
+
+    @abc.abstractmethod
+    def get_workers(self) -> list[dict]:
+        """各 Worker 的运行次数、最后上报时间、平均通过率，按最后上报时间倒序"""
+
+    @abc.abstractmethod
+    def get_failure_stats(self, project: str = None, limit: int = 100) -> list[dict]:
+        """失败次数最多的用例"""
+
+    @abc.abstractmethod
+    def get_failure_clusters(self, project: str = None, branch: str = None,
+                             run_id: str = None, since: str = None, limit: int = 50,
+                             sample: int = 5) -> list[dict]:
+        """失败聚类，按成员数降序；每类附最多 sample 个示例 nodeid"""
+
+    @abc.abstractmethod
+    def search_failures(self, q: str, project: str = None, branch: str = None,
+                        since: str = None, until: str = None, order: str = "rank",
+                        limit: int = 20, offset: int = 0) -> dict:
+        """失败信息与 nodeid 全文检索（FTS5 查询语法）；语法无效时按字面词组重试"""
+
+    @abc.abstractmethod
+    def get_flaky(self, project: str = None, min_runs: int = 5,
+                  min_flip_rate: float = 0.1, limit: int = 50) -> list[dict]:
+        """flaky 候选排行"""
+
+    @abc.abstractmethod
+    def get_slowdowns(self, project: str = "", baseline_windows: int = 7,
+                      min_ratio: float = 2.0, min_count: int = 5,
+                      min_seconds: float = 0.01, limit: int = 50) -> dict:
+        """最新耗时窗口相对基线窗口变慢的用例"""
+
+    @abc.abstractmethod
+    def get_duration_stats(self, project: str = None, branch: str = None,
+                           limit: int = 20) -> list[dict]:
+        """最近 N 次运行中每个用例的耗时统计"""
+
+    @abc.abstractmethod
+    def get_outcome_history(self, project: str = None, branch: str = None,
+                            limit: int = 20) -> dict[str, dict]:
+        """最近 N 次运行中每个用例的 outcome 序列（新→旧）与平均耗时"""
+
+
+def open_backend(name: str, db_path: str = "master/data/results.db",
+                 **kwargs) -> StorageBackend:
+    """按名称创建引擎；memory 忽略 db_path"""
+    if name == "sqlite":
+        from master.core.storage import MasterStorage
+        return MasterStorage(db_path, **kwargs)
+    if name == "memory":
+        from master.core.memory import MemoryStorage
+        return MemoryStorage(**kwargs)
+    raise ValueError(f"未知的存储后端 {name!r}，可选: {', '.join(BACKENDS)}")
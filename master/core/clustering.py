@@ -0,0 +1,194 @@
+"""
+失败聚类
+职责：入库时给每条失败信息分配 cluster_id，同一根因导致的大量失败归为一类：
+  1. 归一化：取异常行，去掉地址、路径、引号内容、数字等易变部分
+  2. 指纹：归一化文本的哈希，完全相同的直接命中（绝大多数情况）
+  3. MinHash + LSH：指纹未命中时，按分段桶找候选簇，估算 Jaccard 相似度 ≥ THRESHOLD 则并入
+     否则新建簇
+簇全局共享（跨项目），按项目/分支/运行的统计在查询时对 failures 表聚合
+"""
+import hashlib
+import random
+import re
+import sqlite3
+import zlib
+from array import array
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+NUM_PERM = 64
+BANDS = 16                      # 16 段 × 4 行：相似度 0.6 时命中概率 ≈ 0.9
+_ROWS = NUM_PERM // BANDS
+THRESHOLD = 0.6
+_PRIME = (1 << 61) - 1
+_MAX32 = 0xFFFFFFFF
+
+_rng = random.Random(20240601)      # 固定种子：签名需跨进程稳定
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+# 去掉易变部分，只留结构
+_NORMALIZE = (
+    (re.compile(r"0x[0-9a-fA-F]+"), "<hex>"),
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<uuid>"),
+    (re.compile(r"(?:[\w.-]*/)+[\w.-]+"), "<path>"),
+    (re.compile(r"'[^']*'|\"[^\"]*\""), "<str>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<n>"),
+    (re.compile(r"\s+"), " "),
+)
+_ERROR_LINE = re.compile(r"^(?:E\s+)?[\w.]*(?:Error|Exception|Failed|Timeout|Interrupt)\b.*")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS failure_clusters (
+        id             INTEGER PRIMARY KEY AUTOINCREMENT,
+        normalized     TEXT NOT NULL,
+        representative TEXT NOT NULL,          -- 首条原始信息
+        signature      BLOB NOT NULL,          -- MinHash array('I')
+        created_at     TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS cluster_fingerprints (
+        fingerprint TEXT PRIMARY KEY,
+        cluster_id  INTEGER NOT NULL
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS cluster_bands (
+        band       INTEGER NOT NULL,
+        bucket     INTEGER NOT NULL,
+        cluster_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, cluster_id)
+    ) WITHOUT ROWID;
+"""
+
+
+def normalize(message: str) -> str:
+    """取异常所在行（找不到则取首个非空行）并去掉易变部分"""
+    lines = [l.strip() for l in (message or "").splitlines() if l.strip()]
+    line = next((l for l in lines if _ERROR_LINE.match(l)), lines[0] if lines else "")
+    for pattern, repl in _NORMALIZE:
+        line = pattern.sub(repl, line)
+    return line[:300]
+
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def minhash(normalized: str) -> array:
+    """基于词级 3-gram 的 MinHash 签名"""
+    tokens = normalized.split() or [""]
+    shingles = {" ".join(tokens[i:i + 3]) for i in range(max(1, len(tokens) - 2))}
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+    return array("I", (
+        min(((a * h + b) % _PRIME) & _MAX32 for h in hashes) for a, b in _PERMS
+    ))
+
+
+def similarity(sig_a: array, sig_b: array) -> float:
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def _bands(sig: array) -> list[tuple[int, int]]:
+    return [(band, zlib.crc32(sig[band * _ROWS:(band + 1) * _ROWS].tobytes()))
+            for band in range(BANDS)]
+
+
+class ClusterIndex:
+    """入库侧分配器；同一批次内对相同指纹做内存缓存"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self._cache: dict[str, int] = {}
+
+    def assign(self, message: str) -> int:
+        norm = normalize(message)
+        fp = fingerprint(norm)
+        if fp in self._cache:
+            return self._cache[fp]
+        row = self.conn.execute(
+            "SELECT cluster_id FROM cluster_fingerprints WHERE fingerprint=?", (fp,)
+        ).fetchone()
+        cluster_id = row[0] if row else None
+        if cluster_id is None:
+            sig = minhash(norm)
+            cluster_id = self._nearest(sig) or self._create(norm, message, sig)
+            self.conn.execute(
+                "INSERT OR IGNORE INTO cluster_fingerprints VALUES (?, ?)", (fp, cluster_id)
+            )
+        self._cache[fp] = cluster_id
+        return cluster_id
+
+    def _nearest(self, sig: array) -> Optional[int]:
+        candidates: set[int] = set()
+        for band, bucket in _bands(sig):
+            candidates.update(r[0] for r in self.conn.execute(
+                "SELECT cluster_id FROM cluster_bands WHERE band=? AND bucket=?", (band, bucket)
+            ))
+        return _closest(sig, candidates, lambda cid: array("I", self.conn.execute(
+            "SELECT signature FROM failure_clusters WHERE id=?", (cid,)
+        ).fetchone()[0]))
+
+    def _create(self, norm: str, message: str, sig: array) -> int:
+        cur = self.conn.execute(
+            "INSERT INTO failure_clusters (normalized, representative, signature, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (norm, message or "", sig.tobytes(), datetime.now().isoformat(timespec="seconds")),
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO cluster_bands VALUES (?, ?, ?)",
+            ((band, bucket, cur.lastrowid) for band, bucket in _bands(sig)),
+        )
+        return cur.lastrowid
+
+
+class MemoryClusters:
+    """内存引擎的簇表：分配规则与 ClusterIndex 相同（id 从 1 递增），数据只在进程内"""
+
+    def __init__(self):
+        self.clusters: list[tuple[str, str]] = []          # id - 1 → (normalized, representative)
+        self._signatures: list[array] = []
+        self._fingerprints: dict[str, int] = {}
+        self._bands: dict[tuple[int, int], list[int]] = {}
+
+    def assign(self, message: str) -> int:
+        norm = normalize(message)
+        fp = fingerprint(norm)
+        cluster_id = self._fingerprints.get(fp)
+        if cluster_id is None:
+            sig = minhash(norm)
+            candidates: set[int] = set()
+            for key in _bands(sig):
+                candidates.update(self._bands.get(key, ()))
+            cluster_id = _closest(sig, candidates, lambda cid: self._signatures[cid - 1])
+            if cluster_id is None:
+                self.clusters.append((norm, message or ""))
+                self._signatures.append(sig)
+                cluster_id = len(self.clusters)
+                for key in _bands(sig):
+                    self._bands.setdefault(key, []).append(cluster_id)
+            self._fingerprints[fp] = cluster_id
+        return cluster_id
+
+
+def _closest(sig: array, candidates: Iterable[int],
+             signature: Callable[[int], array]) -> Optional[int]:
+    """候选簇中相似度最高且 ≥ THRESHOLD 的一个"""
+    best, best_sim = None, THRESHOLD
+    for cid in candidates:
+        sim = similarity(sig, signature(cid))
+        if sim >= best_sim:
+            best, best_sim = cid, sim
+    return best
+
+
+def group_local(failures: list[dict]) -> list[dict]:
+    """不落库的按指纹分组（无 cluster_id 的数据源用），与 /failures/clusters 条目结构一致"""
+    groups: dict[str, dict] = {}
+    for f in failures:
+        norm = normalize(f.get("message", ""))
+        g = groups.setdefault(fingerprint(norm), {
+            "cluster_id": None, "normalized": norm, "representative": f.get("message", ""),
+            "members": 0, "nodeids": [],
+        })
+        g["members"] += 1
+        g["nodeids"].append(f["nodeid"])
+    return sorted(groups.values(), key=lambda g: -g["members"])
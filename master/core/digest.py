@@ -0,0 +1,105 @@
+"""
+紧凑摘要（digest）
+职责：把「最近一次运行」压成结构化 JSON，供 MCP / AI 直接消费，替代整页 HTML 报告：
+  - headline：最近一次运行的计数
+  - delta：与同项目/分支上一次运行的差异（计数变化、新失败、已修复）
+  - clusters：失败聚类（见 clustering），每类一条代表性信息
+  - flaky：最近 N 次运行中 outcome 翻转过的候选用例
+输出按字节预算逐级裁剪（列表条数、信息长度），计数字段始终保留
+"""
+import json
+
+# 逐级裁剪阶梯：(聚类数, flaky 数, 每个列表的 nodeid 数, 信息字符数)
+_LADDER = (
+    (10, 10, 20, 300),
+    (8, 8, 10, 200),
+    (5, 5, 5, 160),
+    (3, 3, 3, 120),
+    (2, 2, 2, 80),
+    (1, 1, 1, 60),
+    (0, 0, 0, 0),
+)
+
+_HEADLINE = ("passed", "failed", "error", "skipped", "total", "pass_rate", "duration")
+_FAILED = ("failed", "error")
+
+
+def flaky_candidates(history: dict[str, dict], min_runs: int = 3) -> list[dict]:
+    """outcome 序列中通过/失败翻转过的用例，按翻转次数、失败率降序"""
+    result = []
+    for nodeid, h in history.items():
+        seq = [o in _FAILED for o in h["outcomes"]]
+        if len(seq) < min_runs:
+            continue
+        flips = sum(a != b for a, b in zip(seq, seq[1:]))
+        if flips:
+            result.append({"nodeid": nodeid, "runs": len(seq), "flips": flips,
+                           "fail_rate": round(sum(seq) / len(seq), 3)})
+    result.sort(key=lambda x: (-x["flips"], -x["fail_rate"]))
+    return result
+
+
+def build_digest(storage, project: str = None, branch: str = None,
+                 budget: int = 4000, window: int = 20) -> dict:
+    """生成摘要，序列化后（UTF-8 紧凑 JSON）不超过 budget 字节（除非连最小形态都放不下）"""
+    scope = {"project": project or "", "branch": branch or ""}
+    runs = storage.get_runs(project=project, branch=branch, limit=1)
+    if not runs:
+        return {"scope": scope, "run": None}
+
+    # 上一次运行与 flaky 历史都限定在 head 所在的项目/分支（未指定 scope 时最近两次运行可能跨项目）
+    head = runs[0]
+    base_id = storage.get_previous_run_id(head["run_id"])
+    base = storage.get_run(base_id) if base_id else None
+
+    full = {
+        "scope": scope,
+        "run": {"run_id": head["run_id"], "worker_id": head["worker_id"],
+                "project": head["project"], "branch": head["branch"],
+                "timestamp": head["timestamp"], **{k: head[k] for k in _HEADLINE}},
+        "previous": {"run_id": base["run_id"], "timestamp": base["timestamp"]} if base else None,
+        "delta": None,
+        "clusters": storage.get_failure_clusters(run_id=head["run_id"], limit=200,
+                                                 sample=_LADDER[0][2]),
+        "flaky": flaky_candidates(storage.get_outcome_history(head["project"], head["branch"],
+                                                              limit=window)),
+    }
+    if base:
+        diff = storage.diff_runs(base["run_id"], head["run_id"])
+        full["delta"] = {
+            **{k: round(head[k] - base[k], 4) for k in _HEADLINE},
+            "new_failures": diff["new_failures"],
+            "fixed": diff["fixed"],
+        }
+
+    for level, caps in enumerate(_LADDER):
+        digest = _trim(full, *caps)
+        digest["truncated"] = level > 0
+        if len(_dumps(digest)) <= budget:
+            break
+    return digest
+
+
+def _trim(full: dict, n_clusters: int, n_flaky: int, n_ids: int, n_chars: int) -> dict:
+    digest = {k: full[k] for k in ("scope", "run", "previous")}
+    if full["delta"]:
+        delta = {k: v for k, v in full["delta"].items() if not isinstance(v, list)}
+        for key in ("new_failures", "fixed"):
+            delta[f"{key}_count"] = len(full["delta"][key])
+            delta[key] = full["delta"][key][:n_ids]
+        digest["delta"] = delta
+    else:
+        digest["delta"] = None
+    digest["clusters_total"] = len(full["clusters"])
+    digest["clusters"] = [
+        {"count": c["members"], "message": c["representative"][:n_chars],
+         "nodeids": c["nodeids"][:n_ids]}
+        for c in full["clusters"][:n_clusters]
+    ]
+    digest["flaky_total"] = len(full["flaky"])
+    digest["flaky"] = full["flaky"][:n_flaky]
+    return digest
+
+
+def _dumps(data: dict) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,122 @@
+"""
+运行事件总线（/events SSE 的后端）
+职责：save_run 提交后发布紧凑事件，推送给所有匹配过滤条件的订阅者
+  - 每个订阅者一个有界 asyncio.Queue；队列满即判定为慢消费者并断开，不拖慢发布方和其他订阅者
+  - publish 可在任意线程调用（FastAPI 同步接口跑在线程池），按事件循环分组后各投递一次
+"""
+import asyncio
+import itertools
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# 每批用例事件的条数
+TEST_BATCH = 500
+
+_RUN_FIELDS = ("run_id", "worker_id", "project", "branch", "timestamp", "passed", "failed",
+               "error", "skipped", "total", "duration", "pass_rate")
+
+
+@dataclass(eq=False)
+class Subscriber:
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue
+    project: Optional[str] = None
+    branch: Optional[str] = None
+    worker_id: Optional[str] = None
+    tests: bool = False                 # 是否接收逐用例批次事件
+    dropped: bool = False
+    delivered: int = field(default=0)
+
+    def matches(self, event: dict) -> bool:
+        return ((self.project is None or event["project"] == self.project)
+                and (self.branch is None or event["branch"] == self.branch)
+                and (self.worker_id is None or event["worker_id"] == self.worker_id)
+                and (event["type"] == "run" or self.tests))
+
+
+class EventBus:
+    def __init__(self, buffer: int = 256, max_subscribers: int = 1000):
+        self.buffer = buffer
+        self.max_subscribers = max_subscribers
+        self._subs: set[Subscriber] = set()
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self.published = 0
+        self.dropped = 0
+
+    # ── 订阅端（事件循环线程）────────────────────────────
+
+    def subscribe(self, **filters) -> Optional[Subscriber]:
+        """在当前事件循环上创建订阅者；超过上限返回 None"""
+        sub = Subscriber(loop=asyncio.get_running_loop(),
+                         queue=asyncio.Queue(maxsize=self.buffer), **filters)
+        with self._lock:
+            if len(self._subs) >= self.max_subscribers:
+                return None
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        with self._lock:
+            self._subs.discard(sub)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subs)
+
+    # ── 发布端（任意线程）────────────────────────────────
+
+    def publish_run(self, payload: dict):
+        """发布一次运行；有订阅者需要逐用例数据时再按批发布 tests 事件"""
+        if not self._subs:
+            return
+        head = {"type": "run", **{k: payload.get(k) for k in _RUN_FIELDS}}
+        head["failures"] = [f["nodeid"] for f in payload.get("failures", [])][:TEST_BATCH]
+        events = [head]
+        tests = payload.get("tests") or []
+        if tests and any(s.tests for s in list(self._subs)):
+            scope = {k: payload.get(k) for k in ("run_id", "project", "branch", "worker_id")}
+            for i in range(0, len(tests), TEST_BATCH):
+                events.append({
+                    "type": "tests", **scope, "offset": i,
+                    "tests": [[t["nodeid"], t.get("outcome", ""), t.get("duration", 0)]
+                              for t in tests[i:i + TEST_BATCH]],
+                })
+        for event in events:
+            event["id"] = next(self._seq)
+        self._dispatch(events)
+
+    def _dispatch(self, events: list[dict]):
+        with self._lock:
+            by_loop: dict[asyncio.AbstractEventLoop, list[Subscriber]] = {}
+            for sub in self._subs:
+                by_loop.setdefault(sub.loop, []).append(sub)
+        self.published += len(events)
+        for loop, subs in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver, subs, events)
+            except RuntimeError:            # 事件循环已关闭
+                for sub in subs:
+                    self.unsubscribe(sub)
+
+    def _deliver(self, subs: list[Subscriber], events: list[dict]):
+        """在订阅者的事件循环中执行：非阻塞入队，满则断开该订阅者"""
+        for sub in subs:
+            if sub.dropped:
+                continue
+            for event in events:
+                if not sub.matches(event):
+                    continue
+                try:
+                    sub.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    sub.dropped = True
+                    self.dropped += 1
+                    self.unsubscribe(sub)
+                    logger.warning(f"EventBus: dropped slow subscriber "
+                                   f"(buffer={self.buffer}, delivered={sub.delivered})")
+                    break
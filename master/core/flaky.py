@@ -0,0 +1,156 @@
+"""
+增量 flaky 检测
+职责：每个 (project, 用例) 一行统计，入库时增量更新，查询时无需回扫历史：
+  - runs / fails：累计执行与失败次数
+  - flips：相邻两次运行通过↔失败翻转的累计次数
+  - history：最近 WINDOW 次 outcome 的位图（bit0 为最新一次，1 表示失败）
+确定性失败的用例失败率高但几乎不翻转，flaky 用例翻转率高——两者由此区分
+"""
+import sqlite3
+from datetime import datetime
+from typing import Callable, Iterable
+
+from core import timings
+
+# 位图窗口：SQLite INTEGER 为有符号 64 位，保留 63 位
+WINDOW = 63
+_MASK = (1 << WINDOW) - 1
+
+_FAILED = {timings.OUTCOME_CODES["failed"], timings.OUTCOME_CODES["error"]}
+_IGNORED = {timings.OUTCOME_CODES["skipped"]}
+
+# SQLite 单条语句参数上限保守取值（project 占一个）
+_CHUNK = 900
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS test_stats (
+        project      TEXT    NOT NULL,
+        test_id      INTEGER NOT NULL,         -- test_ids.id
+        runs         INTEGER NOT NULL,
+        fails        INTEGER NOT NULL,
+        flips        INTEGER NOT NULL,
+        history      INTEGER NOT NULL,         -- 最近 WINDOW 次 outcome 位图，bit0 最新
+        history_len  INTEGER NOT NULL,
+        last_run     TEXT    DEFAULT '',
+        updated_at   TEXT    NOT NULL,
+        PRIMARY KEY (project, test_id)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_test_stats_flips ON test_stats(project, flips);
+"""
+
+
+class Batch:
+    """
+    多次运行合并更新：统计行在内存中按运行顺序累加，flush 时每行只写一次
+    批量导入时同一用例在一批内出现上百次，逐次读改写的代价远高于合并
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self._rows: dict[tuple[str, int], list] = {}     # (project, test_id) → 统计行
+
+    def add(self, project: str, run_id: str, test_ids: list[int], outcomes: list[int]):
+        observed = observe(test_ids, outcomes)
+        if not observed:
+            return
+        self._load(project, [tid for tid in observed if (project, tid) not in self._rows])
+        apply(self._rows, project, run_id, observed)
+
+    def flush(self):
+        if not self._rows:
+            return
+        now = datetime.now().isoformat(timespec="seconds")
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO test_stats VALUES (?,?,?,?,?,?,?,?,?)",
+            ((project, tid, *row, now) for (project, tid), row in self._rows.items()),
+        )
+        self._rows.clear()
+
+    def _load(self, project: str, ids: list[int]):
+        for tid in ids:
+            self._rows[(project, tid)] = [0, 0, 0, 0, 0, ""]
+        for i in range(0, len(ids), _CHUNK):
+            chunk = ids[i:i + _CHUNK]
+            marks = ",".join("?" * len(chunk))
+            for row in self.conn.execute(
+                f"SELECT test_id, runs, fails, flips, history, history_len, last_run "
+                f"FROM test_stats WHERE project=? AND test_id IN ({marks})", [project, *chunk]
+            ):
+                self._rows[(project, row[0])] = list(row[1:])
+
+
+# ── 存储无关部分（内存引擎直接使用）────────────────────────
+
+def observe(test_ids: list[int], outcomes: list[int]) -> dict[int, bool]:
+    """一次运行中参与统计的用例 → 是否失败（跳过的不计入）"""
+    return {tid: code in _FAILED for tid, code in zip(test_ids, outcomes) if code not in _IGNORED}
+
+
+def apply(rows: dict[tuple[str, int], list], project: str, run_id: str,
+          observed: dict[int, bool]):
+    """
+    把一次运行计入统计行：rows[(project, test_id)] = [runs, fails, flips, history, history_len, last_run, ...]
+    缺失的行按全零新建
+    """
+    for tid, failed in observed.items():
+        row = rows.get((project, tid))
+        if row is None:
+            row = rows[(project, tid)] = [0, 0, 0, 0, 0, ""]
+        runs, fails, flips, history, length = row[:5]
+        if runs and bool(history & 1) != failed:
+            flips += 1
+        row[:6] = [runs + 1, fails + failed, flips, ((history << 1) | failed) & _MASK,
+                   min(length + 1, WINDOW), run_id]
+
+
+def rank(conn: sqlite3.Connection, project: str = None, min_runs: int = 5,
+         min_flip_rate: float = 0.1, limit: int = 50) -> list[dict]:
+    """
+    按近期翻转率（位图窗口内）排序的 flaky 候选
+    flip_rate = 翻转次数 / (运行次数 - 1)，只返回近期翻转率 ≥ min_flip_rate 的用例
+    """
+    where, params = ["flips > 0", "runs >= ?"], [max(min_runs, 2)]
+    if project is not None:
+        where.append("project=?"); params.append(project)
+    rows = conn.execute(
+        f"SELECT * FROM test_stats WHERE {' AND '.join(where)}", params
+    ).fetchall()
+    return rank_rows(rows, lambda ids: timings.resolve_ids(conn, ids),
+                     min_flip_rate=min_flip_rate, limit=limit)
+
+
+def rank_rows(rows: Iterable, resolve: Callable[[Iterable[int]], dict[int, str]],
+              min_flip_rate: float = 0.1, limit: int = 50) -> list[dict]:
+    """rank 的存储无关部分：rows 为已按 project / runs / flips 过滤的统计行（支持按列名取值）"""
+    result = []
+    for r in rows:
+        length, history = r["history_len"], r["history"]
+        window_flips = bin((history ^ (history >> 1)) & ((1 << (length - 1)) - 1)).count("1")
+        recent_flip_rate = window_flips / (length - 1)
+        if recent_flip_rate < min_flip_rate:
+            continue
+        result.append({
+            "project": r["project"],
+            "test_id": r["test_id"],
+            "runs": r["runs"],
+            "fails": r["fails"],
+            "fail_rate": round(r["fails"] / r["runs"], 4),
+            "flips": r["flips"],
+            "flip_rate": round(r["flips"] / (r["runs"] - 1), 4),
+            "recent": {
+                "window": length,
+                "flip_rate": round(recent_flip_rate, 4),
+                "fail_rate": round(bin(history).count("1") / length, 4),
+                "history": "".join("F" if history >> i & 1 else "P" for i in range(length)),
+            },
+            "last_run": r["last_run"],
+        })
+    result.sort(key=lambda x: (-x["recent"]["flip_rate"], -x["flip_rate"], -x["fail_rate"],
+                               x["project"], x["test_id"]))
+    result = result[:limit]
+
+    names = resolve(x["test_id"] for x in result)
+    for x in result:
+        x["nodeid"] = names.get(x.pop("test_id"), "")
+    return result
@@ -0,0 +1,156 @@
+"""
+历史 json-report 批量导入
+职责：把 CI 留存的 pytest-json-report 文件直接写入 Master 库
+  - 进程池并行解析：复用 TestRunner._read_report（增量解析）与 _normalize（字段映射）
+  - run_id 取 (project, branch, 文件内容) 的哈希：重复导入幂等，中断后重跑自动跳过已导入的文件；
+    同一份报告导入到不同项目/分支时各算一次运行
+  - 主进程按批写入（每批一个事务），导入期间推迟 runs / failures 二级索引，结束后统一重建
+  - 导入独占库文件：在线 Master 正在使用该库时拒绝导入（DatabaseLocked），反之亦然
+文件按 (报告 created 时间, 路径) 顺序入库：flaky 统计与耗时草图依赖入库顺序，
+文件修改时间在拷贝 / 解压 CI 产物后往往不可信
+"""
+import hashlib
+import logging
+import multiprocessing
+import re
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from master.core.storage import MasterStorage
+
+logger = logging.getLogger(__name__)
+
+RUN_ID_PREFIX = "import-"
+_HASH_CHUNK = 1 << 20
+
+# pytest-json-report 把 created 作为第一个字段写出；只读文件开头即可取到
+_CREATED = re.compile(rb'\A\s*\{\s*"created"\s*:\s*(-?[0-9][0-9.eE+-]*)')
+_HEAD_BYTES = 256
+
+# 子进程内的只读连接，用于跳过已导入文件
+_db: Optional[sqlite3.Connection] = None
+
+
+def report_created(path: Path) -> float:
+    """报告的 created 时间（epoch 秒）；不在开头时完整解析，没有该字段时退回文件修改时间"""
+    with open(path, "rb") as f:
+        m = _CREATED.match(f.read(_HEAD_BYTES))
+    if m:
+        return float(m.group(1))
+    from core.runner import TestRunner
+    try:
+        created = TestRunner._read_report(path).get("created")
+    except (ValueError, UnicodeDecodeError):
+        created = None
+    return created if isinstance(created, (int, float)) else path.stat().st_mtime
+
+
+def discover(root: str, pattern: str = "*.json") -> list[Path]:
+    """递归查找报告文件，按 (报告 created 时间, 路径) 排序"""
+    files = [p for p in Path(root).rglob(pattern) if p.is_file()]
+    return sorted(files, key=lambda p: (report_created(p), str(p)))
+
+
+def content_run_id(path: Path, project: str = "", branch: str = "") -> str:
+    digest = hashlib.sha256(f"{project}\0{branch}\0".encode())
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            digest.update(chunk)
+    return RUN_ID_PREFIX + digest.hexdigest()[:32]
+
+
+# ── 子进程：哈希 + 解析 ───────────────────────────────────
+
+def _init_worker(db_path: str):
+    global _db
+    _db = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True, timeout=30)
+
+
+def _imported(run_id: str) -> bool:
+    return _db is not None and _db.execute(
+        "SELECT 1 FROM runs WHERE run_id=?", (run_id,)
+    ).fetchone() is not None
+
+
+def _load(job: tuple[Path, dict]) -> dict:
+    """解析单个文件；返回 {path, run_id, status, payload?, error?}，异常不外抛"""
+    from core.runner import TestRunner
+
+    path, defaults = job
+    out = {"path": str(path), "run_id": "", "status": "error"}
+    try:
+        out["run_id"] = run_id = content_run_id(path, defaults["project"], defaults["branch"])
+        if _imported(run_id):
+            out["status"] = "skipped"
+            return out
+        raw = TestRunner._read_report(path)
+        if not isinstance(raw.get("summary"), dict):
+            out["error"] = "不是 pytest-json-report 文件（缺少 summary）"
+            return out
+        result = TestRunner._normalize(raw, raw.get("exitcode", 0))
+        result.pop("exit_code", None)
+        created = raw.get("created") or path.stat().st_mtime
+        out["payload"] = {
+            "run_id": run_id,
+            **defaults,
+            "timestamp": datetime.fromtimestamp(created).isoformat(timespec="seconds"),
+            **result,
+        }
+        out["status"] = "parsed"
+    except Exception as e:
+        out["error"] = f"{type(e).__name__}: {e}"
+    return out
+
+
+# ── 主进程：批量写入 ──────────────────────────────────────
+
+def import_reports(db_path: str, files: list[Path], project: str = "", branch: str = "",
+                   worker_id: str = "import", processes: Optional[int] = None,
+                   batch_size: int = 500,
+                   on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    导入 files 到 db_path 对应的 Master 库，返回统计
+    batch_size：每个事务包含的运行数；on_progress 每写入一批回调一次
+    在线 Master 正在使用该库时抛 DatabaseLocked，不做任何写入
+    """
+    storage = MasterStorage(db_path, exclusive=True)
+    stats = {"files": len(files), "imported": 0, "skipped": 0, "errors": 0, "error_samples": []}
+    defaults = {"worker_id": worker_id, "project": project, "branch": branch}
+    seen: set[str] = set()          # 本次导入中内容重复的文件
+    batch: list[dict] = []
+
+    def flush():
+        if batch:
+            storage.save_runs(batch)
+            stats["imported"] += len(batch)
+            batch.clear()
+            if on_progress:
+                on_progress(stats)
+
+    try:
+        with storage.deferred_indexes(), multiprocessing.Pool(
+            processes, initializer=_init_worker, initargs=(db_path,)
+        ) as pool:
+            jobs = ((path, defaults) for path in files)
+            for item in pool.imap(_load, jobs, chunksize=8):
+                status = item["status"]
+                if status == "parsed" and item["run_id"] in seen:
+                    status = "skipped"
+                if status == "skipped":
+                    stats["skipped"] += 1
+                elif status == "error":
+                    stats["errors"] += 1
+                    if len(stats["error_samples"]) < 20:
+                        stats["error_samples"].append({"path": item["path"], "error": item["error"]})
+                    logger.warning(f"import: {item['path']}: {item['error']}")
+                else:
+                    seen.add(item["run_id"])
+                    batch.append(item["payload"])
+                    if len(batch) >= batch_size:
+                        flush()
+            flush()
+    finally:
+        storage.close()
+    return stats
@@ -0,0 +1,796 @@
+"""
+Master 存储层（内存引擎，MASTER_BACKEND=memory）
+职责：与 MasterStorage 相同的写入 / 查询语义，数据只在进程内：不建文件、无 fsync，进程退出即丢失
+适用：测试、基准、临时 CI Master
+结构：
+  - runs：按写入顺序的槽位数组（槽位号即 id），run_id / worker_id / project / branch 各一个槽位索引
+  - failures：列式存储（数值列用 array，文本列用 list），被覆盖的行只标记失效
+  - 全文检索：词 → 失败行号的倒排数组；查询支持 FTS5 常用子集（词、"短语"、前缀*、AND / OR / NOT、括号），
+    分词（unicode61）与 bm25 打分与 FTS5 一致；列过滤、NEAR、+、^ 等按无效语法处理（退回字面词组）
+  - 用例耗时 / flaky 统计 / 耗时草图 / 失败聚类：复用 timings / flaky / sketch / clustering 的存储无关部分
+"""
+import itertools
+import math
+import re
+import unicodedata
+from array import array
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+from core import timings
+from master.core import clustering, flaky, metrics, sketch
+from master.core.backend import StorageBackend, serialized
+
+_RUN_FIELDS = ("id", "run_id", "worker_id", "project", "branch", "timestamp", "passed",
+               "failed", "error", "skipped", "total", "duration", "pass_rate")
+_COUNT_FIELDS = ("passed", "failed", "error", "skipped", "total")
+_DIFF_FIELDS = ("run_id", "worker_id", "project", "branch", "timestamp", "passed", "failed",
+                "error", "total", "pass_rate")
+
+# bm25 参数与列权重（nodeid, message），与 MasterStorage.search_failures 的 bm25(failures_fts, 2.0, 1.0) 一致
+_K1, _B = 1.2, 0.75
+_WEIGHTS = (2.0, 1.0)
+_SNIPPET_TOKENS = 24
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+
+class _Run:
+    __slots__ = _RUN_FIELDS + ("failures",)
+
+    def as_dict(self, fields: tuple = _RUN_FIELDS) -> dict:
+        return {k: getattr(self, k) for k in fields}
+
+
+class MemoryStorage(StorageBackend):
+    def __init__(self, sketch_window: int = 86400, sketch_retention: int = 30):
+        super().__init__(sketch_window, sketch_retention)
+        # runs：槽位 i 对应 id = i + 1；被覆盖的运行槽位置 None
+        self._runs: list[Optional[_Run]] = []
+        self._by_run_id: dict[str, int] = {}
+        self._by_worker: dict[str, array] = {}
+        self._by_project: dict[str, array] = {}
+        self._by_branch: dict[str, array] = {}
+        # failures 列存
+        self._f_run = array("I")            # 所属运行槽位
+        self._f_nodeid: list[str] = []
+        self._f_duration = array("d")
+        self._f_message: list[str] = []
+        self._f_cluster = array("I")
+        self._f_exc_type: list[str] = []
+        self._f_location: list[str] = []
+        self._f_tokens = array("I")         # nodeid + message 的词数（bm25 文档长度）
+        self._f_alive = bytearray()
+        # 全文索引
+        self._postings: dict[str, array] = {}
+        self._docs = 0                      # 有效失败行数
+        self._doc_tokens = 0                # 有效失败行的总词数
+        # 用例耗时 / 统计
+        self._test_ids: dict[str, int] = {}
+        self._test_names: list[str] = []
+        self._timings: dict[str, tuple[array, array, array]] = {}
+        self._flaky: dict[tuple[str, int], list] = {}
+        self._sketches: dict[str, dict[int, dict[int, sketch.DDSketch]]] = {}
+        self._clusters = clustering.MemoryClusters()
+
+    # ── 写入 ─────────────────────────────────────────────
+
+    @metrics.timed("save_run")
+    @serialized
+    def save_run(self, payload: dict) -> str:
+        """保存 Worker 上报的一次测试结果"""
+        return self._save([payload])[0]
+
+    @metrics.timed("save_runs")
+    @serialized
+    def save_runs(self, payloads: list[dict]) -> list[str]:
+        """批量保存，逐条语义与 save_run 相同"""
+        return self._save(payloads)
+
+    def _save(self, payloads: list[dict]) -> list[str]:
+        """先整批校验、转换（可能抛错，此时不改动任何状态），再逐条写入"""
+        records = [self._prepare(p) for p in payloads]
+        horizons: dict[str, int] = {}
+        run_ids = [self._apply(record, horizons) for record in records]
+        for project, before in horizons.items():
+            windows = self._sketches.get(project, {})
+            for window in [w for w in windows if w < before]:
+                del windows[window]
+        self._bump_version()
+        self._count_ingest(payloads)
+        return run_ids
+
+    def _prepare(self, payload: dict) -> dict:
+        """payload → 写入记录；所有可能失败的取值与转换都在这里完成"""
+        timestamp = payload.get("timestamp") or datetime.now().isoformat(timespec="seconds")
+        record = {
+            "run_id": payload["run_id"],
+            "worker_id": payload.get("worker_id", "unknown"),
+            "project": payload.get("project", ""),
+            "branch": payload.get("branch", ""),
+            "timestamp": timestamp,
+            **{k: int(payload.get(k, 0) or 0) for k in _COUNT_FIELDS},
+            "duration": float(payload.get("duration", 0) or 0),
+            "pass_rate": float(payload.get("pass_rate", 0) or 0),
+            "failures": [(f.get("nodeid", ""), float(f.get("duration", 0) or 0),
+                          f.get("message", "") or "", f.get("exc_type") or "",
+                          f.get("location") or "") for f in payload.get("failures", [])],
+            "tests": None,
+        }
+        tests = payload.get("tests")
+        if tests:
+            record["tests"] = ([t["nodeid"] for t in tests], *timings.encode(tests))
+            record["window"] = sketch.window_start(timestamp, self.sketch_window)
+        return record
+
+    def _apply(self, record: dict, horizons: dict[str, int]) -> str:
+        run_id, project = record["run_id"], record["project"]
+        old = self._by_run_id.get(run_id)
+        if old is not None:
+            self._drop_run(old)
+
+        run = _Run()
+        run.id = len(self._runs) + 1
+        for key in _RUN_FIELDS[1:]:
+            setattr(run, key, record[key])
+        slot = len(self._runs)
+        self._runs.append(run)
+        self._by_run_id[run_id] = slot
+        for index, key in ((self._by_worker, run.worker_id), (self._by_project, project),
+                           (self._by_branch, run.branch)):
+            index.setdefault(key, array("I")).append(slot)
+        run.failures = array("I", (self._add_failure(slot, *f) for f in record["failures"]))
+
+        # 全量用例耗时；flaky 统计与耗时草图只在首次上报该 run 时累加
+        if record["tests"]:
+            nodeids, outcomes, durations = record["tests"]
+            ids = array("I", (self._intern(n) for n in nodeids))
+            seen = run_id in self._timings
+            self._timings[run_id] = (ids, outcomes, durations)
+            if not seen:
+                flaky.apply(self._flaky, project, run_id, flaky.observe(ids, outcomes))
+                window = record["window"]
+                self._add_sketches(project, window, ids, outcomes, durations)
+                before = window - self.sketch_retention * self.sketch_window
+                horizons[project] = max(before, horizons.get(project, before))
+        return run_id
+
+    def _drop_run(self, slot: int):
+        """同一 run_id 重复上报：旧运行与其失败明细失效（槽位索引里的旧槽位读取时跳过）"""
+        run = self._runs[slot]
+        self._runs[slot] = None
+        for f in run.failures:
+            self._f_alive[f] = 0
+            self._docs -= 1
+            self._doc_tokens -= self._f_tokens[f]
+
+    def _add_failure(self, run_slot: int, nodeid: str, duration: float, message: str,
+                     exc_type: str, location: str) -> int:
+        f = len(self._f_alive)
+        self._f_run.append(run_slot)
+        self._f_nodeid.append(nodeid)
+        self._f_duration.append(duration)
+        self._f_message.append(message)
+        self._f_cluster.append(self._clusters.assign(message))
+        self._f_exc_type.append(exc_type)
+        self._f_location.append(location)
+        self._f_alive.append(1)
+        node_tokens, message_tokens = _tokenize(nodeid), _tokenize(message)
+        self._f_tokens.append(len(node_tokens) + len(message_tokens))
+        for token in set(node_tokens) | set(message_tokens):
+            self._postings.setdefault(token, array("I")).append(f)
+        self._docs += 1
+        self._doc_tokens += len(node_tokens) + len(message_tokens)
+        return f
+
+    def _intern(self, nodeid: str) -> int:
+        tid = self._test_ids.get(nodeid)
+        if tid is None:
+            self._test_names.append(nodeid)
+            tid = self._test_ids[nodeid] = len(self._test_names)
+        return tid
+
+    def _resolve(self, ids: Iterable[int]) -> dict[int, str]:
+        return {i: self._test_names[i - 1] for i in set(ids) if 0 < i <= len(self._test_names)}
+
+    def _add_sketches(self, project: str, window: int, ids: array, outcomes: array,
+                      durations: array):
+        skipped = timings.OUTCOME_CODES["skipped"]
+        values = {tid: d for tid, code, d in zip(ids, outcomes, durations) if code != skipped}
+        bucket = self._sketches.setdefault(project, {}).setdefault(window, {})
+        for tid, value in values.items():
+            sk = bucket.get(tid)
+            if sk is None:
+                sk = bucket[tid] = sketch.DDSketch()
+            sk.add(value)
+
+    # ── 运行查询 ─────────────────────────────────────────
+
+    def _iter_runs(self, worker_id: str = None, project: str = None,
+                   branch: str = None) -> Iterator[_Run]:
+        """按 id 倒序遍历满足条件的运行；有过滤条件时从最短的槽位索引出发"""
+        if worker_id or project or branch:
+            slots: Iterable[int] = reversed(self._smallest_index(worker_id, project, branch))
+        else:
+            slots = range(len(self._runs) - 1, -1, -1)
+        for slot in slots:
+            run = self._runs[slot]
+            if run is None:
+                continue
+            if ((worker_id and run.worker_id != worker_id)
+                    or not _run_matches(run, project, branch)):
+                continue
+            yield run
+
+    def _smallest_index(self, worker_id: str = None, project: str = None,
+                        branch: str = None) -> array:
+        """各过滤条件对应槽位索引中最短的一个（任一条件无匹配时为空）"""
+        lists = [index.get(key, array("I")) for index, key in ((self._by_worker, worker_id),
+                                                               (self._by_project, project),
+                                                               (self._by_branch, branch)) if key]
+        return min(lists, key=len)
+
+    def _run(self, run_id: str) -> Optional[_Run]:
+        slot = self._by_run_id.get(run_id)
+        return self._runs[slot] if slot is not None else None
+
+    @metrics.timed("get_runs")
+    @serialized
+    def get_runs(self, worker_id: str = None, project: str = None,
+                 branch: str = None, limit: int = 50) -> list[dict]:
+        runs = self._iter_runs(worker_id, project, branch)
+        return [run.as_dict() for run, _ in zip(runs, range(limit))]
+
+    @metrics.timed("get_run")
+    @serialized
+    def get_run(self, run_id: str) -> Optional[dict]:
+        run = self._run(run_id)
+        if run is None:
+            return None
+        data = run.as_dict()
+        data["failures"] = [self._failure(f) for f in run.failures]
+        return data
+
+    def _failure(self, f: int) -> dict:
+        return {"nodeid": self._f_nodeid[f], "duration": self._f_duration[f],
+                "message": self._f_message[f], "cluster_id": self._f_cluster[f],
+                "exc_type": self._f_exc_type[f], "location": self._f_location[f]}
+
+    @metrics.timed("get_previous_run_id")
+    @serialized
+    def get_previous_run_id(self, run_id: str) -> Optional[str]:
+        """同项目、同分支上，run_id 之前最近的一次运行"""
+        head = self._run(run_id)
+        if head is None:
+            return None
+        for slot in reversed(self._by_project.get(head.project, ())):
+            run = self._runs[slot]
+            if run is not None and run.id < head.id and run.branch == head.branch:
+                return run.run_id
+        return None
+
+    @metrics.timed("diff_runs")
+    @serialized
+    def diff_runs(self, base: str, head: str) -> Optional[dict]:
+        """两次运行的失败集合差异，语义同 MasterStorage.diff_runs"""
+        b, h = self._run(base), self._run(head)
+        if b is None or h is None:
+            return None
+        base_failed = {self._f_nodeid[f] for f in b.failures}
+        head_failed = {self._f_nodeid[f] for f in h.failures}
+        new_failures = sorted(head_failed - base_failed)
+        still_failing = sorted(head_failed & base_failed)
+        fixed, removed = sorted(base_failed - head_failed), []
+        ran = self._timings.get(head)
+        if ran is not None and fixed:
+            ran_ids = set(ran[0])
+            removed = [n for n in fixed if self._test_ids.get(n) not in ran_ids]
+            fixed = [n for n in fixed if self._test_ids.get(n) in ran_ids]
+        return {
+            "base": b.as_dict(_DIFF_FIELDS),
+            "head": h.as_dict(_DIFF_FIELDS),
+            "counts": {"new_failures": len(new_failures), "fixed": len(fixed),
+                       "still_failing": len(still_failing), "removed": len(removed)},
+            "new_failures": new_failures,
+            "fixed": fixed,
+            "still_failing": still_failing,
+            "removed": removed,
+        }
+
+    @metrics.timed("get_trend")
+    @serialized
+    def get_trend(self, project: str = None, limit: int = 10) -> list[dict]:
+        fields = ("timestamp", "passed", "failed", "total", "pass_rate", "worker_id")
+        runs = zip(self._iter_runs(project=project), range(limit))
+        return [run.as_dict(fields) for run, _ in runs][::-1]
+
+    @metrics.timed("get_workers")
+    @serialized
+    def get_workers(self) -> list[dict]:
+        workers = []
+        for worker_id in sorted(self._by_worker):
+            runs = [self._runs[s] for s in self._by_worker[worker_id] if self._runs[s] is not None]
+            if runs:
+                workers.append({
+                    "worker_id": worker_id,
+                    "run_count": len(runs),
+                    "last_seen": max(r.timestamp for r in runs),
+                    "avg_pass_rate": sum(r.pass_rate for r in runs) / len(runs),
+                })
+        workers.sort(key=lambda w: w["last_seen"], reverse=True)
+        return workers
+
+    # ── 失败查询 ─────────────────────────────────────────
+
+    def _iter_failures(self, project: str = None, branch: str = None, run_id: str = None,
+                       since: str = None, until: str = None) -> Iterator[tuple[int, _Run]]:
+        """
+        按写入顺序遍历满足条件的有效失败行 (行号, 所属运行)
+        运行按槽位递增、每次运行的失败行连续写入，因此按运行遍历与按行号遍历顺序一致
+        """
+        if run_id:
+            run = self._run(run_id)
+            runs: Iterable[Optional[_Run]] = [run] if run is not None else []
+        elif project or branch:
+            runs = (self._runs[s] for s in self._smallest_index(project=project, branch=branch))
+        else:
+            runs = self._runs
+        for run in runs:
+            if run is None or not _run_matches(run, project, branch, since, until):
+                continue
+            for f in run.failures:
+                yield f, run
+
+    @metrics.timed("get_failure_stats")
+    @serialized
+    def get_failure_stats(self, project: str = None, limit: int = 100) -> list[dict]:
+        counts: dict[str, int] = {}
+        for f, _ in self._iter_failures(project=project):
+            nodeid = self._f_nodeid[f]
+            counts[nodeid] = counts.get(nodeid, 0) + 1
+        ranked = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+        return [{"nodeid": nodeid, "fail_count": n} for nodeid, n in ranked]
+
+    @metrics.timed("get_failure_clusters")
+    @serialized
+    def get_failure_clusters(self, project: str = None, branch: str = None,
+                             run_id: str = None, since: str = None, limit: int = 50,
+                             sample: int = 5) -> list[dict]:
+        """失败聚类，语义同 MasterStorage.get_failure_clusters"""
+        groups: dict[int, list] = {}        # cluster_id → [members, nodeids（有序去重）, run_ids, last_seen]
+        for f, run in self._iter_failures(project=project, branch=branch, run_id=run_id,
+                                          since=since):
+            g = groups.get(self._f_cluster[f])
+            if g is None:
+                g = groups[self._f_cluster[f]] = [0, {}, set(), run.timestamp]
+            g[0] += 1
+            g[1][self._f_nodeid[f]] = None
+            g[2].add(run.run_id)
+            g[3] = max(g[3], run.timestamp)
+        ranked = sorted(groups.items(), key=lambda kv: (-kv[1][0], kv[0]))[:limit]
+        clusters = []
+        for cluster_id, (members, nodeids, runs, last_seen) in ranked:
+            normalized, representative = self._clusters.clusters[cluster_id - 1]
+            clusters.append({
+                "cluster_id": cluster_id,
+                "normalized": normalized,
+                "representative": representative,
+                "members": members,
+                "tests": len(nodeids),
+                "runs": len(runs),
+                "last_seen": last_seen,
+                "nodeids": list(nodeids)[:sample],
+            })
+        return clusters
+
+    @metrics.timed("search_failures")
+    @serialized
+    def search_failures(self, q: str, project: str = None, branch: str = None,
+                        since: str = None, until: str = None, order: str = "rank",
+                        limit: int = 20, offset: int = 0) -> dict:
+        """全文检索，语义与结果结构同 MasterStorage.search_failures（FTS5 子集，见模块说明）"""
+        try:
+            expr = _Parser(q).parse()
+        except _QuerySyntaxError:
+            q = " ".join('"' + t.replace('"', '""') + '"' for t in q.split())
+            expr = _Parser(q).parse()
+        phrases: list[tuple[tuple[str, ...], bool]] = []
+        rows: dict[tuple, set[int]] = {}
+        matched = self._evaluate(expr, phrases, rows)
+        hits = []
+        for f in sorted(matched):
+            run = self._runs[self._f_run[f]]
+            if _run_matches(run, project, branch, since, until):
+                hits.append((f, run))
+
+        idf = [self._idf(len(rows[p])) for p in phrases]
+
+        def score(f: int) -> float:
+            active = self._active(expr, f, rows, itertools.count())[1]
+            return self._bm25(f, [phrases[i] for i in active], [idf[i] for i in active])
+
+        if order == "rank":
+            scored = sorted(((score(f), f, run) for f, run in hits), key=lambda x: (x[0], x[1]))
+            page = scored[offset:offset + limit]
+        else:
+            hits.sort(key=lambda x: (-x[1].id, x[0]))
+            page = [(score(f), f, run) for f, run in hits[offset:offset + limit]]
+
+        results = []
+        for rank, f, run in page:
+            active = self._active(expr, f, rows, itertools.count())[1]
+            results.append({
+                "run_id": run.run_id,
+                "nodeid": self._f_nodeid[f],
+                "message": self._f_message[f],
+                "cluster_id": self._f_cluster[f],
+                "exc_type": self._f_exc_type[f],
+                "location": self._f_location[f],
+                "project": run.project,
+                "branch": run.branch,
+                "worker_id": run.worker_id,
+                "timestamp": run.timestamp,
+                "score": round(rank, 4),
+                "snippet": _snippet(self._f_message[f], [phrases[i] for i in active]),
+            })
+        return {"query": q, "total": len(hits), "limit": limit, "offset": offset,
+                "results": results}
+
+    def _evaluate(self, node: tuple, phrases: list, rows: dict) -> set[int]:
+        """
+        求值查询树，返回匹配的有效失败行号
+        按出现顺序收集短语（bm25 对每个短语计一次），rows 记录每个短语在全表的匹配行（用于 IDF）
+        """
+        if node is _EMPTY:
+            return set()
+        if node[0] == "phrase":
+            phrase = (tuple(node[1]), node[2])
+            phrases.append(phrase)
+            if phrase not in rows:
+                rows[phrase] = self._phrase_rows(*phrase)
+            return rows[phrase]
+        left = self._evaluate(node[1], phrases, rows)
+        right = self._evaluate(node[2], phrases, rows)
+        if node[0] == "and":
+            return left & right
+        if node[0] == "or":
+            return left | right
+        return left - right
+
+    def _active(self, node: tuple, f: int, rows: dict,
+                counter: Iterator[int]) -> tuple[bool, list[int]]:
+        """
+        行 f 是否满足 node，以及其中计入 bm25 / snippet 的短语序号（与 _evaluate 的收集顺序一致）
+        同 FTS5：未满足的子树（含 NOT 右侧）里的短语不计命中
+        """
+        if node is _EMPTY:
+            return False, []
+        if node[0] == "phrase":
+            i = next(counter)
+            found = f in rows[(tuple(node[1]), node[2])]
+            return found, [i] if found else []
+        left, left_active = self._active(node[1], f, rows, counter)
+        right, right_active = self._active(node[2], f, rows, counter)
+        if node[0] == "and":
+            return (True, left_active + right_active) if left and right else (False, [])
+        if node[0] == "or":
+            return left or right, left_active + right_active
+        return (True, left_active) if left and not right else (False, [])
+
+    def _phrase_rows(self, tokens: tuple[str, ...], prefix: bool) -> set[int]:
+        rows: Optional[set[int]] = None
+        for i, token in enumerate(tokens):
+            if prefix and i == len(tokens) - 1:
+                found = set()
+                for term, posting in self._postings.items():
+                    if term.startswith(token):
+                        found.update(posting)
+            else:
+                found = set(self._postings.get(token, ()))
+            rows = found if rows is None else rows & found
+            if not rows:
+                return set()
+        rows = {f for f in rows if self._f_alive[f]}
+        if len(tokens) > 1:
+            rows = {f for f in rows if any(self._instances(f, tokens, prefix))}
+        return rows
+
+    def _instances(self, f: int, tokens: tuple[str, ...], prefix: bool) -> tuple[int, int]:
+        """短语在 (nodeid, message) 两列中各出现几次（短语不跨列）"""
+        return (_count_phrase(_tokenize(self._f_nodeid[f]), tokens, prefix),
+                _count_phrase(_tokenize(self._f_message[f]), tokens, prefix))
+
+    def _idf(self, hits: int) -> float:
+        idf = math.log((self._docs - hits + 0.5) / (hits + 0.5)) if self._docs else 0.0
+        return idf if idf > 0 else 1e-6
+
+    def _bm25(self, f: int, phrases: list, idf: list[float]) -> float:
+        """FTS5 bm25()：越小越相关（负数）"""
+        avgdl = self._doc_tokens / self._docs if self._docs else 1.0
+        norm = _K1 * (1 - _B + _B * self._f_tokens[f] / (avgdl or 1.0))
+        columns = (_tokenize(self._f_nodeid[f]), _tokenize(self._f_message[f]))
+        score = 0.0
+        for (tokens, prefix), weight in zip(phrases, idf):
+            freq = sum(w * _count_phrase(col, tokens, prefix) for w, col in zip(_WEIGHTS, columns))
+            score += weight * freq * (_K1 + 1) / (freq + norm)
+        return -score
+
+    # ── 用例级统计 ───────────────────────────────────────
+
+    def _timed_runs(self, project: str = None, branch: str = None,
+                    limit: int = 20) -> Iterator[tuple[int, int, float]]:
+        """最近 limit 次有用例耗时的运行（新→旧），展开为 (test_id, outcome_code, duration)"""
+        taken = 0
+        for run in self._iter_runs(project=project, branch=branch):
+            if taken >= limit:
+                return
+            data = self._timings.get(run.run_id)
+            if data is not None:
+                taken += 1
+                yield from zip(*data)
+
+    @metrics.timed("get_flaky")
+    @serialized
+    def get_flaky(self, project: str = None, min_runs: int = 5,
+                  min_flip_rate: float = 0.1, limit: int = 50) -> list[dict]:
+        """flaky 候选排行（增量统计表，不回扫历史）"""
+        min_runs = max(min_runs, 2)
+        rows = [
+            {"project": p, "test_id": tid, "runs": row[0], "fails": row[1], "flips": row[2],
+             "history": row[3], "history_len": row[4], "last_run": row[5]}
+            for (p, tid), row in sorted(self._flaky.items())
+            if row[2] > 0 and row[0] >= min_runs and (project is None or p == project)
+        ]
+        return flaky.rank_rows(rows, self._resolve, min_flip_rate=min_flip_rate, limit=limit)
+
+    @metrics.timed("get_slowdowns")
+    @serialized
+    def get_slowdowns(self, project: str = "", baseline_windows: int = 7,
+                      min_ratio: float = 2.0, min_count: int = 5,
+                      min_seconds: float = 0.01, limit: int = 50) -> dict:
+        """最新耗时窗口相对基线窗口变慢的用例（基于分位数草图）"""
+        windows = self._sketches.get(project)
+        if not windows:
+            return {"project": project, "current_window": None, "slowdowns": []}
+        current = max(windows)
+        start = current - baseline_windows * self.sketch_window
+        cur: dict[int, sketch.DDSketch] = {}
+        base: dict[int, sketch.DDSketch] = {}
+        for window, sketches in windows.items():
+            if not start <= window <= current:
+                continue
+            target = cur if window == current else base
+            for tid, sk in sketches.items():
+                # 草图是常驻对象：合并到副本上
+                target.setdefault(tid, sketch.DDSketch()).merge(sk)
+        return sketch.compare(project, self.sketch_window, current, start, cur, base,
+                              self._resolve, min_ratio=min_ratio, min_count=min_count,
+                              min_seconds=min_seconds, limit=limit)
+
+    @metrics.timed("get_duration_stats")
+    @serialized
+    def get_duration_stats(self, project: str = None, branch: str = None,
+                           limit: int = 20) -> list[dict]:
+        """最近 N 次运行中每个用例的耗时统计（avg/p50/p95/max/last），一次返回整套用例"""
+        return timings.summarize_tests(self._timed_runs(project, branch, limit), self._resolve)
+
+    @metrics.timed("get_outcome_history")
+    @serialized
+    def get_outcome_history(self, project: str = None, branch: str = None,
+                            limit: int = 20) -> dict[str, dict]:
+        """最近 N 次运行中每个用例的 outcome 序列（新→旧）与平均耗时"""
+        return timings.outcome_history_tests(self._timed_runs(project, branch, limit),
+                                             self._resolve)
+
+
+def _run_matches(run: _Run, project: str = None, branch: str = None, since: str = None,
+                 until: str = None) -> bool:
+    """空字符串条件视为不过滤（与 SQLite 引擎拼 WHERE 的规则一致）"""
+    return not ((project and run.project != project) or (branch and run.branch != branch)
+                or (since and run.timestamp < since) or (until and run.timestamp >= until))
+
+
+# ── 分词（对应 FTS5 unicode61：字母数字连续段，小写并去掉变音符号）─────
+
+def _fold_char(c: str) -> str:
+    d = unicodedata.normalize("NFD", c)
+    return d[0] if len(d) > 1 and all(unicodedata.combining(x) for x in d[1:]) else c
+
+
+def _fold(token: str) -> str:
+    token = token.lower()
+    return token if token.isascii() else "".join(map(_fold_char, token))
+
+
+def _tokenize(text: str) -> list[str]:
+    return [_fold(m.group()) for m in _TOKEN.finditer(text or "")]
+
+
+def _count_phrase(tokens: list[str], phrase: tuple[str, ...], prefix: bool) -> int:
+    n = len(phrase)
+    count = 0
+    for i in range(len(tokens) - n + 1):
+        if (tokens[i:i + n - 1] == list(phrase[:-1])
+                and (tokens[i + n - 1].startswith(phrase[-1]) if prefix
+                     else tokens[i + n - 1] == phrase[-1])):
+            count += 1
+    return count
+
+
+def _snippet(text: str, phrases: list) -> str:
+    """近似 snippet(failures_fts, 1, '[', ']', '…', 24)：含命中最多的 24 词片段，命中处加括号"""
+    spans = [(m.start(), m.end()) for m in _TOKEN.finditer(text or "")]
+    tokens = [_fold(text[s:e]) for s, e in spans]
+    hits: list[tuple[int, int, int]] = []           # (起始词, 结束词（不含）, 短语序号)
+    for p, (phrase, prefix) in enumerate(phrases):
+        n = len(phrase)
+        for i in range(len(tokens) - n + 1) if n else ():
+            if _count_phrase(tokens[i:i + n], phrase, prefix):
+                hits.append((i, i + n, p))
+    hits.sort()
+
+    start, end = 0, len(tokens)
+    if len(tokens) > _SNIPPET_TOKENS:
+        best, best_score = 0, -1
+        for i, _, _ in hits:
+            score = len({p for s, e, p in hits if i <= s and e <= i + _SNIPPET_TOKENS})
+            if score > best_score:
+                best, best_score = i, score
+        inside = [(s, e) for s, e, _ in hits if best <= s and e <= best + _SNIPPET_TOKENS]
+        if inside:
+            first, last = inside[0][0], max(e for _, e in inside)
+            best = first - (_SNIPPET_TOKENS - (last - first)) // 2
+        start = min(max(best, 0), len(tokens) - _SNIPPET_TOKENS)
+        end = start + _SNIPPET_TOKENS
+
+    # 合并重叠的命中区间后加括号
+    marks: list[list[int]] = []
+    for s, e, _ in hits:
+        if marks and s < marks[-1][1]:
+            marks[-1][1] = max(marks[-1][1], e)
+        else:
+            marks.append([s, e])
+    out, pos = [], spans[start][0] if start and spans else 0
+    for s, e in marks:
+        s, e = max(s, start), min(e, end)
+        if s >= e:
+            continue
+        out.append(text[pos:spans[s][0]])
+        out.append("[" + text[spans[s][0]:spans[e - 1][1]] + "]")
+        pos = spans[e - 1][1]
+    tail = spans[end - 1][1] if end < len(tokens) else len(text or "")
+    out.append(text[pos:tail] if tail > pos else "")
+    return ("…" if start else "") + "".join(out) + ("…" if end < len(tokens) else "")
+
+
+# ── 查询解析（FTS5 子集）────────────────────────────────
+
+class _QuerySyntaxError(ValueError):
+    pass
+
+
+def _bareword_char(c: str) -> bool:
+    return c.isalnum() or c == "_" or c == "\x1a" or ord(c) > 127
+
+
+class _Parser:
+    """
+    相邻短语为隐式 AND 且结合最紧（不能与括号相邻），其后优先级 NOT > AND > OR；语法树节点：
+      ("phrase", [词...], 是否前缀)、("and" | "or" | "not", 左, 右)、("empty",)
+    分词后为空的短语（如 "=="）按 FTS5 规则化简：隐式 AND / OR / NOT 右侧直接丢弃，
+    显式 AND 与 NOT 左侧则整体为空
+    """
+
+    def __init__(self, query: str):
+        self.items = self._lex(query)
+        self.i = 0
+
+    @staticmethod
+    def _lex(q: str) -> list[tuple[str, str]]:
+        items, i = [], 0
+        while i < len(q):
+            c = q[i]
+            if c.isspace():
+                i += 1
+            elif c == '"':
+                parts, j = [], i + 1
+                while True:
+                    k = q.find('"', j)
+                    if k < 0:
+                        raise _QuerySyntaxError("unterminated string")
+                    if q[k + 1:k + 2] == '"':
+                        parts.append(q[j:k + 1])
+                        j = k + 2
+                        continue
+                    parts.append(q[j:k])
+                    i = k + 1
+                    break
+                items.append(("string", "".join(parts)))
+            elif c in "()*":
+                items.append((c, c))
+                i += 1
+            elif _bareword_char(c) and not c.isspace():
+                j = i
+                while j < len(q) and _bareword_char(q[j]) and not q[j].isspace():
+                    j += 1
+                word = q[i:j]
+                items.append(("op" if word in ("AND", "OR", "NOT") else "word", word))
+                i = j
+            else:
+                raise _QuerySyntaxError(f"syntax error near {c!r}")
+        return items
+
+    def _peek(self) -> tuple[str, str]:
+        return self.items[self.i] if self.i < len(self.items) else ("", "")
+
+    def parse(self) -> tuple:
+        node = self._or()
+        if self.i != len(self.items):
+            raise _QuerySyntaxError(f"syntax error near {self._peek()[1]!r}")
+        return node
+
+    def _or(self) -> tuple:
+        node = self._and()
+        while self._peek() == ("op", "OR"):
+            self.i += 1
+            node = _combine("or", node, self._and())
+        return node
+
+    def _and(self) -> tuple:
+        node = self._not()
+        while True:
+            kind, value = self._peek()
+            if (kind, value) == ("op", "AND"):
+                self.i += 1
+                node = _combine("and", node, self._not())
+            elif kind in ("word", "string", "("):
+                raise _QuerySyntaxError(f"syntax error near {value!r}")
+            else:
+                return node
+
+    def _not(self) -> tuple:
+        node = self._primary()
+        while self._peek() == ("op", "NOT"):
+            self.i += 1
+            node = _combine("not", node, self._primary())
+        return node
+
+    def _primary(self) -> tuple:
+        kind, value = self._peek()
+        if kind == "(":
+            self.i += 1
+            node = self._or()
+            if self._peek()[0] != ")":
+                raise _QuerySyntaxError("missing )")
+            self.i += 1
+            return node
+        if kind in ("word", "string"):
+            node = self._phrase()
+            while self._peek()[0] in ("word", "string"):
+                node = _combine("implicit", node, self._phrase())
+            return node
+        raise _QuerySyntaxError(f"syntax error near {value!r}")
+
+    def _phrase(self) -> tuple:
+        kind, value = self.items[self.i]
+        self.i += 1
+        if kind == "word" and value == "NEAR" and self._peek()[0] == "(":
+            raise _QuerySyntaxError("NEAR is not supported")
+        prefix = self._peek()[0] == "*"
+        if prefix:
+            self.i += 1
+        tokens = _tokenize(value)
+        return ("phrase", tokens, prefix) if tokens else _EMPTY
+
+
+_EMPTY = ("empty",)
+
+
+def _combine(op: str, left: tuple, right: tuple) -> tuple:
+    if left is _EMPTY and op in ("and", "not"):
+        return _EMPTY
+    if right is _EMPTY:
+        return _EMPTY if op == "and" else left
+    if left is _EMPTY:
+        return right
+    return ("and" if op == "implicit" else op, left, right)
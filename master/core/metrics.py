@@ -0,0 +1,243 @@
+"""
+Master 运行指标（Prometheus 文本格式，无外部依赖）
+职责：计数器 / 直方图 / 回调型 gauge，供 /metrics 暴露
+低开销：每个线程写自己的分片（threading.local），热路径上不加锁；
+       只有首次出现的线程或标签组合才在锁内登记，抓取时再汇总各分片
+标签基数：带客户端取值（如 worker_id）的指标设 max_series，超出后新组合的 fold 标签记为 "other"
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from typing import Callable, Iterable
+
+# 默认耗时桶（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 字节大小桶
+SIZE_BUCKETS = (1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20)
+# 超出 max_series 后折叠标签的取值
+OVERFLOW = "other"
+
+
+class _Child:
+    """单个标签组合的分片存储"""
+
+    def __init__(self, new_shard: Callable[[], list]):
+        self._new_shard = new_shard
+        self._local = threading.local()
+        self._shards: list[list] = []
+        self._lock = threading.Lock()
+
+    def shard(self) -> list:
+        s = getattr(self._local, "s", None)
+        if s is None:
+            s = self._new_shard()
+            with self._lock:
+                self._shards.append(s)
+            self._local.s = s
+        return s
+
+    def shards(self) -> list[list]:
+        with self._lock:
+            return list(self._shards)
+
+
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 max_series: int = 0, fold: Iterable[str] = ()):
+        """max_series > 0 时标签组合数达到上限后，新组合中 fold 列出的标签取值记为 OVERFLOW"""
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._fold = tuple(i for i, k in enumerate(self.labelnames) if k in set(fold))
+        self._children: dict[tuple, _Child] = {}
+        self._lock = threading.Lock()
+
+    def _child(self, values: tuple) -> _Child:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    if 0 < self.max_series <= len(self._children):
+                        values = tuple(OVERFLOW if i in self._fold else v for i, v in enumerate(values))
+                    child = self._children.setdefault(values, _Child(self._new_shard))
+        return child
+
+    def _new_shard(self) -> list:
+        raise NotImplementedError
+
+    def _label_str(self, values: tuple, extra: str = "") -> str:
+        parts = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new_shard(self) -> list:
+        return [0.0]
+
+    def inc(self, amount: float = 1.0, *labels: str):
+        self._child(labels).shard()[0] += amount
+
+    def render(self) -> list[str]:
+        lines = []
+        for values, child in list(self._children.items()):
+            total = sum(s[0] for s in child.shards())
+            lines.append(f"{self.name}{self._label_str(values)} {_num(total)}")
+        return lines
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_shard(self) -> list:
+        # [各桶计数..., +Inf 计数, sum]
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value: float, *labels: str):
+        s = self._child(labels).shard()
+        s[bisect.bisect_left(self.buckets, value)] += 1
+        s[-1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def render(self) -> list[str]:
+        lines = []
+        n = len(self.buckets) + 1
+        for values, child in list(self._children.items()):
+            counts, total = [0] * n, 0.0
+            for s in child.shards():
+                for i in range(n):
+                    counts[i] += s[i]
+                total += s[-1]
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else _num(bound)
+                labels = self._label_str(values, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(values)} {_num(total)}")
+            lines.append(f"{self.name}_count{self._label_str(values)} {cumulative}")
+        return lines
+
+
+class Gauge(_Family):
+    """抓取时调用回调取值；累计值（如 *_total）用 kind="counter" 暴露"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float], kind: str = "gauge"):
+        super().__init__(name, help)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        return [f"{self.name} {_num(self.fn())}"]
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "start")
+
+    def __init__(self, hist: Histogram, labels: tuple):
+        self.hist, self.labels = hist, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._families: dict[str, _Family] = {}
+
+    def _register(self, family: _Family) -> _Family:
+        return self._families.setdefault(family.name, family)
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = (),
+                max_series: int = 0, fold: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames, max_series, fold))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float],
+              kind: str = "gauge") -> Gauge:
+        return self._register(Gauge(name, help, fn, kind))
+
+    def exposition(self) -> str:
+        out = []
+        for f in self._families.values():
+            out.append(f"# HELP {f.name} {f.help}")
+            out.append(f"# TYPE {f.name} {f.kind}")
+            out.extend(f.render())
+        return "\n".join(out) + "\n"
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# ── Master 指标 ──────────────────────────────────────────
+
+# 准入计数按 (worker_id, project) 分组的最多组合数，超出的记入 worker_id="other",project="other"
+ADMISSION_MAX_SERIES = int(os.environ.get("METRICS_ADMISSION_MAX_SERIES", "500"))
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = REGISTRY.histogram(
+    "master_http_request_duration_seconds", "HTTP 请求耗时", ("method", "route", "status"))
+INGEST_RUNS = REGISTRY.counter("master_ingest_runs_total", "入库运行数")
+INGEST_FAILURES = REGISTRY.counter("master_ingest_failures_total", "入库失败明细条数")
+INGEST_TESTS = REGISTRY.counter("master_ingest_tests_total", "入库用例结果条数")
+STORAGE_LATENCY = REGISTRY.histogram(
+    "master_storage_query_duration_seconds", "MasterStorage 方法耗时", ("method",))
+COMMIT_LATENCY = REGISTRY.histogram(
+    "master_storage_commit_duration_seconds", "SQLite 提交（含 fsync）耗时")
+RENDER_LATENCY = REGISTRY.histogram(
+    "master_render_duration_seconds", "Renderer.render_report 耗时")
+RENDER_BYTES = REGISTRY.histogram(
+    "master_render_bytes", "Renderer.render_report 输出大小", buckets=SIZE_BUCKETS)
+ETAG_REQUESTS = REGISTRY.counter(
+    "master_etag_requests_total", "条件 GET 请求（hit 返回 304）", ("result",))
+ADMISSION_REQUESTS = REGISTRY.counter(
+    "master_admission_requests_total", "POST /results 准入结果（accepted / rate / queue / timeout）",
+    ("worker_id", "project", "result"), max_series=ADMISSION_MAX_SERIES, fold=("worker_id", "project"))
+
+
+def timed(method: str):
+    """MasterStorage 方法计时装饰器"""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                STORAGE_LATENCY.observe(time.perf_counter() - start, method)
+        return wrapper
+    return deco
@@ -2,11 +2,15 @@
 Jinja2 报告渲染器（Master 内部模块）
 职责：聚合存储层数据，渲染 HTML，供 API 接口直接返回
 """
+import time
 from datetime import datetime
 from pathlib import Path
 
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
+from master.core import metrics
+from master.core.clustering import group_local
+
 TEMPLATE_DIR = Path(__file__).parent.parent / "templates"
 
 
@@ -24,16 +28,35 @@ class Renderer:
         failure_stats: list,
         workers: list,
         project: str = "",
+        clusters: list = None,
     ) -> str:
+        """
+        clusters 为最近一次运行的失败聚类；未提供时按失败信息指纹就地分组
+        clusters 可能按条数截断：未列出的类数 / 失败数由完整的 failures（带 cluster_id）推算
+        """
+        start = time.perf_counter()
         template = self.env.get_template("report.html.j2")
         last = runs[0] if runs else {}
         failures = last.get("failures", [])
-        return template.render(
+        if clusters is None:
+            clusters = group_local(failures)
+        hidden_failures = max(0, len(failures) - sum(c["members"] for c in clusters))
+        cluster_total = len(clusters)
+        if hidden_failures:
+            shown = {c.get("cluster_id") for c in clusters}
+            cluster_total += len({f.get("cluster_id") for f in failures} - shown)
+        html = template.render(
             title=f"{project or '全部项目'} 测试报告",
             generated_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             runs=runs,
             failures=failures,
+            clusters=clusters,
+            cluster_total=cluster_total,
+            hidden_failures=hidden_failures,
             trend=trend,
             failure_stats=failure_stats,
             workers=workers,
         )
+        metrics.RENDER_LATENCY.observe(time.perf_counter() - start)
+        metrics.RENDER_BYTES.observe(len(html.encode("utf-8")))
+        return html
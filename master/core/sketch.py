@@ -0,0 +1,238 @@
+"""
+用例耗时分位数草图（DDSketch 风格）
+职责：每个 (project, 用例, 时间窗口) 保存一个可合并的对数分桶草图，入库时增量写入，
+      /slowdowns 合并基线窗口后比较 p50 / p95，无需回扫原始耗时
+精度：相对误差 ≤ ALPHA（默认 1%），草图大小与样本数无关，只与耗时跨度有关
+"""
+import math
+import sqlite3
+import struct
+import time
+from array import array
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+from core import timings
+
+ALPHA = 0.01
+_GAMMA = (1 + ALPHA) / (1 - ALPHA)
+_LOG_GAMMA = math.log(_GAMMA)
+_MIN_VALUE = 1e-6               # 小于此值（秒）计入零桶
+_MAX_BINS = 2048                # 超出时合并最低的桶（只损失最快一端的精度）
+_HEADER = struct.Struct("<IIIdd")   # count, zero_count, nbins, min, max
+
+_CHUNK = 900
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS duration_sketches (
+        project  TEXT    NOT NULL,
+        test_id  INTEGER NOT NULL,         -- test_ids.id
+        window   INTEGER NOT NULL,         -- 窗口起点（epoch 秒）
+        sketch   BLOB    NOT NULL,
+        PRIMARY KEY (project, test_id, window)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_sketch_window ON duration_sketches(project, window);
+"""
+
+
+class DDSketch:
+    def __init__(self):
+        self.bins: dict[int, int] = {}
+        self.count = 0
+        self.zero_count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value < _MIN_VALUE:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / _LOG_GAMMA)
+        self.bins[key] = self.bins.get(key, 0) + 1
+        if len(self.bins) > _MAX_BINS:
+            self._collapse()
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        self.count += other.count
+        self.zero_count += other.zero_count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self.bins) > _MAX_BINS:
+            self._collapse()
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return self.min
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                value = 2 * _GAMMA ** key / (_GAMMA + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def _collapse(self):
+        keys = sorted(self.bins)
+        extra = keys[:len(keys) - _MAX_BINS + 1]
+        target = keys[len(extra)]
+        self.bins[target] += sum(self.bins.pop(k) for k in extra)
+
+    # ── 序列化 ───────────────────────────────────────────
+
+    def to_bytes(self) -> bytes:
+        keys = array("i", self.bins)
+        counts = array("I", self.bins.values())
+        return (_HEADER.pack(self.count, self.zero_count, len(keys), self.min, self.max)
+                + keys.tobytes() + counts.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DDSketch":
+        sk = cls()
+        sk.count, sk.zero_count, n, sk.min, sk.max = _HEADER.unpack_from(data)
+        keys, counts = array("i"), array("I")
+        offset = _HEADER.size
+        keys.frombytes(data[offset:offset + 4 * n])
+        counts.frombytes(data[offset + 4 * n:offset + 8 * n])
+        sk.bins = dict(zip(keys, counts))
+        return sk
+
+
+# ── 存储侧 ───────────────────────────────────────────────
+
+def window_start(timestamp: str, window_seconds: int) -> int:
+    """
+    时间戳所在窗口的起点；晚于当前时间的（Worker 时钟偏快）按当前窗口计——
+    保留期按最新窗口往前推算，一次远未来的上报会把保留期内的窗口全部删掉
+    """
+    ts = min(datetime.fromisoformat(timestamp).timestamp(), time.time())
+    return int(ts // window_seconds * window_seconds)
+
+
+def prune(conn: sqlite3.Connection, project: str, before: int):
+    """删除 before 之前的窗口"""
+    conn.execute("DELETE FROM duration_sketches WHERE project=? AND window < ?", (project, before))
+
+
+class Batch:
+    """多次运行合并写入：同一 (project, 用例, 窗口) 的草图在内存中累加，flush 时每个只序列化、写入一次"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self._sketches: dict[tuple[str, int, int], DDSketch] = {}
+        self._prune: dict[str, int] = {}            # project → 删除该窗口之前的草图
+
+    def add(self, project: str, window: int, test_ids: list[int], outcomes: list[int],
+            durations: list[float]):
+        skipped = timings.OUTCOME_CODES["skipped"]
+        values = {tid: d for tid, code, d in zip(test_ids, outcomes, durations) if code != skipped}
+        self._load(project, window, [tid for tid in values
+                                     if (project, tid, window) not in self._sketches])
+        for tid, value in values.items():
+            self._sketches[(project, tid, window)].add(value)
+
+    def prune(self, project: str, before: int):
+        self._prune[project] = max(before, self._prune.get(project, before))
+
+    def flush(self):
+        for project, before in self._prune.items():
+            prune(self.conn, project, before)
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO duration_sketches VALUES (?,?,?,?)",
+            ((project, tid, window, sk.to_bytes())
+             for (project, tid, window), sk in self._sketches.items()
+             if window >= self._prune.get(project, window)),
+        )
+        self._sketches.clear()
+        self._prune.clear()
+
+    def _load(self, project: str, window: int, ids: list[int]):
+        for tid in ids:
+            self._sketches[(project, tid, window)] = DDSketch()
+        for i in range(0, len(ids), _CHUNK):
+            chunk = ids[i:i + _CHUNK]
+            marks = ",".join("?" * len(chunk))
+            for row in self.conn.execute(
+                f"SELECT test_id, sketch FROM duration_sketches "
+                f"WHERE project=? AND window=? AND test_id IN ({marks})", [project, window, *chunk]
+            ):
+                self._sketches[(project, row[0], window)] = DDSketch.from_bytes(row[1])
+
+
+def slowdowns(conn: sqlite3.Connection, project: str, window_seconds: int,
+              baseline_windows: int = 7, min_ratio: float = 2.0, min_count: int = 5,
+              min_seconds: float = 0.01, limit: int = 50) -> dict:
+    """
+    比较最新窗口与之前 baseline_windows 个窗口（合并）的 p50 / p95
+    p50 或 p95 的放大倍数 ≥ min_ratio 即判为变慢；两侧样本数都需 ≥ min_count，
+    当前 p50 低于 min_seconds 的极快用例不参与（噪声大）
+    """
+    row = conn.execute(
+        "SELECT MAX(window) FROM duration_sketches WHERE project=?", (project,)
+    ).fetchone()
+    current = row[0]
+    if current is None:
+        return {"project": project, "current_window": None, "slowdowns": []}
+    start = current - baseline_windows * window_seconds
+
+    cur: dict[int, DDSketch] = {}
+    base: dict[int, DDSketch] = {}
+    for tid, window, blob in conn.execute(
+        "SELECT test_id, window, sketch FROM duration_sketches "
+        "WHERE project=? AND window >= ? AND window <= ?", (project, start, current)
+    ):
+        sk = DDSketch.from_bytes(blob)
+        target = cur if window == current else base
+        if tid in target:
+            target[tid].merge(sk)
+        else:
+            target[tid] = sk
+    return compare(project, window_seconds, current, start, cur, base,
+                   lambda ids: timings.resolve_ids(conn, ids), min_ratio=min_ratio,
+                   min_count=min_count, min_seconds=min_seconds, limit=limit)
+
+
+def compare(project: str, window_seconds: int, current: int, start: int,
+            cur: dict[int, DDSketch], base: dict[int, DDSketch],
+            resolve: Callable[[Iterable[int]], dict[int, str]], min_ratio: float = 2.0,
+            min_count: int = 5, min_seconds: float = 0.01, limit: int = 50) -> dict:
+    """slowdowns 的存储无关部分：cur / base 为各用例当前窗口与基线窗口（已合并）的草图"""
+    found = []
+    for tid, c in cur.items():
+        b = base.get(tid)
+        if b is None or c.count < min_count or b.count < min_count:
+            continue
+        c50, c95, b50, b95 = c.quantile(0.5), c.quantile(0.95), b.quantile(0.5), b.quantile(0.95)
+        if c50 < min_seconds:
+            continue
+        r50 = c50 / max(b50, _MIN_VALUE)
+        r95 = c95 / max(b95, _MIN_VALUE)
+        if max(r50, r95) >= min_ratio:
+            found.append({
+                "test_id": tid,
+                "current":  {"count": c.count, "p50": round(c50, 4), "p95": round(c95, 4)},
+                "baseline": {"count": b.count, "p50": round(b50, 4), "p95": round(b95, 4)},
+                "ratio_p50": round(r50, 2),
+                "ratio_p95": round(r95, 2),
+            })
+    found.sort(key=lambda x: (-max(x["ratio_p50"], x["ratio_p95"]), x["test_id"]))
+    found = found[:limit]
+    names = resolve(x["test_id"] for x in found)
+    for x in found:
+        x["nodeid"] = names.get(x.pop("test_id"), "")
+    return {
+        "project": project,
+        "window_seconds": window_seconds,
+        "current_window": datetime.fromtimestamp(current).isoformat(timespec="seconds"),
+        "baseline_from": datetime.fromtimestamp(start).isoformat(timespec="seconds"),
+        "slowdowns": found,
+    }
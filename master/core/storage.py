@@ -1,21 +1,99 @@
 """
-Master 存储层
+Master 存储层（SQLite 引擎）
 职责：持久化来自所有 Worker 上报的测试结果
-支持按 worker、project、branch 多维度查询
+支持按 worker、project、branch 多维度查询；接口见 master.core.backend.StorageBackend
 """
-import json
+import contextlib
+import os
 import sqlite3
+import threading
+import time
+from array import array
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+from core import timings
+from master.core import clustering, flaky, metrics, sketch
+from master.core.backend import StorageBackend, serialized as _serialized
 
-class MasterStorage:
-    def __init__(self, db_path: str = "master/data/results.db"):
+try:
+    import fcntl
+except ImportError:             # Windows：不加进程间锁
+    fcntl = None
+
+
+class DatabaseLocked(RuntimeError):
+    """库文件被另一类进程占用（在线 Master ↔ 离线导入）"""
+
+
+def _lock_db(db_path: str, exclusive: bool) -> Optional[int]:
+    """
+    <db>.lock 上的进程间文件锁：在线 Master 持共享锁（多个 Master 进程可共用一个库），
+    离线导入持排他锁——导入会删除二级索引、长时间占用写事务
+    """
+    if fcntl is None:
+        return None
+    fd = os.open(f"{db_path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        if exclusive:
+            raise DatabaseLocked(f"{db_path} 正在被 Master 使用：请先停止 Master 再导入，"
+                                 f"或改为通过 POST /results 上报") from None
+        raise DatabaseLocked(f"{db_path} 正在离线导入，导入结束后再启动 Master") from None
+    return fd
+
+
+class _IngestBatch:
+    """一个事务内共享的入库状态：聚类指纹 / nodeid 缓存 + flaky 统计 / 耗时草图的合并写入"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.clusters = clustering.ClusterIndex(conn)
+        self.nodeids: dict[str, int] = {}
+        self.flaky = flaky.Batch(conn)
+        self.sketches = sketch.Batch(conn)
+
+    def flush(self):
+        self.flaky.flush()
+        self.sketches.flush()
+
+
+class MasterStorage(StorageBackend):
+    def __init__(self, db_path: str = "master/data/results.db",
+                 sketch_window: int = 86400, sketch_retention: int = 30,
+                 exclusive: bool = False):
+        """exclusive：独占库文件（离线导入用）；库被另一类进程占用时抛 DatabaseLocked"""
+        super().__init__(sketch_window, sketch_retention)
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock_fd = _lock_db(db_path, exclusive)
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
         self._init_db()
+        # 读数据版本的独立连接：ETag 中间件每个请求都读，不排在主连接的查询 / 写入后面
+        self._version_conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._version_read_lock = threading.Lock()
+
+    @property
+    def data_version(self) -> str:
+        """
+        库中持久化的写入计数（随写入事务一起提交）：多个 Master 进程共用一个库时，
+        任一进程的写入都会推进所有进程的版本，不会对旧数据继续返回 304
+        """
+        with self._version_read_lock:
+            epoch, writes = self._version_conn.execute(
+                "SELECT epoch, writes FROM data_version WHERE id=1").fetchone()
+        return f"{epoch}-{writes}"
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+            with self._version_read_lock:
+                self._version_conn.close()
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
 
     def _init_db(self):
         self.conn.executescript("""
@@ -41,6 +119,9 @@ class MasterStorage:
                 nodeid   TEXT NOT NULL,
                 duration REAL DEFAULT 0,
                 message  TEXT DEFAULT '',
+                cluster_id INTEGER,                  -- failure_clusters.id
+                exc_type TEXT DEFAULT '',            -- 异常类型，如 AssertionError
+                location TEXT DEFAULT '',            -- 崩溃位置 path:lineno
                 FOREIGN KEY (run_id) REFERENCES runs(run_id)
             );
 
@@ -48,12 +129,161 @@ class MasterStorage:
             CREATE INDEX IF NOT EXISTS idx_runs_project ON runs(project);
             CREATE INDEX IF NOT EXISTS idx_runs_ts      ON runs(timestamp);
             CREATE INDEX IF NOT EXISTS idx_failures_run ON failures(run_id);
+            CREATE INDEX IF NOT EXISTS idx_failures_run_node ON failures(run_id, nodeid);
         """)
+        # 数据版本：epoch 在建库时生成（删库重建后旧 ETag 不会误命中），writes 每次写入 +1
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS data_version (
+                id     INTEGER PRIMARY KEY CHECK (id = 1),
+                epoch  TEXT    NOT NULL,
+                writes INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.conn.execute("INSERT OR IGNORE INTO data_version (id, epoch) VALUES (1, ?)",
+                          (f"{time.time_ns():x}",))
+        self.conn.executescript(timings.SCHEMA)
+        self.conn.executescript(flaky.SCHEMA)
+        self.conn.executescript(sketch.SCHEMA)
+        self.conn.executescript(clustering.SCHEMA)
+        self._migrate()
+        self._init_search()
         self.conn.commit()
 
+    def _migrate(self):
+        """旧库补列：新增列统一在这里追加，老数据按需回填"""
+        if self._add_column("failures", "cluster_id", "INTEGER"):
+            self._backfill_clusters()
+        self._add_column("failures", "exc_type", "TEXT DEFAULT ''")
+        self._add_column("failures", "location", "TEXT DEFAULT ''")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_failures_cluster ON failures(cluster_id)"
+        )
+
+    def _bump_version(self):
+        """在当前写事务内推进持久化的数据版本（调用方随后提交）"""
+        self.conn.execute("UPDATE data_version SET writes = writes + 1 WHERE id=1")
+
+    def _init_search(self):
+        """
+        失败全文索引：FTS5 外部内容表（不重复存储正文），触发器保持与 failures 同步
+        索引表首次创建时对已有数据重建
+        """
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name='failures_fts'"
+        ).fetchone()
+        self.conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS failures_fts USING fts5(
+                nodeid, message, content='failures', content_rowid='id'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS failures_fts_ai AFTER INSERT ON failures BEGIN
+                INSERT INTO failures_fts (rowid, nodeid, message)
+                VALUES (new.id, new.nodeid, new.message);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS failures_fts_ad AFTER DELETE ON failures BEGIN
+                INSERT INTO failures_fts (failures_fts, rowid, nodeid, message)
+                VALUES ('delete', old.id, old.nodeid, old.message);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS failures_fts_au AFTER UPDATE OF nodeid, message ON failures BEGIN
+                INSERT INTO failures_fts (failures_fts, rowid, nodeid, message)
+                VALUES ('delete', old.id, old.nodeid, old.message);
+                INSERT INTO failures_fts (rowid, nodeid, message)
+                VALUES (new.id, new.nodeid, new.message);
+            END;
+        """)
+        if not exists:
+            self.rebuild_search_index()
+
+    @_serialized
+    def rebuild_search_index(self):
+        """按 failures 表全量重建全文索引（索引损坏或手工改库后使用）"""
+        self.conn.execute("INSERT INTO failures_fts (failures_fts) VALUES ('rebuild')")
+        self.conn.commit()
+
+    def _add_column(self, table: str, column: str, decl: str) -> bool:
+        cols = {r["name"] for r in self.conn.execute(f"PRAGMA table_info({table})")}
+        if column in cols:
+            return False
+        self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        return True
+
+    def _backfill_clusters(self):
+        index = clustering.ClusterIndex(self.conn)
+        rows = self.conn.execute(
+            "SELECT id, message FROM failures WHERE cluster_id IS NULL"
+        ).fetchall()
+        self.conn.executemany(
+            "UPDATE failures SET cluster_id=? WHERE id=?",
+            ((index.assign(r["message"]), r["id"]) for r in rows),
+        )
+
+    @metrics.timed("save_run")
+    @_serialized
     def save_run(self, payload: dict) -> str:
-        """保存 Worker 上报的一次测试结果"""
+        """保存 Worker 上报的一次测试结果；中途出错时回滚，不留下半条运行"""
+        batch = _IngestBatch(self.conn)
+        try:
+            run_id = self._write_run(payload, batch)
+            batch.flush()
+            self._bump_version()
+        except Exception:
+            self.conn.rollback()
+            raise
+        with metrics.COMMIT_LATENCY.time():
+            self.conn.commit()
+        self._count_ingest([payload])
+        return run_id
+
+    @metrics.timed("save_runs")
+    @_serialized
+    def save_runs(self, payloads: list[dict]) -> list[str]:
+        """批量导入：整批一个事务（逐条语义与 save_run 相同），出错整批回滚"""
+        batch = _IngestBatch(self.conn)
+        try:
+            run_ids = [self._write_run(p, batch) for p in payloads]
+            batch.flush()
+            self._bump_version()
+        except Exception:
+            self.conn.rollback()
+            raise
+        with metrics.COMMIT_LATENCY.time():
+            self.conn.commit()
+        self._count_ingest(payloads)
+        return run_ids
+
+    @contextlib.contextmanager
+    def deferred_indexes(self):
+        """
+        大批量导入期间先删除 runs / failures 的二级索引，结束后一次性重建
+        （逐行维护 B 树比最后整体建索引慢得多）；中途崩溃时下次启动的 _init_db 会补建
+        """
+        with self._lock:
+            indexes = self.conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type='index' "
+                "AND tbl_name IN ('runs', 'failures') AND sql IS NOT NULL"
+            ).fetchall()
+            for row in indexes:
+                self.conn.execute(f"DROP INDEX IF EXISTS {row['name']}")
+            self.conn.commit()
+        try:
+            yield
+        finally:
+            with self._lock:
+                for row in indexes:
+                    self.conn.execute(
+                        row["sql"].replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1)
+                    )
+                self.conn.commit()
+
+    def _write_run(self, payload: dict, batch: _IngestBatch) -> str:
+        """写入一次运行（不提交；flaky / 草图在 batch.flush 时落库）"""
         run_id = payload["run_id"]
+        timestamp = payload.get("timestamp") or datetime.now().isoformat(timespec="seconds")
+        replacing = self.conn.execute(
+            "SELECT 1 FROM runs WHERE run_id=?", (run_id,)
+        ).fetchone()
         self.conn.execute("""
             INSERT OR REPLACE INTO runs
               (run_id, worker_id, project, branch, timestamp,
@@ -64,7 +294,7 @@ class MasterStorage:
             payload.get("worker_id", "unknown"),
             payload.get("project", ""),
             payload.get("branch", ""),
-            payload.get("timestamp", datetime.now().isoformat(timespec="seconds")),
+            timestamp,
             payload.get("passed", 0),
             payload.get("failed", 0),
             payload.get("error", 0),
@@ -73,15 +303,38 @@ class MasterStorage:
             payload.get("duration", 0),
             payload.get("pass_rate", 0),
         ))
-        # 写入失败明细
-        for f in payload.get("failures", []):
-            self.conn.execute("""
-                INSERT INTO failures (run_id, nodeid, duration, message)
-                VALUES (?,?,?,?)
-            """, (run_id, f.get("nodeid", ""), f.get("duration", 0), f.get("message", "")))
-        self.conn.commit()
+        # 写入失败明细（同一 run_id 重复上报时覆盖旧明细）
+        # 写入时即归入失败聚类
+        if replacing:
+            self.conn.execute("DELETE FROM failures WHERE run_id=?", (run_id,))
+        self.conn.executemany("""
+            INSERT INTO failures (run_id, nodeid, duration, message, cluster_id, exc_type, location)
+            VALUES (?,?,?,?,?,?,?)
+        """, ((run_id, f.get("nodeid", ""), f.get("duration", 0), f.get("message", ""),
+               batch.clusters.assign(f.get("message", "")),
+               f.get("exc_type") or "", f.get("location") or "")
+              for f in payload.get("failures", [])))
+        # 全量用例耗时：每次运行一行数组列；flaky 统计与耗时草图只在首次上报该 run 时累加
+        if payload.get("tests"):
+            seen = self.conn.execute(
+                "SELECT 1 FROM run_timings WHERE run_id=?", (run_id,)
+            ).fetchone()
+            packed = timings.pack(self.conn, payload["tests"], batch.nodeids)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO run_timings VALUES (?,?,?,?,?)", (run_id, *packed)
+            )
+            # 重复上报也校验时间戳（与 memory 引擎一致）：非法值抛错并回滚整条运行
+            window = sketch.window_start(timestamp, self.sketch_window)
+            if not seen:
+                project = payload.get("project", "")
+                ids, outcomes, durations = timings.unpack(*packed[1:])
+                batch.flaky.add(project, run_id, ids, outcomes)
+                batch.sketches.add(project, window, ids, outcomes, durations)
+                batch.sketches.prune(project, window - self.sketch_retention * self.sketch_window)
         return run_id
 
+    @metrics.timed("get_runs")
+    @_serialized
     def get_runs(self, worker_id: str = None, project: str = None,
                  branch: str = None, limit: int = 50) -> list[dict]:
         where, params = [], []
@@ -98,6 +351,8 @@ class MasterStorage:
         ).fetchall()
         return [dict(r) for r in rows]
 
+    @metrics.timed("get_run")
+    @_serialized
     def get_run(self, run_id: str) -> Optional[dict]:
         row = self.conn.execute(
             "SELECT * FROM runs WHERE run_id=?", (run_id,)
@@ -107,11 +362,76 @@ class MasterStorage:
         data = dict(row)
         data["failures"] = [
             dict(r) for r in self.conn.execute(
-                "SELECT nodeid, duration, message FROM failures WHERE run_id=?", (run_id,)
+                "SELECT nodeid, duration, message, cluster_id, exc_type, location "
+                "FROM failures WHERE run_id=? ORDER BY id",
+                (run_id,)
             ).fetchall()
         ]
         return data
 
+    @metrics.timed("get_previous_run_id")
+    @_serialized
+    def get_previous_run_id(self, run_id: str) -> Optional[str]:
+        """同项目、同分支上，run_id 之前最近的一次运行"""
+        row = self.conn.execute("""
+            SELECT p.run_id FROM runs h
+            JOIN runs p ON p.project = h.project AND p.branch = h.branch AND p.id < h.id
+            WHERE h.run_id = ?
+            ORDER BY p.id DESC LIMIT 1
+        """, (run_id,)).fetchone()
+        return row["run_id"] if row else None
+
+    @metrics.timed("diff_runs")
+    @_serialized
+    def diff_runs(self, base: str, head: str) -> Optional[dict]:
+        """
+        两次运行的失败集合差异（在 (run_id, nodeid) 索引上做 EXCEPT / INTERSECT）
+          new_failures：head 失败、base 未失败
+          fixed：base 失败、head 中运行且未失败
+          removed：base 失败、head 中未运行（仅当 head 有全量用例耗时数据时可区分）
+          still_failing：两次都失败
+        任一 run_id 不存在时返回 None
+        """
+        runs = {
+            r["run_id"]: dict(r) for r in self.conn.execute(
+                "SELECT run_id, worker_id, project, branch, timestamp, passed, failed, "
+                "error, total, pass_rate FROM runs WHERE run_id IN (?, ?)", (base, head)
+            )
+        }
+        if base not in runs or head not in runs:
+            return None
+
+        def setop(op: str, a: str, b: str) -> list[str]:
+            return [r[0] for r in self.conn.execute(
+                f"SELECT nodeid FROM failures WHERE run_id=? {op} "
+                f"SELECT nodeid FROM failures WHERE run_id=? ORDER BY 1", (a, b)
+            )]
+
+        new_failures = setop("EXCEPT", head, base)
+        still_failing = setop("INTERSECT", head, base)
+        fixed, removed = setop("EXCEPT", base, head), []
+        row = self.conn.execute(
+            "SELECT test_ids FROM run_timings WHERE run_id=?", (head,)
+        ).fetchone()
+        if row and fixed:
+            ran = set(array("I", row["test_ids"]))
+            ids = timings.lookup_ids(self.conn, fixed)
+            removed = [n for n in fixed if ids.get(n) not in ran]
+            fixed = [n for n in fixed if ids.get(n) in ran]
+
+        return {
+            "base": runs[base],
+            "head": runs[head],
+            "counts": {"new_failures": len(new_failures), "fixed": len(fixed),
+                       "still_failing": len(still_failing), "removed": len(removed)},
+            "new_failures": new_failures,
+            "fixed": fixed,
+            "still_failing": still_failing,
+            "removed": removed,
+        }
+
+    @metrics.timed("get_trend")
+    @_serialized
     def get_trend(self, project: str = None, limit: int = 10) -> list[dict]:
         where = "WHERE project=?" if project else ""
         params = ([project] if project else []) + [limit]
@@ -121,16 +441,20 @@ class MasterStorage:
         ).fetchall()
         return [dict(r) for r in reversed(rows)]
 
+    @metrics.timed("get_workers")
+    @_serialized
     def get_workers(self) -> list[dict]:
         rows = self.conn.execute("""
             SELECT worker_id,
                    COUNT(*) as run_count,
                    MAX(timestamp) as last_seen,
                    AVG(pass_rate) as avg_pass_rate
-            FROM runs GROUP BY worker_id ORDER BY last_seen DESC
+            FROM runs GROUP BY worker_id ORDER BY last_seen DESC, worker_id
         """).fetchall()
         return [dict(r) for r in rows]
 
+    @metrics.timed("get_failure_stats")
+    @_serialized
     def get_failure_stats(self, project: str = None, limit: int = 100) -> list[dict]:
         where = "WHERE r.project=?" if project else ""
         params = ([project] if project else []) + [limit]
@@ -138,6 +462,151 @@ class MasterStorage:
             SELECT f.nodeid, COUNT(*) as fail_count
             FROM failures f JOIN runs r ON f.run_id = r.run_id
             {where}
-            GROUP BY f.nodeid ORDER BY fail_count DESC LIMIT ?
+            GROUP BY f.nodeid ORDER BY fail_count DESC, f.nodeid LIMIT ?
         """, params).fetchall()
         return [dict(r) for r in rows]
+
+    @metrics.timed("get_failure_clusters")
+    @_serialized
+    def get_failure_clusters(self, project: str = None, branch: str = None,
+                             run_id: str = None, since: str = None, limit: int = 50,
+                             sample: int = 5) -> list[dict]:
+        """
+        失败聚类：每类一条代表信息 + 成员数 / 涉及用例数 / 涉及运行数 + 示例 nodeid
+        run_id 指定时只统计该次运行
+        """
+        where, params = [], []
+        if project:
+            where.append("r.project=?"); params.append(project)
+        if branch:
+            where.append("r.branch=?"); params.append(branch)
+        if run_id:
+            where.append("f.run_id=?"); params.append(run_id)
+        if since:
+            where.append("r.timestamp>=?"); params.append(since)
+        clause = ("WHERE " + " AND ".join(where)) if where else ""
+        rows = self.conn.execute(f"""
+            SELECT c.id AS cluster_id, c.normalized, c.representative,
+                   COUNT(*) AS members,
+                   COUNT(DISTINCT f.nodeid) AS tests,
+                   COUNT(DISTINCT f.run_id) AS runs,
+                   MAX(r.timestamp) AS last_seen
+            FROM failures f
+            JOIN runs r ON f.run_id = r.run_id
+            JOIN failure_clusters c ON f.cluster_id = c.id
+            {clause}
+            GROUP BY c.id ORDER BY members DESC, c.id LIMIT ?
+        """, params + [limit]).fetchall()
+
+        clusters = []
+        for row in rows:
+            data = dict(row)
+            data["nodeids"] = [r[0] for r in self.conn.execute(f"""
+                SELECT DISTINCT f.nodeid FROM failures f JOIN runs r ON f.run_id = r.run_id
+                {clause + (" AND " if clause else "WHERE ")} f.cluster_id=? LIMIT ?
+            """, params + [row["cluster_id"], sample])]
+            clusters.append(data)
+        return clusters
+
+    @metrics.timed("search_failures")
+    @_serialized
+    def search_failures(self, q: str, project: str = None, branch: str = None,
+                        since: str = None, until: str = None, order: str = "rank",
+                        limit: int = 20, offset: int = 0) -> dict:
+        """
+        全文检索失败信息与 nodeid（FTS5 查询语法，如 ConnectionResetError、"assert x == y"、timeout*）
+        语法无效时按普通词组重试；order 为 rank（bm25）或 recent（时间倒序）
+        """
+        where, params = ["failures_fts MATCH ?"], [q]
+        if project:
+            where.append("r.project=?"); params.append(project)
+        if branch:
+            where.append("r.branch=?"); params.append(branch)
+        if since:
+            where.append("r.timestamp>=?"); params.append(since)
+        if until:
+            where.append("r.timestamp<?"); params.append(until)
+        base = f"""
+            FROM failures_fts
+            JOIN failures f ON f.id = failures_fts.rowid
+            JOIN runs r ON r.run_id = f.run_id
+            WHERE {" AND ".join(where)}
+        """
+        order_by = "score" if order == "rank" else "r.id DESC"
+        sql = f"""
+            SELECT f.run_id, f.nodeid, f.message, f.cluster_id, f.exc_type, f.location,
+                   r.project, r.branch, r.worker_id, r.timestamp,
+                   bm25(failures_fts, 2.0, 1.0) AS score,
+                   snippet(failures_fts, 1, '[', ']', '…', 24) AS snippet
+            {base} ORDER BY {order_by} LIMIT ? OFFSET ?
+        """
+        try:
+            total = self.conn.execute(f"SELECT COUNT(*) {base}", params).fetchone()[0]
+        except sqlite3.OperationalError:
+            # 非法 FTS 语法（如未闭合引号、裸露的 -）：每个词按字面短语匹配
+            params[0] = " ".join('"' + t.replace('"', '""') + '"' for t in q.split())
+            total = self.conn.execute(f"SELECT COUNT(*) {base}", params).fetchone()[0]
+        rows = self.conn.execute(sql, params + [limit, offset]).fetchall()
+        return {
+            "query": params[0],
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "results": [dict(r, score=round(r["score"], 4)) for r in rows],
+        }
+
+    @metrics.timed("get_flaky")
+    @_serialized
+    def get_flaky(self, project: str = None, min_runs: int = 5,
+                  min_flip_rate: float = 0.1, limit: int = 50) -> list[dict]:
+        """flaky 候选排行（读增量统计表，不回扫历史）"""
+        return flaky.rank(self.conn, project=project, min_runs=min_runs,
+                          min_flip_rate=min_flip_rate, limit=limit)
+
+    @metrics.timed("get_slowdowns")
+    @_serialized
+    def get_slowdowns(self, project: str = "", baseline_windows: int = 7,
+                      min_ratio: float = 2.0, min_count: int = 5,
+                      min_seconds: float = 0.01, limit: int = 50) -> dict:
+        """最新耗时窗口相对基线窗口变慢的用例（基于分位数草图）"""
+        return sketch.slowdowns(self.conn, project, self.sketch_window,
+                                baseline_windows=baseline_windows, min_ratio=min_ratio,
+                                min_count=min_count, min_seconds=min_seconds, limit=limit)
+
+    @metrics.timed("get_duration_stats")
+    @_serialized
+    def get_duration_stats(self, project: str = None, branch: str = None,
+                           limit: int = 20) -> list[dict]:
+        """最近 N 次运行中每个用例的耗时统计（avg/p50/p95/max/last），一次返回整套用例"""
+        where, params = [], []
+        if project:
+            where.append("r.project=?"); params.append(project)
+        if branch:
+            where.append("r.branch=?"); params.append(branch)
+        clause = ("WHERE " + " AND ".join(where)) if where else ""
+        params.append(limit)
+        rows = self.conn.execute(f"""
+            SELECT t.test_ids, t.outcomes, t.durations
+            FROM run_timings t JOIN runs r ON t.run_id = r.run_id
+            {clause} ORDER BY r.id DESC LIMIT ?
+        """, params).fetchall()
+        return timings.summarize(self.conn, rows)
+
+    @metrics.timed("get_outcome_history")
+    @_serialized
+    def get_outcome_history(self, project: str = None, branch: str = None,
+                            limit: int = 20) -> dict[str, dict]:
+        """最近 N 次运行中每个用例的 outcome 序列（新→旧）与平均耗时"""
+        where, params = [], []
+        if project:
+            where.append("r.project=?"); params.append(project)
+        if branch:
+            where.append("r.branch=?"); params.append(branch)
+        clause = ("WHERE " + " AND ".join(where)) if where else ""
+        params.append(limit)
+        rows = self.conn.execute(f"""
+            SELECT t.test_ids, t.outcomes, t.durations
+            FROM run_timings t JOIN runs r ON t.run_id = r.run_id
+            {clause} ORDER BY r.id DESC LIMIT ?
+        """, params).fetchall()
+        return timings.outcome_history(self.conn, rows)
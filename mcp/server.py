@@ -2,6 +2,9 @@
 MCP Server — 薄转发层
 职责：将 AI 工具的调用转发到 Master API，不做任何渲染逻辑
 包含 Master 不可用时的错误反馈，让 AI 能收到有意义的错误信息
+HTTP 走 httpx.AsyncClient（连接复用），工具调用不阻塞事件循环，
+多个工具调用可并发进行；客户端取消请求时，进行中的 Master 请求随之取消
+进程内 TTL 缓存（按工具 + 参数）+ 相同请求合并 + ETag 重验证，降低延迟与 Master 负载
 
 启动：MASTER_URL=http://your-master:8080 python mcp/server.py
 """
@@ -9,9 +12,12 @@ import asyncio
 import json
 import os
 import sys
-import urllib.error
-import urllib.request
+import time
+from collections import OrderedDict
 from pathlib import Path
+from typing import Optional
+
+import httpx
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
@@ -21,49 +27,150 @@ from mcp import types
 
 MASTER_URL = os.environ.get("MASTER_URL", "http://localhost:8080")
 TIMEOUT    = int(os.environ.get("MCP_TIMEOUT", "15"))
+MAX_CONNS  = int(os.environ.get("MCP_MAX_CONNECTIONS", "10"))
+CACHE_SIZE = int(os.environ.get("MCP_CACHE_SIZE", "256"))
+BATCH_MAX  = int(os.environ.get("MCP_BATCH_MAX", "10"))
+
+# 各工具缓存 TTL（秒），可用 MCP_CACHE_TTL_<TOOL> 覆盖，0 表示不缓存
+CACHE_TTL = {
+    tool: float(os.environ.get(f"MCP_CACHE_TTL_{tool.upper()}", default))
+    for tool, default in {
+        "get_report":        30,
+        "get_digest":        10,
+        "get_summary":       10,
+        "get_workers":       5,
+        "get_failure_stats": 30,
+        "search_failures":   30,
+    }.items()
+}
 
 app = Server("pytest-platform-mcp")
 
 
 # ── HTTP 工具 ─────────────────────────────────────────────
 
-def _request(path: str, params: dict = None) -> tuple[str, bool]:
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """进程级共享客户端：keep-alive 连接池，避免每次调用重新建连"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=MASTER_URL,
+            timeout=TIMEOUT,
+            limits=httpx.Limits(max_connections=MAX_CONNS, max_keepalive_connections=MAX_CONNS),
+            headers={"Accept": "text/html,application/json"},
+        )
+    return _client
+
+
+async def _fetch(path: str, params: dict, etag: str = None) -> tuple[Optional[str], bool, Optional[str]]:
     """
-    向 Master 发起 GET 请求。
-    返回 (body_str, is_html)。
-    失败时抛出 RuntimeError，携带可读错误描述。
+    单次 GET。返回 (body_str, is_html, etag)；携带 etag 且 Master 返回 304 时 body 为 None。
+    失败时抛出 RuntimeError，携带可读错误描述；取消（CancelledError）原样向上传播。
     """
-    url = MASTER_URL + path
-    if params:
-        qs = "&".join(f"{k}={v}" for k, v in params.items() if v is not None)
-        if qs:
-            url += "?" + qs
-
-    req = urllib.request.Request(url, headers={"Accept": "text/html,application/json"})
+    headers = {"If-None-Match": etag} if etag else None
     try:
-        with urllib.request.urlopen(req, timeout=TIMEOUT) as r:
-            body = r.read().decode(errors="replace")
-            is_html = "html" in r.headers.get("Content-Type", "")
-            return body, is_html
+        r = await _get_client().get(path, params=params, headers=headers)
 
-    except urllib.error.HTTPError as e:
-        detail = e.read().decode(errors="replace")[:300]
-        raise RuntimeError(f"Master 返回 HTTP {e.code}：{detail}") from e
+    except httpx.TimeoutException as e:
+        raise RuntimeError(f"Master 请求超时（{TIMEOUT}s）：{MASTER_URL}{path}") from e
 
-    except urllib.error.URLError as e:
+    except httpx.TransportError as e:
         raise RuntimeError(
-            f"无法连接到 Master（{MASTER_URL}）：{e.reason}\n"
+            f"无法连接到 Master（{MASTER_URL}）：{e}\n"
             f"请确认 Master 服务已启动，环境变量 MASTER_URL 配置正确。"
         ) from e
 
-    except TimeoutError:
-        raise RuntimeError(f"Master 请求超时（{TIMEOUT}s）：{url}")
+    if r.status_code == 304:
+        return None, False, etag
+    if r.status_code >= 400:
+        raise RuntimeError(f"Master 返回 HTTP {r.status_code}：{r.text[:300]}")
+    return r.text, "html" in r.headers.get("Content-Type", ""), r.headers.get("ETag")
+
+
+class _ResponseCache:
+    """
+    LRU + TTL 响应缓存
+      - 未过期：直接返回
+      - 已过期但有 ETag：带 If-None-Match 重验证，304 时续期
+      - 相同 key 的并发请求合并为一次 Master 调用；所有等待方都取消时才取消该调用
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._entries: OrderedDict[tuple, list] = OrderedDict()  # key → [expires, etag, body, is_html]
+        self._inflight: dict[tuple, list] = {}                    # key → [task, 等待方数量]
+
+    async def get(self, tool: str, path: str, params: dict) -> tuple[str, bool]:
+        key = (tool, path, tuple(sorted(params.items())))
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            return entry[2], entry[3]
+        return await self._coalesce(key, lambda: self._refresh(key, tool, path, params))
+
+    async def _refresh(self, key: tuple, tool: str, path: str, params: dict) -> tuple[str, bool]:
+        entry = self._entries.get(key)
+        body, is_html, etag = await _fetch(path, params, entry[1] if entry else None)
+        if body is None:            # 304：沿用缓存内容
+            body, is_html = entry[2], entry[3]
+        self._entries[key] = [time.monotonic() + CACHE_TTL[tool], etag, body, is_html]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+        return body, is_html
+
+    async def _coalesce(self, key: tuple, factory):
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = [asyncio.ensure_future(factory()), 0]
+            self._inflight[key] = flight
+            flight[0].add_done_callback(
+                lambda _: self._inflight.pop(key, None) if self._inflight.get(key) is flight else None
+            )
+        flight[1] += 1
+        try:
+            return await asyncio.shield(flight[0])
+        finally:
+            flight[1] -= 1
+            if flight[1] == 0 and not flight[0].done():
+                flight[0].cancel()
+                self._inflight.pop(key, None)
+
+
+_cache = _ResponseCache(CACHE_SIZE)
+
+
+async def _request(path: str, params: dict = None, tool: str = None) -> tuple[str, bool]:
+    """
+    向 Master 发起 GET 请求，返回 (body_str, is_html)。
+    指定 tool 且该工具 TTL > 0 时走缓存。
+    """
+    params = {k: v for k, v in (params or {}).items() if v is not None}
+    if tool and CACHE_TTL.get(tool, 0) > 0:
+        return await _cache.get(tool, path, params)
+    body, is_html, _ = await _fetch(path, params)
+    return body, is_html
 
 
 def _err(msg: str) -> list[types.TextContent]:
     return [types.TextContent(type="text", text=f"⚠️ 错误：{msg}")]
 
 
+# 工具名 → (Master 路径, 透传的参数, 默认参数)
+_ROUTES = {
+    "get_report":        ("/report/html",    ("project", "worker_id", "branch", "trend_limit"), {}),
+    "get_digest":        ("/digest",         ("project", "branch", "budget"), {}),
+    "get_summary":       ("/results",        ("project", "worker_id", "limit"), {"limit": 10}),
+    "get_workers":       ("/workers",        (), {}),
+    "get_failure_stats": ("/failures/stats", ("project", "limit"), {}),
+    "search_failures":   ("/failures/search",
+                          ("q", "project", "branch", "since", "until", "limit", "offset"), {}),
+}
+
+
 # ── Tools ────────────────────────────────────────────────
 
 @app.list_tools()
@@ -82,6 +189,19 @@ async def list_tools() -> list[types.Tool]:
                 },
             },
         ),
+        types.Tool(
+            name="get_digest",
+            description="获取最近一次运行的紧凑摘要（JSON）：计数、与上次的差异、失败聚类、flaky 候选；"
+                        "比 get_report 省得多，优先使用",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "project": {"type": "string", "description": "项目名"},
+                    "branch":  {"type": "string", "description": "分支名"},
+                    "budget":  {"type": "integer", "description": "返回字节上限，默认4000"},
+                },
+            },
+        ),
         types.Tool(
             name="get_summary",
             description="获取最近 N 次运行摘要（JSON）",
@@ -110,46 +230,104 @@ async def list_tools() -> list[types.Tool]:
                 },
             },
         ),
+        types.Tool(
+            name="search_failures",
+            description="全文检索历史失败信息与用例名（FTS5 语法，如 ConnectionResetError、\"assert x\"、timeout*），"
+                        "按相关度排序，支持项目/分支/时间过滤与分页",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "q":       {"type": "string", "description": "检索词"},
+                    "project": {"type": "string"},
+                    "branch":  {"type": "string"},
+                    "since":   {"type": "string", "description": "起始时间（ISO 格式）"},
+                    "until":   {"type": "string", "description": "截止时间（ISO 格式）"},
+                    "limit":   {"type": "integer", "description": "条数，默认20"},
+                    "offset":  {"type": "integer"},
+                },
+                "required": ["q"],
+            },
+        ),
+        types.Tool(
+            name="query_batch",
+            description="一次调用并发执行多个查询工具（如 get_digest + get_summary + get_failure_stats），"
+                        "返回合并 JSON；排查问题时优先用它代替多次单独调用",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "queries": {
+                        "type": "array",
+                        "maxItems": BATCH_MAX,
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "tool":      {"type": "string", "enum": list(_ROUTES)},
+                                "arguments": {"type": "object", "description": "该工具的参数"},
+                            },
+                            "required": ["tool"],
+                        },
+                    },
+                },
+                "required": ["queries"],
+            },
+        ),
     ]
 
 
+async def _run_tool(name: str, arguments: dict) -> tuple[str, bool]:
+    """执行单个查询类工具，返回 (body_str, is_html)；失败抛 RuntimeError / ValueError"""
+    if name not in _ROUTES:
+        raise ValueError(f"未知工具: {name}")
+    path, allowed, defaults = _ROUTES[name]
+    params = {**defaults, **{k: arguments[k] for k in allowed if k in arguments}}
+    return await _request(path, params, tool=name)
+
+
+async def _run_batch(queries: list) -> dict:
+    """并发执行多个子查询，单个子查询失败不影响其他子查询"""
+    if not isinstance(queries, list) or not queries:
+        raise ValueError("queries 必须是非空数组")
+    if len(queries) > BATCH_MAX:
+        raise ValueError(f"子查询过多：{len(queries)} > {BATCH_MAX}")
+
+    async def one(q: dict) -> dict:
+        tool, args = q.get("tool", ""), q.get("arguments") or {}
+        item = {"tool": tool, "arguments": args}
+        try:
+            body, is_html = await _run_tool(tool, args)
+            item["result"] = body if is_html else json.loads(body)
+        except (RuntimeError, ValueError) as e:
+            item["error"] = str(e)
+        return item
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(q if isinstance(q, dict) else {}) for q in queries))
+    return {"results": results, "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
     try:
-        if name == "get_report":
-            params = {k: arguments[k] for k in
-                      ("project", "worker_id", "branch", "trend_limit") if k in arguments}
-            body, _ = _request("/report/html", params)
-            return [types.TextContent(type="text", text=body)]
-
-        elif name == "get_summary":
-            params = {k: arguments[k] for k in ("project", "worker_id") if k in arguments}
-            params["limit"] = arguments.get("limit", 10)
-            body, _ = _request("/results", params)
-            return [types.TextContent(type="text", text=body)]
-
-        elif name == "get_workers":
-            body, _ = _request("/workers")
-            return [types.TextContent(type="text", text=body)]
-
-        elif name == "get_failure_stats":
-            params = {k: arguments[k] for k in ("project", "limit") if k in arguments}
-            body, _ = _request("/failures/stats", params)
-            return [types.TextContent(type="text", text=body)]
-
-        else:
-            return _err(f"未知工具: {name}")
-
-    except RuntimeError as e:
-        # Master 连接失败、HTTP 错误等，返回可读错误给 AI
+        if name == "query_batch":
+            result = await _run_batch(arguments.get("queries"))
+            return [types.TextContent(type="text", text=json.dumps(result, ensure_ascii=False))]
+        body, _ = await _run_tool(name, arguments)
+        return [types.TextContent(type="text", text=body)]
+
+    except (RuntimeError, ValueError) as e:
+        # Master 连接失败、HTTP 错误、参数错误等，返回可读错误给 AI
         return _err(str(e))
     except Exception as e:
         return _err(f"MCP 内部错误: {type(e).__name__}: {e}")
 
 
 async def main():
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(read_stream, write_stream, app.create_initialization_options())
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(read_stream, write_stream, app.create_initialization_options())
+    finally:
+        if _client is not None:
+            await _client.aclose()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,6 @@
+"""tests 共用配置：在任何测试模块导入之前执行"""
+import os
+
+# master.api.server 导入时就按环境变量打开存储引擎：固定用内存引擎，
+# 避免在仓库里建出 master/data/results.db（以及它的 .lock 文件锁）
+os.environ["MASTER_BACKEND"] = "memory"
@@ -0,0 +1,258 @@
+"""master.core.admission：令牌桶补充与回收、公平写入闸门轮转，以及 Worker 对 Retry-After 的退避"""
+import json
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from master.core import admission as admission_mod
+from master.core import metrics
+from master.core.admission import Admission, Rejected, parse_rates, retry_after_header
+from worker import reporter as worker_reporter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission_mod, "time",
+                        types.SimpleNamespace(monotonic=clock.monotonic, perf_counter=time.perf_counter))
+    return clock
+
+
+def _wait_until(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _row(adm: Admission, worker_id: str, project: str = "p") -> dict:
+    return next(r for r in adm.snapshot() if (r["worker_id"], r["project"]) == (worker_id, project))
+
+
+class TestTokenBucket:
+    def test_refill_after_burst(self, clock):
+        # Arrange
+        adm = Admission(rate=2, burst=3)
+        for _ in range(3):
+            adm.acquire("w", "p")
+        # Act / Assert - 桶空：按缺口 / rate 给出 Retry-After
+        with pytest.raises(Rejected) as e:
+            adm.acquire("w", "p")
+        assert (e.value.reason, e.value.retry_after) == ("rate", 0.5)
+        clock.now += 0.5
+        adm.acquire("w", "p")
+        with pytest.raises(Rejected):
+            adm.acquire("w", "p")
+
+    def test_refill_is_capped_at_burst(self, clock):
+        adm = Admission(rate=1, burst=2)
+        adm.acquire("w", "p")
+        clock.now += 3600
+        assert _row(adm, "w")["tokens"] == 2
+        adm.acquire("w", "p")
+        adm.acquire("w", "p")
+        with pytest.raises(Rejected):
+            adm.acquire("w", "p")
+
+    def test_override_precedence_and_unlimited(self, clock):
+        adm = Admission(rate=1, burst=1, overrides=parse_rates("w@p=0,w=5/7,*@p=2/3"))
+        for key in (("w", "p"), ("w", "q"), ("x", "p"), ("x", "q")):
+            adm.acquire(*key)
+        limits = {(r["worker_id"], r["project"]): (r["rate"], r["burst"]) for r in adm.snapshot()}
+        assert limits == {("w", "p"): (0, 1), ("w", "q"): (5, 7), ("x", "p"): (2, 3), ("x", "q"): (1, 1)}
+        for _ in range(100):                       # rate 0：不限速
+            adm.acquire("w", "p")
+
+    def test_retry_after_header_is_whole_seconds(self):
+        assert [retry_after_header(s) for s in (0, 0.01, 1.0, 1.2)] == ["1", "1", "1", "2"]
+
+
+class TestEviction:
+    def test_idle_buckets_are_evicted(self, clock):
+        # Arrange
+        adm = Admission(rate=1, burst=5, idle_ttl=60)
+        adm.acquire("a", "p")
+        adm.acquire("b", "p")
+        # Act - 闲置超过 idle_ttl 后有新 Worker 到来
+        clock.now += 61
+        adm.acquire("c", "p")
+        # Assert
+        assert [r["worker_id"] for r in adm.snapshot()] == ["c"]
+        assert adm.evicted == 2
+
+    def test_bucket_not_yet_refilled_is_kept(self, clock):
+        # 补满需要 2000s，闲置 61s 就回收会把欠下的令牌一笔勾销
+        adm = Admission(rate=0.001, burst=2, idle_ttl=60)
+        adm.acquire("a", "p")
+        adm.acquire("a", "p")
+        clock.now += 61
+        adm.acquire("b", "p")
+        assert adm.evicted == 0
+        with pytest.raises(Rejected):
+            adm.acquire("a", "p")
+
+    def test_lru_cap(self, clock):
+        adm = Admission(rate=1, burst=5, max_buckets=3)
+        for w in ("a", "b", "c", "a", "d"):
+            adm.acquire(w, "p")
+        assert sorted(r["worker_id"] for r in adm.snapshot()) == ["a", "c", "d"]
+        assert adm.evicted == 1
+
+
+class TestWriteGate:
+    def test_round_robin_between_workers(self):
+        # Arrange - 持有闸门期间 A 排 3 个、B 排 1 个
+        adm = Admission(rate=0, max_pending=0)
+        order, threads = [], []
+
+        def write(worker_id: str, name: str):
+            with adm.admit(worker_id, "p"):
+                order.append(name)
+
+        with adm.write_slot("holder", "p"):
+            for worker_id, name in [("A", "a1"), ("A", "a2"), ("A", "a3"), ("B", "b1")]:
+                t = threading.Thread(target=write, args=(worker_id, name))
+                t.start()
+                threads.append(t)
+                _wait_until(lambda: adm.pending == len(threads))
+        # Act
+        for t in threads:
+            t.join(5)
+        # Assert - A 先到但每轮只写一次，B 不必等 A 全部写完
+        assert order == ["a1", "b1", "a2", "a3"]
+        assert adm.pending == 0 and _row(adm, "A")["accepted"] == 3
+
+    def test_queue_rejection_refunds_token(self, clock):
+        # Arrange - 每个 Worker 最多排 1 个；w 已有 1 个在排队
+        adm = Admission(rate=1, burst=2, max_pending=1)
+
+        def write():
+            with adm.admit("w", "p"):
+                pass
+
+        queued = threading.Thread(target=write)
+        with adm.write_slot("holder", "p"):
+            queued.start()
+            _wait_until(lambda: adm.pending == 1)
+            # Act
+            with pytest.raises(Rejected) as e:
+                with adm.admit("w", "p"):
+                    pass
+            # Assert - 排队满被拒：只扣了排队那个请求的令牌
+            assert e.value.reason == "queue"
+            assert _row(adm, "w")["tokens"] == 1
+        queued.join(5)
+        row = _row(adm, "w")
+        assert (row["accepted"], row["rejected_by"], row["tokens"]) == (1, {"queue": 1}, 1)
+
+    def test_timeout_rejection_refunds_token(self):
+        adm = Admission(rate=0.001, burst=1, queue_timeout=0.05)
+        with adm.write_slot("holder", "p"):
+            with pytest.raises(Rejected) as e:
+                with adm.admit("w", "p"):
+                    pass
+        assert e.value.reason == "timeout"
+        with adm.admit("w", "p"):                  # 令牌已退还，闸门空闲后可以写入
+            pass
+        assert (_row(adm, "w")["accepted"], _row(adm, "w")["rejected_by"]) == (1, {"timeout": 1})
+
+
+class TestMetricCardinality:
+    def test_series_beyond_cap_fold_into_other(self):
+        counter = metrics.Counter("t_total", "t", ("worker_id", "project", "result"),
+                                  max_series=2, fold=("worker_id", "project"))
+        for i in range(5):
+            counter.inc(1, f"w{i}", "p", "accepted")
+        counter.inc(1, "w9", "p", "rate")
+        counter.inc(1, "w0", "p", "accepted")            # 已登记的组合照常计数
+        lines = sorted(counter.render())
+        assert lines == [
+            't_total{worker_id="other",project="other",result="accepted"} 3',
+            't_total{worker_id="other",project="other",result="rate"} 1',
+            't_total{worker_id="w0",project="p",result="accepted"} 2',
+            't_total{worker_id="w1",project="p",result="accepted"} 1',
+        ]
+
+
+# ── Worker 端：429 + Retry-After 退避 ────────────────────
+
+class _Master(BaseHTTPRequestHandler):
+    """依次返回 responses 中的 (status, headers)；最后一个之后一律 201"""
+    responses: list = []
+    posts = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        cls = type(self)
+        status, headers = cls.responses[cls.posts] if cls.posts < len(cls.responses) else (201, {})
+        cls.posts += 1
+        body = json.dumps({"run_id": "r1"} if status == 201 else {"detail": "slow down"}).encode()
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def master(monkeypatch):
+    handler = type("Handler", (_Master,), {"responses": [], "posts": 0})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    sleeps = []
+    monkeypatch.setattr(worker_reporter, "MASTER_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(worker_reporter.time, "sleep", sleeps.append)
+    yield handler, sleeps
+    server.shutdown()
+    server.server_close()
+
+
+class TestWorkerReporter:
+    def test_waits_for_retry_after_then_uploads(self, master):
+        # Arrange
+        handler, sleeps = master
+        handler.responses = [(429, {"Retry-After": "3"}), (503, {"Retry-After": "1"})]
+        # Act
+        worker_reporter.WorkerReporter().generate_html({"worker_id": "w"}, [])
+        # Assert
+        assert sleeps == [3.0, 1.0] and handler.posts == 3
+
+    def test_retry_after_is_capped(self, master, monkeypatch):
+        handler, sleeps = master
+        monkeypatch.setattr(worker_reporter, "MAX_RETRY_AFTER", 7.0)
+        handler.responses = [(429, {"Retry-After": "3600"})]
+        worker_reporter.WorkerReporter().generate_html({}, [])
+        assert sleeps == [7.0]
+
+    @pytest.mark.parametrize("status, headers", [(429, {}), (429, {"Retry-After": "soon"}),
+                                                 (500, {"Retry-After": "30"})])
+    def test_fixed_delay_without_usable_retry_after(self, master, status, headers):
+        # 缺失 / 非数字的 Retry-After，或非限流状态码，退回固定间隔
+        handler, sleeps = master
+        handler.responses = [(status, headers)]
+        worker_reporter.WorkerReporter().generate_html({}, [])
+        assert sleeps == [worker_reporter.RETRY_DELAY]
+
+    def test_gives_up_after_max_retries(self, master, monkeypatch):
+        handler, sleeps = master
+        monkeypatch.setattr(worker_reporter, "MAX_RETRIES", 3)
+        handler.responses = [(429, {"Retry-After": "2"})] * 5
+        worker_reporter.WorkerReporter().generate_html({}, [])
+        assert handler.posts == 3 and sleeps == [2.0, 2.0]
@@ -0,0 +1,122 @@
+"""core.collection：pytest 配置读取与收集索引上的选择"""
+import textwrap
+from pathlib import Path
+
+import pytest
+
+from core.collection import CollectionIndex, load_pytest_config
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHECKS = """
+import pytest
+
+def test_a():
+    pass
+
+@pytest.mark.slow
+def test_b():
+    pass
+"""
+
+DOCTESTS = '''
+def add(a, b):
+    """
+    >>> add(1, 2)
+    3
+    """
+    return a + b
+'''
+
+
+def _write(base: Path, files: dict[str, str]):
+    for name, content in files.items():
+        path = base / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(textwrap.dedent(content), encoding="utf-8")
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """python_files 自定义、启用 doctest 的独立项目；子进程收集需要能 import core.collection"""
+    proj = tmp_path / "proj"
+    _write(proj, {
+        "pytest.ini": """
+            [pytest]
+            python_files = check_*.py
+            addopts = --doctest-modules
+            markers = slow
+        """,
+        "tests/check_math.py": CHECKS,
+        "tests/helpers.py": "",
+        "src/util.py": DOCTESTS,
+    })
+    monkeypatch.setenv("PYTHONPATH", str(ROOT))
+    monkeypatch.delenv("PYTEST_ADDOPTS", raising=False)
+    monkeypatch.chdir(proj)
+    return proj
+
+
+class TestPytestConfig:
+    def test_defaults_without_ini(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        config = load_pytest_config(tmp_path)
+        assert config.inifile is None and config.rootdir == tmp_path.resolve()
+        assert config.is_test_file(Path("a/test_x.py")) and config.is_test_file(Path("x_test.py"))
+        assert not config.is_test_file(Path("helpers.py"))
+
+    @pytest.mark.parametrize("name, content", [
+        ("pytest.ini", "[pytest]\npython_files = check_*.py\n"),
+        ("tox.ini", "[pytest]\npython_files = check_*.py\n"),
+        ("setup.cfg", "[tool:pytest]\npython_files = check_*.py\n"),
+        ("pyproject.toml", '[tool.pytest.ini_options]\npython_files = ["check_*.py"]\n'),
+    ])
+    def test_python_files_from_ini(self, tmp_path, name, content):
+        (tmp_path / name).write_text(content)
+        (tmp_path / "sub").mkdir()
+        config = load_pytest_config(tmp_path / "sub")
+        assert config.rootdir == tmp_path.resolve() and config.inifile.name == name
+        assert config.is_test_file(Path("check_a.py")) and not config.is_test_file(Path("test_a.py"))
+
+    def test_setup_cfg_without_section_is_skipped(self, tmp_path):
+        (tmp_path / "setup.cfg").write_text("[metadata]\nname = x\n")
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "tox.ini").write_text("[tox]\n")
+        config = load_pytest_config(tmp_path / "sub")
+        assert config.inifile is None
+
+    def test_doctest_options(self, tmp_path, monkeypatch):
+        (tmp_path / "pytest.ini").write_text("[pytest]\naddopts = --doctest-glob='*.rst'\n")
+        monkeypatch.setenv("PYTEST_ADDOPTS", "--doctest-modules")
+        config = load_pytest_config(tmp_path)
+        assert config.doctest_modules and config.is_test_file(Path("anything.py"))
+        assert config.is_test_file(Path("guide.rst")) and not config.is_test_file(Path("test_a.txt"))
+
+
+class TestSelect:
+    def test_custom_python_files_and_markers(self, project):
+        index = CollectionIndex(str(project.parent / "collection.db"))
+        assert index.select(path="tests", markers="slow") == ["tests/check_math.py::test_b"]
+        assert index.select(path="tests", markers="not slow") == ["tests/check_math.py::test_a"]
+
+    def test_doctest_modules_are_indexed(self, project):
+        index = CollectionIndex(str(project.parent / "collection.db"))
+        assert index.select(test_id="src/util.py") == ["src/util.py::util.add"]
+
+    def test_paths_are_relative_to_invocation_dir(self, project, monkeypatch):
+        # Arrange - 在 rootdir 的子目录里调用，nodeid 仍相对 rootdir
+        monkeypatch.chdir(project / "tests")
+        index = CollectionIndex(str(project.parent / "collection.db"))
+        # Act / Assert
+        assert index.select(path=".", markers="slow") == ["check_math.py::test_b"]
+        assert index.select(path=".", test_id="check_math.py::test_a") == ["check_math.py::test_a"]
+        rows = [r["path"] for r in index.conn.execute("SELECT path FROM files ORDER BY path")]
+        assert "tests/check_math.py" in rows
+
+    def test_ini_change_recollects(self, project):
+        index = CollectionIndex(str(project.parent / "collection.db"))
+        assert index.select(path="tests", markers="slow") == ["tests/check_math.py::test_b"]
+        (project / "pytest.ini").write_text("[pytest]\nmarkers = slow\n")
+        (project / "tests" / "test_new.py").write_text("import pytest\n\n"
+                                                      "@pytest.mark.slow\ndef test_c():\n    pass\n")
+        assert index.select(path="tests", markers="slow") == ["tests/test_new.py::test_c"]
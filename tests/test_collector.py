@@ -0,0 +1,161 @@
+"""core.collector.describe_failure：各 --tb 风格下真实 longrepr 的字段提取与字节预算"""
+import pytest
+
+from core.collector import MESSAGE_BUDGET, describe_failure
+
+pytest_plugins = ["pytester"]
+
+STYLES = ["auto", "long", "short", "line", "native", "no"]
+
+FAILING = '''
+import pytest
+
+
+def helper(x):
+    raise ValueError(f"bad value {x}")
+
+
+def test_assert():
+    assert 1 + 1 == 3
+
+
+def test_raise():
+    helper(42)
+
+
+def test_chain():
+    try:
+        {}["k"]
+    except KeyError as e:
+        raise RuntimeError("wrapped") from e
+
+
+def test_huge_diff():
+    assert "x" * 5000 == "y" * 5000
+
+
+def test_wide_chars():
+    raise ValueError("中文" * 1000)
+
+
+def test_fail():
+    pytest.fail("explicit")
+
+
+@pytest.fixture
+def broken():
+    raise OSError("no fixture")
+
+
+def test_setup(broken):
+    pass
+
+
+def test_skip():
+    pytest.skip("later")
+'''
+
+# 用例 → (exc_type, 崩溃行号, message 中必须出现的片段)
+EXPECTED = {
+    "test_assert": ("AssertionError", 9, "assert (1 + 1) == 3"),
+    "test_raise": ("ValueError", 5, "bad value 42"),
+    "test_chain": ("RuntimeError", 20, "wrapped"),
+    "test_huge_diff": ("AssertionError", 24, "AssertionError: assert 'xxx"),
+    "test_wide_chars": ("ValueError", 28, "ValueError: 中文中文"),
+    "test_fail": ("Failed", 32, "explicit"),
+    "test_setup": ("OSError", 37, "OSError: no fixture"),
+}
+
+
+def _run(pytester, tb: str) -> dict:
+    """真实运行一次 pytest，按用例名返回失败 / 跳过阶段的报告"""
+    pytester.makepyfile(test_src=FAILING)
+    reprec = pytester.inline_run(f"--tb={tb}", "-p", "no:cacheprovider")
+    return {r.nodeid.split("::")[-1]: r for r in reprec.getreports("pytest_runtest_logreport")
+            if r.failed or r.skipped}
+
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+@pytest.fixture(params=STYLES)
+def reports(request, pytester):
+    return request.param, _run(pytester, request.param)
+
+
+class TestTracebackStyles:
+    def test_fields_for_every_failure(self, reports):
+        # Arrange
+        tb, by_name = reports
+        for name, (exc_type, lineno, fragment) in EXPECTED.items():
+            # Act
+            info = describe_failure(by_name[name].longrepr)
+            # Assert - 位置是崩溃帧（helper 内部），不是测试函数入口
+            assert info["exc_type"] == exc_type, (tb, name)
+            assert info["location"].endswith(f"test_src.py:{lineno}"), (tb, name)
+            assert fragment in info["message"], (tb, name)
+            assert 0 < _size(info["message"]) <= MESSAGE_BUDGET, (tb, name)
+
+    def test_chain_keeps_only_final_exception(self, reports):
+        _, by_name = reports
+        message = describe_failure(by_name["test_chain"].longrepr)["message"]
+        assert "KeyError" not in message
+        assert message.rstrip().endswith("RuntimeError: wrapped")
+
+    def test_message_starts_at_crash_frame(self, reports):
+        tb, by_name = reports
+        first = describe_failure(by_name["test_raise"].longrepr)["message"].splitlines()[0]
+        if tb in ("auto", "long"):
+            assert first == '>       raise ValueError(f"bad value {x}")'
+        elif tb == "native":
+            assert first.startswith('  File "') and first.endswith("line 5, in helper")
+        else:
+            assert first == "E   ValueError: bad value 42"
+
+    @pytest.mark.parametrize("budget", [1, 16, 64, 200])
+    def test_small_budget_is_respected(self, reports, budget):
+        _, by_name = reports
+        for name, report in by_name.items():
+            message = describe_failure(report.longrepr, budget=budget)["message"]
+            assert _size(message) <= budget, name
+
+    def test_skip_tuple(self, reports):
+        _, by_name = reports
+        info = describe_failure(by_name["test_skip"].longrepr)
+        assert info["exc_type"] == ""
+        assert info["location"].endswith("test_src.py:45")
+        assert info["message"] == "Skipped: later"
+
+
+class TestOtherReprs:
+    def test_collection_error_text(self, pytester):
+        # Arrange - 收集错误的 longrepr 是纯文本
+        pytester.makepyfile(test_broken="import no_such_module_xyz\n")
+        reprec = pytester.inline_run("-p", "no:cacheprovider")
+        (report,) = [r for r in reprec.getreports("pytest_collectreport") if r.failed]
+        # Act
+        info = describe_failure(report.longrepr)
+        # Assert
+        assert info["exc_type"] == "ModuleNotFoundError"
+        assert info["location"] == ""
+        assert "no_such_module_xyz" in info["message"]
+        assert _size(info["message"]) <= MESSAGE_BUDGET
+
+    def test_plain_string_keeps_tail(self):
+        text = "noise\n" * 1000 + "E   KeyError: 'user'"
+        info = describe_failure(text, budget=100)
+        assert info["message"].endswith("E   KeyError: 'user'")
+        assert info["exc_type"] == "KeyError" and _size(info["message"]) <= 100
+
+    def test_custom_repr_is_formatted_once(self):
+        class Custom:
+            def __str__(self):
+                return "plugin failure\nTimeoutError: upstream"
+
+        info = describe_failure(Custom())
+        assert info == {"exc_type": "TimeoutError", "location": "",
+                        "message": "plugin failure\nTimeoutError: upstream"}
+
+    def test_none(self):
+        assert describe_failure(None) == {"exc_type": "", "location": "", "message": ""}
@@ -0,0 +1,62 @@
+"""master.core.digest.build_digest：上一次运行与 flaky 历史限定在 head 的项目/分支"""
+import json
+
+import pytest
+
+from master.core.backend import BACKENDS, open_backend
+from master.core.digest import build_digest
+from tests.test_storage_contract import payload
+
+
+@pytest.fixture(params=BACKENDS)
+def storage(request, tmp_path):
+    backend = open_backend(request.param, str(tmp_path / "master.db"))
+    yield backend
+    backend.close()
+
+
+def _flip(i: int) -> list:
+    return [("a::flaky", "failed" if i % 2 else "passed", 0.1)]
+
+
+class TestScope:
+    def test_unscoped_digest_compares_within_head_project(self, storage):
+        # Arrange - A 的两次运行，之后 B 的一次运行（无 scope 时 head 是 B）
+        for i in range(4):
+            storage.save_run(payload(f"a{i}", project="A", minute=i, failures=[("a::x", "e")],
+                                     tests=_flip(i) + [("a::x", "failed", 0.1)]))
+        big = {**payload("b1", project="B", minute=10, tests=[("b::ok", "passed", 0.1)]), "total": 500}
+        storage.save_run(big)
+        # Act
+        digest = build_digest(storage)
+        # Assert - B 是该项目的第一次运行：没有 previous / delta，也不带出 A 的 flaky 用例
+        assert (digest["run"]["run_id"], digest["run"]["project"]) == ("b1", "B")
+        assert digest["previous"] is None and digest["delta"] is None
+        assert digest["flaky"] == [] and digest["flaky_total"] == 0
+
+    def test_previous_run_on_same_project_and_branch(self, storage):
+        storage.save_run(payload("a1", project="A", failures=[("a::x", "e"), ("a::y", "e")]))
+        storage.save_run(payload("a-dev", project="A", branch="dev", minute=1))
+        storage.save_run(payload("b1", project="B", minute=2, failures=[("b::z", "e")]))
+        storage.save_run(payload("a2", project="A", minute=3, failures=[("a::y", "e")]))
+        digest = build_digest(storage)
+        assert digest["previous"]["run_id"] == "a1"
+        assert (digest["delta"]["fixed"], digest["delta"]["new_failures"]) == (["a::x"], [])
+        assert digest["delta"]["failed"] == -1
+        assert build_digest(storage, project="B")["previous"] is None
+
+    def test_flaky_limited_to_head_project(self, storage):
+        for i in range(4):
+            storage.save_run(payload(f"a{i}", project="A", minute=i, tests=_flip(i)))
+            storage.save_run(payload(f"b{i}", project="B", minute=i, tests=[("b::ok", "passed", 0.1)]))
+        assert build_digest(storage)["flaky"] == []
+        assert [f["nodeid"] for f in build_digest(storage, project="A")["flaky"]] == ["a::flaky"]
+
+    def test_budget_is_respected(self, storage):
+        failures = [(f"t::{i}", f"ValueError: case {i} " + "x" * 200) for i in range(50)]
+        storage.save_run(payload("r1", failures=failures[:10]))
+        storage.save_run(payload("r2", minute=1, failures=failures))
+        digest = build_digest(storage, budget=600)
+        assert digest["truncated"]
+        assert len(json.dumps(digest, ensure_ascii=False, separators=(",", ":")).encode()) <= 600
+        assert digest["delta"]["new_failures_count"] == 40
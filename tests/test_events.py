@@ -0,0 +1,128 @@
+"""master.core.events.EventBus：扇出、慢消费者断开与订阅上限"""
+import asyncio
+import threading
+
+from master.core.events import TEST_BATCH, EventBus
+
+
+def _run(i: int, project: str = "p", tests: int = 0) -> dict:
+    return {
+        "run_id": f"r{i}", "worker_id": "w1", "project": project, "branch": "main",
+        "passed": tests, "total": tests,
+        "failures": [{"nodeid": f"t::fail{i}"}],
+        "tests": [{"nodeid": f"t::{n}", "outcome": "passed", "duration": 0.1} for n in range(tests)],
+    }
+
+
+async def _publish_from_thread(bus: EventBus, payloads: list[dict]):
+    """FastAPI 同步接口在线程池里发布；等待投递回调在本事件循环上执行完"""
+    thread = threading.Thread(target=lambda: [bus.publish_run(p) for p in payloads])
+    thread.start()
+    await asyncio.to_thread(thread.join)
+    await asyncio.sleep(0)
+
+
+def _drain(queue: asyncio.Queue) -> list[dict]:
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+class TestFanOut:
+    def test_every_subscriber_receives_every_event(self):
+        async def scenario():
+            # Arrange
+            bus = EventBus(buffer=64, max_subscribers=1000)
+            subs = [bus.subscribe() for _ in range(300)]
+            # Act
+            await _publish_from_thread(bus, [_run(i) for i in range(50)])
+            # Assert
+            received = [[e["run_id"] for e in _drain(s.queue)] for s in subs]
+            assert all(r == [f"r{i}" for i in range(50)] for r in received)
+            assert bus.published == 50 and bus.dropped == 0 and bus.subscribers == 300
+        asyncio.run(scenario())
+
+    def test_subscribers_on_several_loops(self):
+        bus = EventBus(buffer=16)
+        ready = threading.Barrier(4)
+        received: list[list[str]] = []
+
+        def consumer():
+            async def main():
+                sub = bus.subscribe()
+                ready.wait()
+                events = [await asyncio.wait_for(sub.queue.get(), 5) for _ in range(10)]
+                received.append([e["run_id"] for e in events])
+            asyncio.run(main())
+
+        threads = [threading.Thread(target=consumer) for _ in range(3)]
+        for t in threads:
+            t.start()
+        ready.wait()
+        for i in range(10):
+            bus.publish_run(_run(i))
+        for t in threads:
+            t.join(10)
+        assert received == [[f"r{i}" for i in range(10)]] * 3
+
+    def test_filters_and_test_batches(self):
+        async def scenario():
+            bus = EventBus(buffer=64)
+            everything = bus.subscribe()
+            only_q = bus.subscribe(project="q", tests=True)
+            await _publish_from_thread(bus, [_run(1, "p", tests=3),
+                                             _run(2, "q", tests=TEST_BATCH + 1)])
+            assert [e["type"] for e in _drain(everything.queue)] == ["run", "run"]
+            batches = _drain(only_q.queue)
+            assert [(e["type"], e["run_id"]) for e in batches] == [("run", "r2"), ("tests", "r2"),
+                                                                     ("tests", "r2")]
+            assert [e["offset"] for e in batches[1:]] == [0, TEST_BATCH]
+            assert [len(e["tests"]) for e in batches[1:]] == [TEST_BATCH, 1]
+            assert [e["id"] for e in batches] == sorted(e["id"] for e in batches)
+        asyncio.run(scenario())
+
+
+class TestSlowConsumers:
+    def test_full_buffer_drops_only_the_slow_subscriber(self):
+        async def scenario():
+            # Arrange - slow 从不读取，fast 每批读完
+            bus = EventBus(buffer=4)
+            slow, fast = bus.subscribe(), bus.subscribe()
+            got = []
+            # Act
+            for i in range(10):
+                await _publish_from_thread(bus, [_run(i)])
+                got += [e["run_id"] for e in _drain(fast.queue)]
+            # Assert
+            assert slow.dropped and not fast.dropped
+            assert slow.queue.qsize() == 4
+            assert got == [f"r{i}" for i in range(10)]
+            assert bus.dropped == 1 and bus.subscribers == 1
+        asyncio.run(scenario())
+
+    def test_dropped_subscriber_gets_nothing_more(self):
+        async def scenario():
+            bus = EventBus(buffer=2)
+            sub = bus.subscribe()
+            await _publish_from_thread(bus, [_run(i) for i in range(5)])
+            assert sub.dropped and [e["run_id"] for e in _drain(sub.queue)] == ["r0", "r1"]
+            await _publish_from_thread(bus, [_run(9)])
+            assert sub.queue.empty() and bus.dropped == 1
+        asyncio.run(scenario())
+
+
+class TestLimits:
+    def test_max_subscribers(self):
+        async def scenario():
+            bus = EventBus(max_subscribers=3)
+            subs = [bus.subscribe() for _ in range(3)]
+            assert bus.subscribe() is None and bus.subscribers == 3
+            bus.unsubscribe(subs[0])
+            assert bus.subscribe() is not None and bus.subscribers == 3
+        asyncio.run(scenario())
+
+    def test_publish_without_subscribers_is_noop(self):
+        bus = EventBus()
+        bus.publish_run(_run(1))
+        assert bus.published == 0
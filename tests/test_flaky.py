@@ -0,0 +1,87 @@
+"""master.core.flaky：outcome 位图的增量更新与 flaky 排行"""
+import pytest
+
+from core import timings
+from master.core import flaky
+
+PASSED, FAILED, ERROR, SKIPPED = (timings.OUTCOME_CODES[o]
+                                  for o in ("passed", "failed", "error", "skipped"))
+
+
+def _feed(outcomes: str, project: str = "p", tid: int = 1) -> dict:
+    """按 P/F 序列（旧→新）逐次计入同一个用例，返回统计行字典"""
+    rows = {}
+    for i, o in enumerate(outcomes):
+        flaky.apply(rows, project, f"r{i}", {tid: o == "F"})
+    return rows
+
+
+def _as_record(rows: dict) -> list[dict]:
+    keys = ("runs", "fails", "flips", "history", "history_len", "last_run")
+    return [{"project": p, "test_id": tid, **dict(zip(keys, row))} for (p, tid), row in rows.items()]
+
+
+def _rank(rows: dict, **kwargs) -> list[dict]:
+    return flaky.rank_rows(_as_record(rows), lambda ids: {i: f"t::{i}" for i in ids}, **kwargs)
+
+
+class TestApply:
+    def test_observe_ignores_skips_and_counts_errors_as_failures(self):
+        observed = flaky.observe([1, 2, 3, 4], [PASSED, FAILED, ERROR, SKIPPED])
+        assert observed == {1: False, 2: True, 3: True}
+
+    def test_flips_and_history_bits(self):
+        # Arrange / Act - 旧→新：P F F P
+        rows = _feed("PFFP")
+        # Assert - bit0 为最新一次
+        runs, fails, flips, history, length, last_run = rows[("p", 1)]
+        assert (runs, fails, flips, length, last_run) == (4, 2, 2, 4, "r3")
+        assert history == 0b0110
+
+    def test_first_run_is_never_a_flip(self):
+        assert _feed("F")[("p", 1)][2] == 0
+
+    def test_history_is_capped_at_window(self):
+        rows = _feed("F" + "P" * flaky.WINDOW)
+        runs, fails, flips, history, length, _ = rows[("p", 1)]
+        assert (runs, fails, flips) == (flaky.WINDOW + 1, 1, 1)
+        assert length == flaky.WINDOW and history == 0           # 最早那次失败已移出窗口
+        assert _feed("F" * (flaky.WINDOW + 5))[("p", 1)][3] == (1 << flaky.WINDOW) - 1
+
+
+class TestRankRows:
+    def test_recent_window_and_rates(self):
+        ranked = _rank(_feed("PFPFFF"))
+        assert ranked == [{
+            "project": "p", "nodeid": "t::1", "runs": 6, "fails": 4, "fail_rate": 0.6667,
+            "flips": 3, "flip_rate": 0.6, "last_run": "r5",
+            "recent": {"window": 6, "flip_rate": 0.6, "fail_rate": 0.6667, "history": "FFFPFP"},
+        }]
+
+    def test_old_flips_outside_window_do_not_rank(self):
+        # 早期翻转过、最近 63 次稳定通过：累计 flips > 0，但近期翻转率为 0
+        rows = _feed("PFPF" + "P" * flaky.WINDOW)
+        assert rows[("p", 1)][2] == 4
+        assert _rank(rows) == []
+        assert len(_rank(rows, min_flip_rate=0)) == 1
+
+    def test_order_by_recent_flip_rate_then_lifetime_then_fail_rate(self):
+        seqs = {
+            1: "PPPPPF",                    # 近期翻转率 0.2
+            2: "PF" * 40,                   # 近期 1.0，累计 1.0，失败率 0.5
+            3: "F" * 10 + "PF" * 35,        # 近期 1.0（窗口只含交替段），累计 70/79
+            4: "FPF",                       # 近期 1.0，累计 1.0，失败率 0.67
+            5: "PFP",                       # 近期 1.0，累计 1.0，失败率 0.33
+        }
+        rows = {}
+        for tid, seq in seqs.items():
+            rows.update(_feed(seq, tid=tid))
+        ranked = _rank(rows, min_flip_rate=0)
+        assert [r["nodeid"] for r in ranked] == ["t::4", "t::2", "t::5", "t::3", "t::1"]
+        assert [r["nodeid"] for r in _rank(rows, min_flip_rate=0, limit=2)] == ["t::4", "t::2"]
+
+    @pytest.mark.parametrize("min_flip_rate, expected", [(0.5, ["t::2"]), (0.9, ["t::2"]),
+                                                         (0.2, ["t::2", "t::1"])])
+    def test_min_flip_rate(self, min_flip_rate, expected):
+        rows = {**_feed("PPPPF", tid=1), **_feed("PFPFP", tid=2)}
+        assert [r["nodeid"] for r in _rank(rows, min_flip_rate=min_flip_rate)] == expected
@@ -0,0 +1,111 @@
+"""core.impact：变更文件 → 受影响用例的选择与回退"""
+import pytest
+
+from core import impact
+from core.storage import TestStorage as History     # 别名：避免 pytest 当作测试类收集
+
+MAPPING = {
+    "src/calc.py": ["tests/test_calc.py::test_add", "tests/test_calc.py::test_div"],
+    "src/io.py": ["tests/test_io.py::test_read"],
+}
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for path in ("src/calc.py", "src/io.py", "tests/test_calc.py", "tests/test_io.py"):
+        (tmp_path / path).parent.mkdir(exist_ok=True)
+        (tmp_path / path).write_text("")
+    monkeypatch.setattr(impact, "_git", lambda *args: None)
+    storage = History(str(tmp_path / "history.db"))
+    storage.save_coverage_map(MAPPING)
+    yield storage
+    storage.conn.close()
+
+
+def _changed(monkeypatch, *files: str):
+    monkeypatch.setattr(impact, "changed_files", lambda rev: sorted(files))
+
+
+class TestSelect:
+    def test_covered_source_change_selects_covering_tests(self, storage, monkeypatch):
+        # Arrange
+        _changed(monkeypatch, "src/calc.py")
+        # Act
+        result = impact.select(storage, "HEAD~1")
+        # Assert
+        assert result["mode"] == "impact"
+        assert result["targets"] == MAPPING["src/calc.py"]
+
+    def test_new_test_file_runs_whole_file(self, storage, monkeypatch, tmp_path):
+        (tmp_path / "tests/test_new.py").write_text("")
+        _changed(monkeypatch, "tests/test_new.py", "src/io.py")
+        result = impact.select(storage, "HEAD~1")
+        assert result["targets"] == ["tests/test_new.py", "tests/test_io.py::test_read"]
+
+    def test_deleted_test_files_are_filtered(self, storage, monkeypatch, tmp_path):
+        (tmp_path / "tests/test_io.py").unlink()
+        _changed(monkeypatch, "src/io.py")
+        result = impact.select(storage, "HEAD~1")
+        assert result["mode"] == "impact" and result["targets"] == []
+
+    @pytest.mark.parametrize("path, expected", [
+        ("tests/test_calc.py", MAPPING["src/calc.py"]),
+        ("tests/", ["tests/test_new.py"] + MAPPING["src/calc.py"] + MAPPING["src/io.py"]),
+        ("tests/test_io.py", MAPPING["src/io.py"]),
+        ("tests/test_calc.py::test_add", ["tests/test_calc.py::test_add"]),
+        ("tests/test_new.py::test_x", ["tests/test_new.py::test_x"]),
+        ("other/", []),
+    ])
+    def test_path_limits_selection(self, storage, monkeypatch, tmp_path, path, expected):
+        (tmp_path / "tests/test_new.py").write_text("")
+        _changed(monkeypatch, "tests/test_new.py", "src/calc.py", "src/io.py")
+        result = impact.select(storage, "HEAD~1", path=path)
+        assert result["mode"] == "impact" and result["targets"] == expected
+
+    @pytest.mark.parametrize("changed", [
+        "pytest.ini", "requirements.txt", "tests/data/fixture.json", "templates/report.html",
+    ])
+    def test_non_python_change_forces_full_run(self, storage, monkeypatch, changed):
+        _changed(monkeypatch, "src/calc.py", changed)
+        result = impact.select(storage, "HEAD~1")
+        assert result["mode"] == "full"
+        assert changed in result["reason"]
+
+    def test_ignored_docs_do_not_force_full_run(self, storage, monkeypatch):
+        _changed(monkeypatch, "README.md", "docs/guide/index.rst", "src/io.py")
+        result = impact.select(storage, "HEAD~1")
+        assert result["mode"] == "impact"
+        assert result["targets"] == MAPPING["src/io.py"]
+
+    def test_conftest_and_unknown_files_force_full_run(self, storage, monkeypatch, tmp_path):
+        _changed(monkeypatch, "tests/conftest.py")
+        assert impact.select(storage, "HEAD~1")["mode"] == "full"
+        (tmp_path / "src/new.py").write_text("")
+        _changed(monkeypatch, "src/new.py")
+        assert "src/new.py" in impact.select(storage, "HEAD~1")["reason"]
+
+    def test_missing_or_stale_map_forces_full_run(self, tmp_path, monkeypatch):
+        storage = History(str(tmp_path / "empty.db"))
+        assert impact.select(storage, "HEAD~1")["mode"] == "full"
+        storage.save_coverage_map(MAPPING)
+        monkeypatch.setattr(impact, "MAX_AGE_DAYS", -1)
+        assert "天未更新" in impact.select(storage, "HEAD~1")["reason"]
+        storage.conn.close()
+
+
+class TestCoverageMap:
+    def test_partial_update_keeps_meta_and_other_tests(self, storage):
+        meta = storage.get_coverage_meta()
+        storage.save_coverage_map({"src/io.py": ["tests/test_calc.py::test_add"]}, "abc",
+                                  ran=["tests/test_calc.py::test_add"])
+        assert storage.get_coverage_meta() == meta
+        covering = storage.get_covering_tests(["src/calc.py", "src/io.py"])
+        assert covering["src/calc.py"] == ["tests/test_calc.py::test_div"]
+        assert sorted(covering["src/io.py"]) == ["tests/test_calc.py::test_add",
+                                                 "tests/test_io.py::test_read"]
+
+    def test_full_update_replaces_map_and_meta(self, storage):
+        storage.save_coverage_map({"src/io.py": ["tests/test_io.py::test_read"]}, "abc")
+        assert storage.get_coverage_meta()["revision"] == "abc"
+        assert storage.get_covering_tests(["src/calc.py"]) == {}
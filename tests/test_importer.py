@@ -0,0 +1,100 @@
+"""master.core.importer：导入顺序、run_id 键与在线 Master 互斥"""
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from master.core.importer import content_run_id, discover, import_reports, report_created
+from master.core.storage import DatabaseLocked, MasterStorage
+
+DAY = 86400
+T0 = 1767225600            # 2026-01-01
+
+
+def _report(path: Path, created, failed: bool = False, created_first: bool = True) -> Path:
+    tests = [{"nodeid": "t.py::a", "outcome": "failed" if failed else "passed",
+              "call": {"duration": 0.1, **({"longrepr": "E AssertionError"} if failed else {})}}]
+    body = {"duration": 0.1, "exitcode": int(failed),
+            "summary": {"passed": int(not failed), "failed": int(failed), "total": 1},
+            "tests": tests}
+    if created is not None:
+        body = {"created": created, **body} if created_first else {**body, "created": created}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(body), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def reports(tmp_path):
+    # created 与文件修改时间的顺序相反（CI 产物拷贝/解压后 mtime 不可信）
+    root = tmp_path / "reports"
+    files = [_report(root / name, T0 + i * DAY, failed=i % 2 == 1)
+             for i, name in enumerate(["c.json", "b/a.json", "a.json"])]
+    for i, f in enumerate(files):
+        os.utime(f, (T0 + (10 - i) * DAY, T0 + (10 - i) * DAY))
+    return root
+
+
+class TestDiscover:
+    def test_sorted_by_created_not_mtime(self, reports):
+        found = [p.relative_to(reports).as_posix() for p in discover(str(reports))]
+        assert found == ["c.json", "b/a.json", "a.json"]
+
+    def test_created_later_in_file_or_missing(self, tmp_path):
+        late = _report(tmp_path / "late.json", T0 + 5, created_first=False)
+        missing = _report(tmp_path / "missing.json", None)
+        broken = tmp_path / "broken.json"
+        broken.write_text("{not json")
+        os.utime(missing, (T0, T0))
+        os.utime(broken, (T0 + 1, T0 + 1))
+        assert report_created(late) == T0 + 5
+        assert report_created(missing) == T0 and report_created(broken) == T0 + 1
+
+
+class TestRunId:
+    def test_project_and_branch_are_part_of_the_key(self, reports):
+        path = discover(str(reports))[0]
+        ids = {content_run_id(path, p, b) for p in ("a", "b") for b in ("main", "dev")}
+        assert len(ids) == 4
+        assert content_run_id(path, "a", "main") == content_run_id(path, "a", "main")
+
+    def test_same_files_into_two_projects(self, tmp_path, reports):
+        db = str(tmp_path / "master.db")
+        files = discover(str(reports))
+        first = import_reports(db, files, project="a", processes=2)
+        other = import_reports(db, files, project="b", processes=2)
+        again = import_reports(db, files, project="a", processes=2)
+        assert (first["imported"], other["imported"]) == (3, 3)
+        assert (again["imported"], again["skipped"]) == (0, 3)
+        storage = MasterStorage(db)
+        runs = storage.get_runs(project="a")
+        assert [r["timestamp"] for r in runs] == sorted((r["timestamp"] for r in runs), reverse=True)
+        assert len(storage.get_runs(project="b")) == 3
+        storage.close()
+
+
+class TestLiveMaster:
+    def test_import_refused_while_master_open(self, tmp_path, reports):
+        # Arrange
+        db = str(tmp_path / "master.db")
+        master = MasterStorage(db)
+        # Act / Assert - 拒绝导入，库中不留下任何写入
+        with pytest.raises(DatabaseLocked, match="Master"):
+            import_reports(db, discover(str(reports)), processes=1)
+        assert master.get_runs() == []
+        indexes = {r[0] for r in master.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='index'")}
+        assert "idx_runs_project" in indexes
+        master.close()
+        assert import_reports(db, discover(str(reports)), processes=1)["imported"] == 3
+
+    def test_master_refused_while_importing(self, tmp_path):
+        db = str(tmp_path / "master.db")
+        importing = MasterStorage(db, exclusive=True)
+        with pytest.raises(DatabaseLocked, match="导入"):
+            MasterStorage(db)
+        importing.close()
+        first, second = MasterStorage(db), MasterStorage(db)          # 多个 Master 进程共享
+        first.close()
+        second.close()
@@ -0,0 +1,164 @@
+"""api.jobs.JobQueue：优先级、合并与进度订阅；并发运行共用的本地存储"""
+import asyncio
+import threading
+
+import pytest
+
+from api import jobs as jobs_mod
+from api.jobs import AsyncListener, JobQueue
+from core.storage import TestStorage as History      # 别名：避免 pytest 当作测试类收集
+
+
+class Handler:
+    """可控的任务处理器：每个任务发一条进度事件后等待放行"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started: list[dict] = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, params: dict, on_event) -> dict:
+        with self._lock:
+            self.started.append(params)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        on_event({"type": "collected", "count": 1})
+        self.release.wait(5)
+        with self._lock:
+            self.running -= 1
+        if params.get("fail"):
+            return {"error": "boom"}
+        return {"total": 1, "params": params}
+
+
+def _drain(events) -> list[dict]:
+    out = []
+    while (event := events.get(timeout=5)) is not None:
+        out.append(event)
+    return out
+
+
+@pytest.fixture
+def handler():
+    handler = Handler()
+    yield handler
+    handler.release.set()
+
+
+class TestJobQueue:
+    def test_stream_subscriber_replays_and_gets_result(self, handler):
+        # Arrange
+        jobs = JobQueue(handler, concurrency=1)
+        jobs.start()
+        job, created = jobs.submit({"path": "a"})
+        # Act
+        while not job.events:
+            threading.Event().wait(0.01)
+        events = jobs.subscribe(job)            # 运行中途加入：先回放已有事件
+        handler.release.set()
+        # Assert
+        assert created
+        assert _drain(events) == [{"type": "collected", "count": 1},
+                                  {"type": "result", "total": 1, "params": {"path": "a"}}]
+        assert _drain(jobs.subscribe(job)) == [{"type": "result", "total": 1, "params": {"path": "a"}}]
+
+    def test_concurrency_priority_and_dedup(self, handler):
+        jobs = JobQueue(handler, concurrency=1)
+        jobs.start()
+        first, _ = jobs.submit({"path": "first"})
+        while not first.events:                 # 等 first 占住唯一的执行线程
+            threading.Event().wait(0.01)
+        low, _ = jobs.submit({"path": "low"}, priority=0)
+        high, _ = jobs.submit({"path": "high"}, priority=5)
+        same, created = jobs.submit({"path": "low"})
+        assert same is low and not created
+        streams = [jobs.subscribe(j) for j in (first, low, high)]
+        handler.release.set()
+        for events in streams:
+            assert _drain(events)[-1]["type"] == "result"
+        assert [p["path"] for p in handler.started] == ["first", "high", "low"]
+        assert handler.max_running == 1
+
+    def test_failed_job_streams_error(self, handler):
+        jobs = JobQueue(handler)
+        jobs.start()
+        job, _ = jobs.submit({"fail": True})
+        events = jobs.subscribe(job)
+        handler.release.set()
+        assert _drain(events)[-1] == {"type": "error", "detail": "boom"}
+        assert job.status == "failed"
+
+    @pytest.mark.parametrize("params, status", [({"path": "a"}, "done"), ({"fail": True}, "failed")])
+    def test_result_is_set_before_status(self, handler, monkeypatch, params, status):
+        # 记录状态变为终态那一刻 result / error 是否已就绪（读到 done 却拿到 None 会让 final_event 崩掉）
+        seen = []
+
+        class Recorded(jobs_mod.Job):
+            def __setattr__(self, name, value):
+                if name == "status" and value in ("done", "failed"):
+                    seen.append((value, self.result is not None, self.error is not None))
+                super().__setattr__(name, value)
+
+        monkeypatch.setattr(jobs_mod, "Job", Recorded)
+        jobs = JobQueue(handler)
+        jobs.start()
+        job, _ = jobs.submit(params)
+        events = jobs.subscribe(job)
+        handler.release.set()
+        _drain(events)
+        assert seen == [(status, status == "done", status == "failed")]
+
+
+class TestAsyncListener:
+    def test_stream_on_event_loop(self, handler):
+        # Arrange
+        jobs = JobQueue(handler)
+        jobs.start()
+        job, _ = jobs.submit({"path": "a"})
+
+        async def consume() -> list[dict]:
+            events = jobs.subscribe(job, AsyncListener(asyncio.get_running_loop()))
+            handler.release.set()               # 放行发生在订阅之后：结果经工作线程推到事件循环
+            out = []
+            while (event := await asyncio.wait_for(events.get(), 5)) is not None:
+                out.append(event)
+            return out
+
+        # Act / Assert
+        assert asyncio.run(consume()) == [{"type": "collected", "count": 1},
+                                          {"type": "result", "total": 1, "params": {"path": "a"}}]
+
+    def test_unsubscribed_listener_gets_nothing_after_loop_closed(self, handler):
+        jobs = JobQueue(handler)
+        jobs.start()
+        job, _ = jobs.submit({"path": "a"})
+
+        async def leave() -> AsyncListener:
+            events = jobs.subscribe(job, AsyncListener(asyncio.get_running_loop()))
+            jobs.unsubscribe(job, events)
+            return events
+
+        events = asyncio.run(leave())
+        assert events not in job.listeners
+        events.put({"type": "late"})            # 事件循环已关闭：静默丢弃，不影响工作线程
+        handler.release.set()
+        assert _drain(jobs.subscribe(job))[-1]["type"] == "result"
+
+
+class TestConcurrentRuns:
+    def test_local_storage_serializes_parallel_saves(self, tmp_path):
+        # RUN_CONCURRENCY>1 时多个任务线程共用同一个 TestStorage 连接
+        storage = History(str(tmp_path / "history.db"))
+        tests = [{"nodeid": f"t.py::test_{i}", "outcome": "passed", "duration": 0.1} for i in range(50)]
+        result = {"passed": 50, "total": 50, "pass_rate": 100.0, "tests": tests}
+        threads = [threading.Thread(target=lambda: [storage.save(result) for _ in range(10)])
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(storage.get_history(100)) == 40
+        assert len(storage.get_duration_stats(100)) == 50
+        storage.conn.close()
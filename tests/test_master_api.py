@@ -0,0 +1,157 @@
+"""master/api/server.py：Master HTTP 接口（内存引擎，不落盘）"""
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import master.api.server as server
+from master.core.admission import Admission
+from master.core.backend import open_backend
+from master.core.events import EventBus
+from master.core.storage import MasterStorage
+from tests.test_storage_contract import payload
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    backend = open_backend("memory", "")
+    monkeypatch.setattr(server, "storage", backend)
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def client(storage):
+    with TestClient(server.app) as client:
+        yield client
+
+
+class TestDiff:
+    def test_default_base_is_previous_run_on_branch(self, client, storage):
+        # Arrange
+        storage.save_run(payload("r1", failures=[("t::a", "e"), ("t::b", "e")]))
+        storage.save_run(payload("d1", branch="dev", minute=1, failures=[("t::x", "e")]))
+        storage.save_run(payload("r2", minute=2, failures=[("t::b", "e"), ("t::c", "e")]))
+        # Act
+        body = client.get("/diff", params={"head": "r2"}).json()
+        # Assert
+        assert body["base"]["run_id"] == "r1"
+        assert body["new_failures"] == ["t::c"]
+        assert (body["fixed"], body["still_failing"]) == (["t::a"], ["t::b"])
+
+    def test_limit_truncates_lists_but_not_counts(self, client, storage):
+        storage.save_run(payload("r1"))
+        storage.save_run(payload("r2", minute=1, failures=[(f"t::{i}", "e") for i in range(5)]))
+        body = client.get("/diff", params={"base": "r1", "head": "r2", "limit": 2}).json()
+        assert body["new_failures"] == ["t::0", "t::1"]
+        assert body["counts"]["new_failures"] == 5
+
+    @pytest.mark.parametrize("params", [{"head": "r1"}, {"head": "missing"},
+                                        {"head": "r1", "base": "missing"}])
+    def test_unknown_or_first_run_is_404(self, client, storage, params):
+        storage.save_run(payload("r1"))
+        assert client.get("/diff", params=params).status_code == 404
+
+
+class TestSubmit:
+    @pytest.mark.parametrize("timestamp", ["yesterday", "2026-13-01T00:00:00", "1700000000"])
+    def test_invalid_timestamp_is_422(self, client, storage, timestamp):
+        body = {**payload("r1", tests=[("t::a", "passed", 0.1)]), "timestamp": timestamp}
+        response = client.post("/results", json=body)
+        assert response.status_code == 422
+        assert "timestamp" in response.text
+        assert storage.get_runs() == []
+
+    @pytest.mark.parametrize("timestamp, stored", [
+        ("2026-01-02T03:04:05", "2026-01-02T03:04:05"),
+        ("2026-01-02T03:04:05+08:00", "2026-01-02T03:04:05+08:00"),
+        ("", None),
+    ])
+    def test_valid_or_missing_timestamp_is_saved(self, client, storage, timestamp, stored):
+        response = client.post("/results", json={**payload("r1"), "timestamp": timestamp})
+        assert response.status_code == 201
+        saved = storage.get_run("r1")["timestamp"]
+        assert saved == stored if stored else saved.startswith(str(datetime.now().year))
+
+    def test_rate_limited_is_429_with_retry_after(self, client, storage, monkeypatch):
+        monkeypatch.setattr(server, "admission", Admission(rate=0.25, burst=1))
+        assert client.post("/results", json=payload("r1")).status_code == 201
+        response = client.post("/results", json=payload("r2"))
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "4"
+        assert [r["run_id"] for r in storage.get_runs()] == ["r1"]
+        workers = client.get("/admission").json()["workers"]
+        assert (workers[0]["accepted"], workers[0]["rejected_by"]) == (1, {"rate": 1})
+
+
+class TestEtag:
+    def test_not_modified_until_any_process_writes(self, client, monkeypatch, tmp_path):
+        # Arrange - 两个 Master 进程共用一个 SQLite 库；本进程自己从不写入
+        db = str(tmp_path / "master.db")
+        mine, other = MasterStorage(db), MasterStorage(db)
+        monkeypatch.setattr(server, "storage", mine)
+        other.save_run(payload("r1"))
+        first = client.get("/results")
+        etag = first.headers["ETag"]
+        # Act / Assert - 数据未变：304
+        assert client.get("/results", headers={"If-None-Match": etag}).status_code == 304
+        other.save_run(payload("r2", minute=1))
+        # 另一进程写入后重新验证：200 + 新 ETag + 新数据
+        fresh = client.get("/results", headers={"If-None-Match": etag})
+        assert fresh.status_code == 200 and fresh.headers["ETag"] != etag
+        assert [r["run_id"] for r in fresh.json()] == ["r2", "r1"]
+        assert client.get("/results", headers={"If-None-Match": fresh.headers["ETag"]}).status_code == 304
+        mine.close()
+        other.close()
+
+    def test_failed_save_keeps_version(self, tmp_path):
+        storage = MasterStorage(str(tmp_path / "master.db"))
+        version = storage.data_version
+        with pytest.raises(ValueError):
+            storage.save_run({**payload("r1", tests=[("t::a", "passed", 0.1)]), "timestamp": "bad"})
+        assert storage.data_version == version
+        storage.save_run(payload("r1"))
+        assert storage.data_version != version
+        storage.close()
+
+
+class TestHtmlReport:
+    FAILURES = [("t::a", "KeyError: 'user'"), ("t::b", "KeyError: 'user'"),
+                ("t::c", "ValueError: bad config"), ("t::d", "TimeoutError: upstream"),
+                ("t::e", "ZeroDivisionError: division by zero")]
+
+    def test_truncated_clusters_are_summarized(self, client, storage, monkeypatch):
+        # Arrange
+        monkeypatch.setattr(server, "REPORT_CLUSTERS", 2)
+        storage.save_run(payload("r1", failures=self.FAILURES))
+        # Act
+        html = client.get("/report/html").text
+        # Assert - 列出最大的 2 类（3 个失败），其余 2 类 2 个失败汇总
+        assert "5 个失败，按错误信息聚为 4 类" in html
+        assert "+2 类（2 个失败）未列出" in html
+        assert "/failures/clusters?run_id=r1&amp;limit=500" in html
+
+    def test_complete_clusters_have_no_note(self, client, storage):
+        storage.save_run(payload("r1", failures=self.FAILURES))
+        html = client.get("/report/html").text
+        assert "聚为 4 类" in html and "未列出" not in html
+
+
+class TestSearch:
+    @pytest.fixture(autouse=True)
+    def failures(self, storage):
+        storage.save_run(payload("r1", failures=[("t::get", "ConnectionResetError: reset by peer")]))
+
+    def test_malformed_query_falls_back_to_literal_terms(self, client):
+        body = client.get("/failures/search", params={"q": '"reset by'}).json()
+        assert body["query"] == '"""reset" "by"' and body["total"] == 1
+
+    @pytest.mark.parametrize("q, status", [("", 422), ("   ", 400)])
+    def test_empty_query_is_rejected(self, client, q, status):
+        assert client.get("/failures/search", params={"q": q}).status_code == status
+
+
+class TestEvents:
+    def test_subscriber_limit_is_503(self, client, monkeypatch):
+        monkeypatch.setattr(server, "events", EventBus(max_subscribers=0))
+        assert client.get("/events").status_code == 503
@@ -0,0 +1,230 @@
+"""mcp/server.py：query_batch 子查询的并发执行与逐项错误收集；响应缓存（TTL / LRU / 合并 / 取消 / ETag）"""
+import asyncio
+import json
+import time
+import types
+
+import httpx
+import pytest
+
+from benchmarks.mcp_batch import load_mcp_server
+
+
+def _master(request: httpx.Request) -> httpx.Response:
+    """Master 替身：/results 正常，/failures/stats 返回 500，/workers 连接失败"""
+    if request.url.path == "/results":
+        return httpx.Response(200, json=[{"id": 1, "limit": request.url.params["limit"]}])
+    if request.url.path == "/failures/stats":
+        return httpx.Response(500, text="database is locked")
+    raise httpx.ConnectError("connection refused", request=request)
+
+
+@pytest.fixture
+def server():
+    try:
+        module = load_mcp_server()
+    except (ImportError, AttributeError) as e:
+        pytest.skip(f"已安装的 MCP SDK 与 mcp/server.py 不兼容：{e}")
+    module.CACHE_TTL.clear()
+    module._client = httpx.AsyncClient(base_url="http://master", transport=httpx.MockTransport(_master))
+    yield module
+    asyncio.run(module._client.aclose())
+
+
+class TestQueryBatch:
+    def test_partial_failures_are_reported_per_query(self, server):
+        # Arrange
+        queries = [
+            {"tool": "get_summary", "arguments": {"project": "demo"}},
+            {"tool": "get_failure_stats", "arguments": {}},
+            {"tool": "get_workers"},
+            {"tool": "no_such_tool", "arguments": {}},
+            "not-a-query",
+        ]
+        # Act
+        result = asyncio.run(server._run_batch(queries))
+        # Assert - 顺序与请求一致，成功项不受失败项影响
+        items = result["results"]
+        assert [i["tool"] for i in items] == ["get_summary", "get_failure_stats", "get_workers",
+                                             "no_such_tool", ""]
+        assert items[0]["result"] == [{"id": 1, "limit": "10"}] and "error" not in items[0]
+        assert "HTTP 500" in items[1]["error"] and "database is locked" in items[1]["error"]
+        assert "无法连接到 Master" in items[2]["error"]
+        assert items[3]["error"] == "未知工具: no_such_tool"
+        assert items[4]["error"] == "未知工具: "
+
+    @pytest.mark.parametrize("size", [None, 0, "over"])
+    def test_invalid_batch_is_rejected_whole(self, server, size):
+        queries = {None: None, 0: [], "over": [{"tool": "get_workers"}] * (server.BATCH_MAX + 1)}[size]
+        with pytest.raises(ValueError):
+            asyncio.run(server._run_batch(queries))
+
+    def test_call_tool_returns_batch_json(self, server):
+        content = asyncio.run(server.call_tool("query_batch", {"queries": [
+            {"tool": "get_summary", "arguments": {"limit": 3}},
+            {"tool": "get_failure_stats"},
+        ]}))
+        body = json.loads(content[0].text)
+        assert body["results"][0]["result"] == [{"id": 1, "limit": "3"}]
+        assert "error" in body["results"][1]
+
+
+# ── 响应缓存 ─────────────────────────────────────────────
+
+class Master:
+    """可观测的 Master 替身：记录每次请求；gate 未放行前挂起；If-None-Match 命中当前 ETag 时返回 304"""
+
+    def __init__(self):
+        self.calls: list[tuple] = []
+        self.etag = "v1"
+        self.body = "first"
+        self.gate: asyncio.Event | None = None
+        self.cancelled = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append((request.url.params.get("limit"), request.headers.get("If-None-Match")))
+        if self.gate is not None:
+            try:
+                await self.gate.wait()
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        if self.body is None:
+            return httpx.Response(500, text="boom")
+        if request.headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304)
+        return httpx.Response(200, json={"body": self.body}, headers={"ETag": self.etag})
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def cached(server, monkeypatch):
+    master, clock = Master(), Clock()
+    client = httpx.AsyncClient(base_url="http://master", transport=httpx.MockTransport(master))
+    monkeypatch.setattr(server, "_client", client)
+    monkeypatch.setattr(server, "time", types.SimpleNamespace(monotonic=clock.monotonic,
+                                                              perf_counter=time.perf_counter))
+    server.CACHE_TTL["get_summary"] = 30
+    yield server._ResponseCache(2), master, clock
+    asyncio.run(client.aclose())
+
+
+def _get(cache, limit: int = 10):
+    return cache.get("get_summary", "/results", {"limit": limit})
+
+
+def _body(result: tuple) -> str:
+    return json.loads(result[0])["body"]
+
+
+class TestResponseCache:
+    def test_ttl_expiry_revalidates_with_etag(self, cached):
+        # Arrange
+        cache, master, clock = cached
+
+        async def scenario():
+            first = await _get(cache)
+            hit = await _get(cache)                 # TTL 内：不打 Master
+            clock.now += 31
+            revalidated = await _get(cache)         # 过期：带 ETag 重验证，304 沿用旧内容并续期
+            again = await _get(cache)
+            master.etag, master.body = "v2", "second"
+            clock.now += 31
+            changed = await _get(cache)             # 过期且内容已变：200 替换缓存
+            return [_body(r) for r in (first, hit, revalidated, again, changed)]
+
+        # Act
+        bodies = asyncio.run(scenario())
+        # Assert
+        assert bodies == ["first", "first", "first", "first", "second"]
+        assert master.calls == [("10", None), ("10", "v1"), ("10", "v1")]
+
+    def test_lru_evicts_least_recently_used(self, cached):
+        cache, master, clock = cached
+
+        async def scenario():
+            await _get(cache, 1)
+            await _get(cache, 2)
+            await _get(cache, 1)                    # 1 变为最近使用
+            await _get(cache, 3)                    # 容量 2：淘汰 2
+            await _get(cache, 1)
+            await _get(cache, 2)
+
+        asyncio.run(scenario())
+        assert [limit for limit, _ in master.calls] == ["1", "2", "3", "2"]
+
+    def test_errors_are_not_cached(self, cached):
+        cache, master, clock = cached
+        master.body = None
+
+        async def scenario():
+            for _ in range(2):
+                with pytest.raises(RuntimeError, match="HTTP 500"):
+                    await _get(cache)
+
+        asyncio.run(scenario())
+        assert len(master.calls) == 2
+
+
+class TestCoalescing:
+    def test_concurrent_identical_requests_share_one_call(self, cached):
+        # Arrange
+        cache, master, clock = cached
+
+        async def scenario():
+            master.gate = asyncio.Event()
+            waiters = [asyncio.create_task(_get(cache)) for _ in range(5)]
+            other = asyncio.create_task(_get(cache, 20))    # 不同参数不合并
+            await asyncio.sleep(0.01)
+            master.gate.set()
+            return await asyncio.gather(*waiters), await other
+
+        # Act
+        results, other = asyncio.run(scenario())
+        # Assert
+        assert [_body(r) for r in results] == ["first"] * 5 and _body(other) == "first"
+        assert sorted(limit for limit, _ in master.calls) == ["10", "20"]
+        assert cache._inflight == {}
+
+    def test_one_cancelled_waiter_does_not_cancel_the_others(self, cached):
+        cache, master, clock = cached
+
+        async def scenario():
+            master.gate = asyncio.Event()
+            leaving, staying = asyncio.create_task(_get(cache)), asyncio.create_task(_get(cache))
+            await asyncio.sleep(0.01)
+            leaving.cancel()
+            await asyncio.sleep(0.01)
+            master.gate.set()
+            with pytest.raises(asyncio.CancelledError):
+                await leaving
+            return await staying
+
+        assert _body(asyncio.run(scenario())) == "first"
+        assert (len(master.calls), master.cancelled) == (1, 0)
+
+    def test_all_waiters_cancelled_cancels_the_master_call(self, cached):
+        cache, master, clock = cached
+
+        async def scenario():
+            master.gate = asyncio.Event()
+            waiters = [asyncio.create_task(_get(cache)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            for w in waiters:
+                w.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            await asyncio.sleep(0.01)
+            cancelled, inflight = master.cancelled, dict(cache._inflight)
+            master.gate = None
+            return cancelled, inflight, await _get(cache)   # 之后的同 key 请求重新发起
+
+        cancelled, inflight, result = asyncio.run(scenario())
+        assert (cancelled, inflight) == (1, {})
+        assert _body(result) == "first" and len(master.calls) == 2
@@ -0,0 +1,140 @@
+"""core.ordering：历史分桶（失败 → flaky → 新/改动 → 按耗时）、改动检测与 fail_fast 提前停止"""
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from core.ordering import FLAKY, RECENT_FAILED, REST, build_plan
+from core.runner import TestRunner as Runner       # 别名：避免 pytest 当作测试类收集
+from core.storage import TestStorage as History
+from tests.test_runner import FakeExecutor
+
+pytest_plugins = ["pytester"]
+
+
+@pytest.fixture
+def history(tmp_path):
+    storage = History(str(tmp_path / "history.db"))
+    yield storage
+    storage.conn.close()
+
+
+def _save(storage, *tests):
+    storage.save({"tests": [{"nodeid": n, "outcome": o, "duration": d} for n, o, d in tests]})
+
+
+class TestBuildPlan:
+    def test_buckets_from_outcome_history(self, history):
+        # Arrange - 旧 → 新三次运行
+        _save(history, ("t::fails", "passed", 0.1), ("t::flips", "failed", 0.1), ("t::ok", "passed", 0.3))
+        _save(history, ("t::fails", "passed", 0.1), ("t::flips", "passed", 0.1), ("t::ok", "passed", 0.5))
+        _save(history, ("t::fails", "error", 0.1), ("t::flips", "passed", 0.1), ("t::ok", "skipped", 0.0),
+              ("t::skipped", "skipped", 0.0))
+        # Act
+        plan = build_plan(history)
+        # Assert - 跳过的运行不计入：t::ok 的平均耗时只算两次，从未执行过的用例不进计划（按新用例处理）
+        assert plan["tests"] == {
+            "t::fails": [RECENT_FAILED, 0.1],
+            "t::flips": [FLAKY, 0.1],
+            "t::ok": [REST, 0.4],
+        }
+        assert plan["since"] == datetime.fromisoformat(history.get_last()["timestamp"]).timestamp()
+
+    def test_window_limits_flaky_detection(self, history):
+        _save(history, ("t::a", "failed", 0.1))
+        for _ in range(3):
+            _save(history, ("t::a", "passed", 0.1))
+        assert build_plan(history, window=3)["tests"]["t::a"][0] == REST
+        assert build_plan(history, window=4)["tests"]["t::a"][0] == FLAKY
+
+
+# ── pytest 插件侧：--order-file 重排 ─────────────────────
+
+MODULE = '''
+def test_rest_slow():
+    pass
+
+
+def test_rest_fast():
+    pass
+
+
+def test_new():
+    pass
+
+
+def test_flaky():
+    pass
+
+
+def test_failed():
+    assert False
+'''
+
+
+def _plan(pytester, since: float, tests: dict) -> str:
+    path = pytester.path / "plan.json"
+    path.write_text(json.dumps({"tests": tests, "since": since}), encoding="utf-8")
+    return f"--order-file={path}"
+
+
+def _ran(reprec) -> list[str]:
+    return [r.nodeid.split("::")[-1] for r in reprec.getreports("pytest_runtest_logreport")
+            if r.when == "call"]
+
+
+@pytest.fixture
+def suite(pytester):
+    """两个内容相同的模块：test_old 在计划生成前修改过，test_changed 在之后"""
+    pytester.makepyfile(test_old=MODULE, test_changed=MODULE)
+    since = 1_000_000.0
+    os.utime(pytester.path / "test_old.py", (since - 60, since - 60))
+    os.utime(pytester.path / "test_changed.py", (since + 60, since + 60))
+    tests = {}
+    for module in ("test_old.py", "test_changed.py"):
+        tests[f"{module}::test_rest_slow"] = [REST, 2.0]
+        tests[f"{module}::test_rest_fast"] = [REST, 0.5]
+        tests[f"{module}::test_flaky"] = [FLAKY, 1.0]
+        tests[f"{module}::test_failed"] = [RECENT_FAILED, 3.0]
+    return _plan(pytester, since, tests)
+
+
+class TestOrderFile:
+    def test_bucket_order(self, pytester, suite):
+        # Act
+        reprec = pytester.inline_run("-p", "core.ordering", suite, "test_old.py")
+        # Assert - 失败 → flaky → 新用例 → 其余按平均耗时升序
+        assert _ran(reprec) == ["test_failed", "test_flaky", "test_new", "test_rest_fast", "test_rest_slow"]
+
+    def test_file_modified_after_plan_counts_as_changed(self, pytester, suite):
+        reprec = pytester.inline_run("-p", "core.ordering", suite)
+        ran = [r.nodeid for r in reprec.getreports("pytest_runtest_logreport") if r.when == "call"]
+        # test_changed.py 的"其余"用例提升到新/改动桶，排在未改动文件的"其余"用例之前；失败 / flaky 桶不受影响
+        assert ran == [
+            "test_changed.py::test_failed", "test_old.py::test_failed",
+            "test_changed.py::test_flaky", "test_old.py::test_flaky",
+            "test_changed.py::test_new", "test_old.py::test_new",
+            "test_changed.py::test_rest_fast", "test_changed.py::test_rest_slow",
+            "test_old.py::test_rest_fast", "test_old.py::test_rest_slow",
+        ]
+
+    def test_without_order_file_keeps_collection_order(self, pytester, suite):
+        reprec = pytester.inline_run("-p", "core.ordering", "test_old.py")
+        assert _ran(reprec) == ["test_rest_slow", "test_rest_fast", "test_new", "test_flaky", "test_failed"]
+
+    def test_recent_failure_first_stops_early_with_maxfail(self, pytester, suite):
+        reprec = pytester.inline_run("-p", "core.ordering", suite, "--maxfail=1", "test_old.py")
+        assert _ran(reprec) == ["test_failed"]
+        passed, skipped, failed = reprec.listoutcomes()
+        assert (len(passed), len(failed)) == (0, 1)
+
+
+class TestFailFast:
+    @pytest.mark.parametrize("fail_fast, expected", [(None, []), (1, ["--maxfail=1"]), (3, ["--maxfail=3"])])
+    def test_fail_fast_maps_to_maxfail(self, tmp_path, history, fail_fast, expected):
+        executor = FakeExecutor()
+        runner = Runner(str(tmp_path), storage=history, executor=executor, use_index=False)
+        runner.run("tests/", failure_first=True, fail_fast=fail_fast)
+        assert [a for a in executor.args if a.startswith("--maxfail")] == expected
+        assert any(a.startswith("--order-file=") for a in executor.args)
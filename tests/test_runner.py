@@ -0,0 +1,243 @@
+"""core.runner.TestRunner：执行结果归一化、临时文件清理、报告增量解析与 -v 输出进度事件"""
+import json
+from pathlib import Path
+
+import pytest
+
+from core import impact, runner as runner_mod
+from core.runner import TestRunner as Runner       # 别名：避免 pytest 当作测试类收集
+from core.storage import TestStorage as History
+
+pytest_plugins = ["pytester"]
+
+
+class FakeExecutor:
+    """WarmExecutor 替身：按 --json-report-file 写入报告，可选在写完部分报告后抛错"""
+
+    def __init__(self, report: dict = None, error: str = None):
+        self.report = report or {"summary": {"total": 1, "passed": 1}, "tests": []}
+        self.error = error
+        self.args = None
+
+    def run(self, args: list[str], on_line=None) -> int:
+        self.args = args
+        path = Path(next(a for a in args if a.startswith("--json-report-file=")).split("=", 1)[1])
+        if self.error:
+            path.write_text('{"summary": {', encoding="utf-8")      # 中途失败留下的半截报告
+            raise RuntimeError(self.error)
+        path.write_text(json.dumps(self.report), encoding="utf-8")
+        return 0
+
+
+@pytest.fixture
+def history(tmp_path):
+    storage = History(str(tmp_path / "history.db"))
+    yield storage
+    storage.conn.close()
+
+
+def _leftovers(report_dir: Path) -> list[str]:
+    return sorted(p.name for p in report_dir.iterdir() if p.name.startswith("."))
+
+
+class TestCleanup:
+    def test_executor_error_removes_order_and_partial_report(self, tmp_path, history):
+        # Arrange
+        executor = FakeExecutor(error="常驻执行进程异常: boom")
+        runner = Runner(str(tmp_path), storage=history, executor=executor, use_index=False)
+        # Act
+        result = runner.run("tests/", failure_first=True)
+        # Assert
+        assert result == {"error": "常驻执行进程异常: boom"}
+        assert any(a.startswith("--order-file=") for a in executor.args)
+        assert _leftovers(tmp_path) == []
+
+    def test_success_moves_report_to_last_json(self, tmp_path, history):
+        report = {"summary": {"total": 2, "passed": 1, "failed": 1}, "tests": [
+            {"nodeid": "t.py::a", "outcome": "passed", "call": {"duration": 0.1}},
+            {"nodeid": "t.py::b", "outcome": "failed",
+             "call": {"duration": 0.2, "longrepr": "AssertionError"}},
+        ]}
+        runner = Runner(str(tmp_path), storage=history, executor=FakeExecutor(report),
+                        use_index=False)
+        result = runner.run("tests/", failure_first=True)
+        assert (result["passed"], result["failed"], result["total"]) == (1, 1, 2)
+        assert [f["nodeid"] for f in result["failures"]] == ["t.py::b"]
+        assert (tmp_path / "last.json").exists()
+        assert _leftovers(tmp_path) == []
+
+
+class TestIndexFallback:
+    def test_empty_index_selection_still_runs_pytest(self, tmp_path, history):
+        # 索引漏收时不能伪造 exit 5 的空运行，原样交给 pytest
+        executor = FakeExecutor()
+        runner = Runner(str(tmp_path), storage=history, executor=executor, use_index=False)
+        runner.index = type("EmptyIndex", (), {"select": lambda self, **kw: []})()
+        result = runner.run("tests/", markers="slow")
+        assert result["total"] == 1 and result["exit_code"] == 0
+        assert executor.args[0] == "tests/" and executor.args[executor.args.index("-m") + 1] == "slow"
+
+
+class TestCoverageMap:
+    OLD = {"src/a.py": ["tests/unit/test_a.py::t1", "tests/api/test_b.py::t2"]}
+
+    @pytest.fixture
+    def runner(self, tmp_path, history, monkeypatch):
+        # 覆盖率运行走子进程：替身按命令行写报告与覆盖率文件，映射只含 unit 下运行过的用例
+        ran = ["tests/unit/test_a.py::t1"]
+
+        def stream(cmd, env, on_line):
+            report = next(a for a in cmd if a.startswith("--json-report-file=")).split("=", 1)[1]
+            Path(report).write_text(json.dumps({"summary": {"total": 1, "passed": 1}, "tests": [
+                {"nodeid": n, "outcome": "passed"} for n in ran]}), encoding="utf-8")
+            Path(env["COVERAGE_FILE"]).write_text("")
+            return 0
+
+        monkeypatch.setattr(Runner, "_stream", staticmethod(stream))
+        monkeypatch.setattr(impact, "build_coverage_map", lambda f: {"src/a.py": ran, "src/c.py": ran})
+        monkeypatch.setattr(impact, "head_revision", lambda: "rev2")
+        history.save_coverage_map(self.OLD, "rev1")
+        history.conn.execute("UPDATE coverage_meta SET updated_at = 1")
+        history.conn.commit()
+        return Runner(str(tmp_path), storage=history, use_index=False)
+
+    @pytest.mark.parametrize("kwargs", [{"path": "tests/unit"}, {"fail_fast": 1},
+                                        {"markers": "unit"}])
+    def test_partial_runs_only_replace_tests_that_ran(self, runner, history, kwargs):
+        # Act
+        runner.run(coverage=True, **kwargs)
+        # Assert - 没运行的 tests/api 用例保留，映射不因部分运行被标记为新鲜
+        assert history.get_covering_tests(["src/a.py", "src/c.py"]) == {
+            "src/a.py": ["tests/api/test_b.py::t2", "tests/unit/test_a.py::t1"],
+            "src/c.py": ["tests/unit/test_a.py::t1"],
+        }
+        assert history.get_coverage_meta()["revision"] == "rev1"
+
+    @pytest.mark.parametrize("path", ["tests/", "tests", "./tests"])
+    def test_full_suite_run_replaces_map(self, runner, history, path):
+        runner.run(path, coverage=True)
+        assert history.get_covering_tests(["src/a.py"]) == {"src/a.py": ["tests/unit/test_a.py::t1"]}
+        meta = history.get_coverage_meta()
+        assert meta["revision"] == "rev2" and meta["updated_at"] > 1
+
+
+class TestReadReport:
+    REPORT = {
+        "created": 1712345678.123456,
+        "exitcode": 12,
+        "root": "/tmp/中文 \\\"dir\\\"",
+        "summary": {"passed": 1, "failed": 1, "total": 2, "collected": 2},
+        "tests": [
+            {"nodeid": "t.py::test_a[x-1.5]", "outcome": "passed", "keywords": ["a"] * 50,
+             "setup": {"duration": 0.000123, "outcome": "passed"},
+             "call": {"duration": 1e-05, "outcome": "passed"},
+             "teardown": {"duration": 0.5, "outcome": "passed"}},
+            {"nodeid": "t.py::test_b", "outcome": "failed",
+             "call": {"duration": 3, "longrepr": "E   AssertionError: 中文 " + "x" * 2000}},
+        ],
+        "warnings": [],
+        "duration": 10,
+    }
+
+    @pytest.mark.parametrize("chunk", [1, 2, 3, 7, 64, 1 << 16])
+    @pytest.mark.parametrize("indent", [None, 2])
+    def test_values_split_across_chunks(self, tmp_path, monkeypatch, chunk, indent):
+        # Arrange - 数字、转义、多字节字符都可能被切在缓冲区边界上
+        monkeypatch.setattr(runner_mod, "_READ_CHUNK", chunk)
+        path = tmp_path / "report.json"
+        path.write_text(json.dumps(self.REPORT, ensure_ascii=False, indent=indent), encoding="utf-8")
+        # Act
+        report = Runner._read_report(path)
+        # Assert - 顶层字段原样保留，tests 逐个裁剪
+        assert report == {**self.REPORT, "tests": [Runner._slim_test(t) for t in self.REPORT["tests"]]}
+        assert report["exitcode"] == 12 and report["duration"] == 10
+        assert len(report["tests"][1]["call"]["longrepr"]) == 800
+
+    @pytest.mark.parametrize("text", ['{"tests": [{"nodeid": "t", "outcome": "passed"}', '{"summary": {',
+                                      '[]'])
+    def test_truncated_or_malformed_report_raises(self, tmp_path, monkeypatch, text):
+        monkeypatch.setattr(runner_mod, "_READ_CHUNK", 4)
+        path = tmp_path / "report.json"
+        path.write_text(text, encoding="utf-8")
+        with pytest.raises(ValueError):
+            Runner._read_report(path)
+
+
+class TestLineParser:
+    MODULE = '''
+import pytest
+
+
+def test_pass():
+    pass
+
+
+def test_fail():
+    assert False
+
+
+@pytest.mark.skip(reason="later")
+def test_skip():
+    pass
+
+
+@pytest.mark.xfail
+def test_xfail():
+    assert False
+
+
+@pytest.mark.xfail
+def test_xpass():
+    pass
+
+
+@pytest.mark.parametrize("v", ["a b", "c::d"])
+def test_param(v):
+    pass
+
+
+@pytest.fixture
+def broken():
+    raise OSError("no fixture")
+
+
+def test_error(broken):
+    pass
+'''
+
+    def test_events_from_real_verbose_output(self, pytester):
+        # Arrange - 真实 pytest -v 输出（含进度百分比、带空格 / :: 的参数化 id、汇总区的 FAILED 行）
+        pytester.makepyfile(test_mod=self.MODULE)
+        lines = pytester.runpytest("-v", "-rA", "-p", "no:cacheprovider").outlines
+        events = []
+        parse = Runner._line_parser(events.append)
+        # Act
+        for line in lines:
+            parse(line)
+        # Assert
+        tests = [e for e in events if e["type"] == "test"]
+        assert events[0] == {"type": "collected", "count": 8}
+        assert [(e["nodeid"], e["outcome"]) for e in tests] == [
+            ("test_mod.py::test_pass", "passed"),
+            ("test_mod.py::test_fail", "failed"),
+            ("test_mod.py::test_skip", "skipped"),
+            ("test_mod.py::test_xfail", "xfailed"),
+            ("test_mod.py::test_xpass", "xpassed"),
+            ("test_mod.py::test_param[a b]", "passed"),
+            ("test_mod.py::test_param[c::d]", "passed"),
+            ("test_mod.py::test_error", "error"),
+        ]
+        assert [e["progress"] for e in tests] == [12, 25, 37, 50, 62, 75, 87, 100]
+
+    @pytest.mark.parametrize("line, event", [
+        ("collected 1 item", {"type": "collected", "count": 1}),
+        ("collecting ... collected 120 items / 3 deselected / 117 selected",
+         {"type": "collected", "count": 120}),
+        ("t.py::test_x PASSED", {"type": "test", "nodeid": "t.py::test_x", "outcome": "passed"}),
+        ("============================= test session starts ==============================", None),
+        ("E       assert False", None),
+    ])
+    def test_single_lines(self, line, event):
+        events = []
+        Runner._line_parser(events.append)(line)
+        assert events == ([event] if event else [])
@@ -0,0 +1,108 @@
+"""master.core.sketch.DDSketch：分位数相对误差上界、合并与序列化"""
+import random
+from datetime import datetime
+
+import pytest
+
+from master.core import sketch
+from master.core.sketch import ALPHA, DDSketch
+
+QUANTILES = (0.0, 0.01, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 1.0)
+
+
+def _sketch(values) -> DDSketch:
+    sk = DDSketch()
+    for v in values:
+        sk.add(v)
+    return sk
+
+
+def _exact(values: list[float], q: float) -> float:
+    """与 DDSketch.quantile 相同的秩定义：排序后第 floor(q * (n - 1)) 个"""
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def _assert_within_alpha(sk: DDSketch, values: list[float], quantiles=QUANTILES):
+    for q in quantiles:
+        exact = _exact(values, q)
+        assert sk.quantile(q) == pytest.approx(exact, rel=ALPHA * (1 + 1e-9)), f"q={q}"
+
+
+_rng = random.Random(20260101)
+DISTRIBUTIONS = {
+    "uniform": [_rng.uniform(0.01, 2.0) for _ in range(5000)],
+    "lognormal": [_rng.lognormvariate(-2, 1.5) for _ in range(5000)],
+    "exponential": [_rng.expovariate(5) + 1e-4 for _ in range(5000)],
+    "pareto": [0.05 * _rng.paretovariate(1.2) for _ in range(5000)],
+    "constant": [0.123] * 100,
+    "bimodal": [0.01] * 900 + [30.0] * 100,
+}
+
+
+class TestQuantile:
+    @pytest.mark.parametrize("name", DISTRIBUTIONS)
+    def test_relative_error_bound(self, name):
+        values = DISTRIBUTIONS[name]
+        _assert_within_alpha(_sketch(values), values)
+
+    def test_estimates_stay_within_observed_range(self):
+        values = DISTRIBUTIONS["lognormal"]
+        sk = _sketch(values)
+        assert (sk.min, sk.max) == (min(values), max(values))
+        assert all(min(values) <= sk.quantile(q) <= max(values) for q in QUANTILES)
+
+    def test_empty_and_zero_bucket(self):
+        assert DDSketch().quantile(0.5) is None
+        sk = _sketch([0.0] * 6 + [1e-9] * 2 + [0.5] * 2)
+        assert (sk.count, sk.zero_count) == (10, 8)
+        assert sk.quantile(0.5) == 0.0
+        assert sk.quantile(1.0) == 0.5
+
+    def test_collapse_keeps_upper_quantiles_accurate(self):
+        # Arrange - 跨度 1e-6..1e12 超过 _MAX_BINS 个桶，最低的桶被合并
+        values = [10 ** (-6 + 18 * i / 4999) for i in range(5000)]
+        # Act
+        sk = _sketch(values)
+        # Assert
+        assert len(sk.bins) <= sketch._MAX_BINS
+        _assert_within_alpha(sk, values, quantiles=(0.5, 0.9, 0.95, 0.99, 1.0))
+
+
+class TestMergeAndBytes:
+    def test_merge_equals_single_sketch(self):
+        values = DISTRIBUTIONS["lognormal"]
+        parts = [_sketch(values[i::4]) for i in range(4)]
+        merged = parts[0]
+        for part in parts[1:]:
+            merged.merge(part)
+        whole = _sketch(values)
+        assert merged.bins == whole.bins
+        assert (merged.count, merged.min, merged.max) == (whole.count, whole.min, whole.max)
+        _assert_within_alpha(merged, values)
+
+    def test_merge_with_empty_keeps_bounds(self):
+        sk = _sketch([0.2, 0.4]).merge(DDSketch())
+        assert (sk.count, sk.min, sk.max) == (2, 0.2, 0.4)
+        assert DDSketch().merge(sk).quantile(1.0) == 0.4
+
+    def test_round_trip(self):
+        values = DISTRIBUTIONS["pareto"] + [0.0] * 3
+        sk = _sketch(values)
+        restored = DDSketch.from_bytes(sk.to_bytes())
+        assert restored.bins == sk.bins
+        assert (restored.count, restored.zero_count, restored.min, restored.max) == \
+            (sk.count, sk.zero_count, sk.min, sk.max)
+        assert [restored.quantile(q) for q in QUANTILES] == [sk.quantile(q) for q in QUANTILES]
+
+
+class TestWindowStart:
+    def test_aligned_to_window(self):
+        start = sketch.window_start("2026-01-01T10:59:59", 3600)
+        assert start % 3600 == 0
+        assert start == sketch.window_start("2026-01-01T10:00:00", 3600)
+
+    def test_future_timestamp_clamped_to_current_window(self):
+        past = sketch.window_start("2026-01-01T00:00:00", 3600)
+        future = sketch.window_start("2999-01-01T00:00:00", 3600)
+        assert past < future <= sketch.window_start(datetime.now().isoformat(), 3600)
@@ -0,0 +1,325 @@
+"""存储后端契约测试：sqlite 与 memory 两个引擎跑同一组用例，行为必须一致"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from master.core.backend import BACKENDS, open_backend
+
+WINDOW = 3600
+
+
+@pytest.fixture(params=BACKENDS)
+def storage(request, tmp_path):
+    backend = open_backend(request.param, str(tmp_path / "master.db"),
+                           sketch_window=WINDOW, sketch_retention=30)
+    yield backend
+    backend.close()
+
+
+def payload(run_id: str, worker_id: str = "w1", project: str = "p", branch: str = "main",
+            minute: int = 0, failures: list = (), tests: list = None) -> dict:
+    data = {
+        "run_id": run_id, "worker_id": worker_id, "project": project, "branch": branch,
+        "timestamp": f"2026-01-{1 + minute // 1440:02d}T{minute // 60 % 24:02d}:{minute % 60:02d}:00",
+        "passed": 1, "failed": len(failures), "total": 1 + len(failures),
+        "duration": 1.5, "pass_rate": 50.0,
+        "failures": [{"nodeid": n, "duration": 0.1, "message": m} for n, m in failures],
+    }
+    if tests is not None:
+        data["tests"] = [{"nodeid": n, "outcome": o, "duration": d} for n, o, d in tests]
+    return data
+
+
+class TestRuns:
+    def test_runs_newest_first_with_filters(self, storage):
+        # Arrange
+        storage.save_run(payload("r1", worker_id="w1", project="a"))
+        storage.save_run(payload("r2", worker_id="w2", project="b", branch="dev", minute=1))
+        storage.save_run(payload("r3", worker_id="w1", project="a", minute=2))
+        # Act / Assert
+        assert [r["run_id"] for r in storage.get_runs()] == ["r3", "r2", "r1"]
+        assert [r["run_id"] for r in storage.get_runs(project="a")] == ["r3", "r1"]
+        assert [r["run_id"] for r in storage.get_runs(branch="dev")] == ["r2"]
+        assert [r["run_id"] for r in storage.get_runs(project="", limit=1)] == ["r3"]
+        assert storage.get_runs(worker_id="nobody") == []
+
+    def test_get_run_keeps_failure_order_and_fields(self, storage):
+        storage.save_run(payload("r1", failures=[("t::z", "KeyError: 'x'"), ("t::a", "boom")]))
+        run = storage.get_run("r1")
+        assert run["failed"] == 2 and run["pass_rate"] == 50.0
+        assert [f["nodeid"] for f in run["failures"]] == ["t::z", "t::a"]
+        assert set(run["failures"][0]) == {"nodeid", "duration", "message", "cluster_id",
+                                           "exc_type", "location"}
+        assert storage.get_run("missing") is None
+
+    def test_resubmit_replaces_run_and_moves_it_last(self, storage):
+        storage.save_run(payload("r1", failures=[("t::a", "boom")]))
+        storage.save_run(payload("r2", minute=1))
+        version = storage.data_version
+        storage.save_run(payload("r1", failures=[("t::b", "bang")]))
+        assert storage.data_version != version
+        assert [r["run_id"] for r in storage.get_runs()] == ["r1", "r2"]
+        assert [f["nodeid"] for f in storage.get_run("r1")["failures"]] == ["t::b"]
+        assert storage.get_failure_stats() == [{"nodeid": "t::b", "fail_count": 1}]
+
+    def test_save_runs_is_all_or_nothing(self, storage):
+        with pytest.raises(KeyError):
+            storage.save_runs([payload("r1"), {"worker_id": "w1"}])
+        assert storage.get_runs() == []
+        assert storage.save_runs([payload("r1"), payload("r2")]) == ["r1", "r2"]
+
+    def test_failed_save_run_leaves_no_trace(self, storage):
+        # Arrange - r1 已入库；非法时间戳在写入 runs 之后（计算时延窗口时）才抛错
+        tests = [("t::a", "failed", 0.1), ("t::b", "passed", 0.2)]
+        storage.save_run(payload("r1", failures=[("t::a", "boom")], tests=tests))
+        before = (storage.get_run("r1"), storage.get_failure_stats(), storage.get_workers())
+        broken = [{**payload(run_id, worker_id="w2", failures=[("t::c", "bang")], tests=tests),
+                   "timestamp": "not-a-date"} for run_id in ("r2", "r1")]
+        # Act - 新 run 与覆盖已有 run 都失败
+        for run in broken:
+            with pytest.raises(ValueError):
+                storage.save_run(run)
+        # Assert - 两个引擎都没有留下任何部分写入，r1 原样保留
+        assert [r["run_id"] for r in storage.get_runs()] == ["r1"]
+        assert storage.get_run("r2") is None
+        assert (storage.get_run("r1"), storage.get_failure_stats(), storage.get_workers()) == before
+        assert storage.search_failures("bang")["total"] == 0
+        storage.save_run(payload("r2", minute=1, failures=[("t::c", "bang")], tests=tests))
+        assert [r["run_id"] for r in storage.get_runs()] == ["r2", "r1"]
+        assert storage.search_failures("bang")["total"] == 1
+
+    def test_previous_run_and_diff(self, storage):
+        tests = [("t::a", "passed", 0.1), ("t::b", "passed", 0.1)]
+        storage.save_run(payload("r1", failures=[("t::a", "e"), ("t::b", "e"), ("t::c", "e")]))
+        storage.save_run(payload("x", branch="dev", minute=1))
+        storage.save_run(payload("r2", minute=2, failures=[("t::c", "e"), ("t::d", "e")],
+                                 tests=tests + [("t::c", "failed", 0.1), ("t::d", "failed", 0.1)]))
+        assert storage.get_previous_run_id("r2") == "r1"
+        assert storage.get_previous_run_id("r1") is None
+        diff = storage.diff_runs("r1", "r2")
+        assert diff["new_failures"] == ["t::d"]
+        assert diff["still_failing"] == ["t::c"]
+        assert diff["fixed"] == ["t::a", "t::b"] and diff["removed"] == []
+        assert diff["counts"] == {"new_failures": 1, "fixed": 2, "still_failing": 1, "removed": 0}
+        assert storage.diff_runs("r1", "missing") is None
+
+    def test_trend_and_workers(self, storage):
+        storage.save_run(payload("r1", worker_id="w1"))
+        storage.save_run(payload("r2", worker_id="w2", minute=5))
+        storage.save_run(payload("r3", worker_id="w1", minute=9))
+        assert [t["worker_id"] for t in storage.get_trend(limit=2)] == ["w2", "w1"]
+        workers = storage.get_workers()
+        assert [(w["worker_id"], w["run_count"]) for w in workers] == [("w1", 2), ("w2", 1)]
+        assert workers[0]["last_seen"] == "2026-01-01T00:09:00"
+
+
+class TestDiff:
+    def test_fixed_vs_removed_depends_on_head_timings(self, storage):
+        # Arrange - t::a 在 head 中没有运行（被删除/被筛掉），t::b 运行且通过
+        storage.save_run(payload("r1", failures=[("t::a", "e"), ("t::b", "e"), ("t::z", "e")]))
+        storage.save_run(payload("r2", minute=1, tests=[("t::b", "passed", 0.1),
+                                                        ("t::c", "passed", 0.1)]))
+        # Act
+        diff = storage.diff_runs("r1", "r2")
+        # Assert - t::z 从未出现在任何耗时数据中，同样算 removed
+        assert diff["fixed"] == ["t::b"]
+        assert diff["removed"] == ["t::a", "t::z"]
+        assert diff["new_failures"] == [] and diff["still_failing"] == []
+        assert diff["counts"] == {"new_failures": 0, "fixed": 1, "still_failing": 0, "removed": 2}
+
+    def test_head_without_timings_treats_all_as_fixed(self, storage):
+        storage.save_run(payload("r1", failures=[("t::a", "e"), ("t::b", "e")]))
+        storage.save_run(payload("r2", minute=1, tests=[("t::a", "passed", 0.1)]))
+        storage.save_run(payload("r3", minute=2))
+        assert storage.diff_runs("r1", "r3")["fixed"] == ["t::a", "t::b"]
+        assert storage.diff_runs("r1", "r3")["removed"] == []
+
+    def test_duplicate_nodeids_and_self_diff(self, storage):
+        storage.save_run(payload("r1", failures=[("t::a", "e1"), ("t::a", "e2"), ("t::b", "e")]))
+        storage.save_run(payload("r2", minute=1, failures=[("t::b", "e"), ("t::b", "e")]))
+        diff = storage.diff_runs("r1", "r2")
+        assert diff["still_failing"] == ["t::b"] and diff["fixed"] == ["t::a"]
+        same = storage.diff_runs("r1", "r1")
+        assert same["still_failing"] == ["t::a", "t::b"]
+        assert same["counts"]["new_failures"] == same["counts"]["fixed"] == 0
+
+    def test_summaries_and_missing_base(self, storage):
+        storage.save_run(payload("r1", worker_id="w1", failures=[("t::a", "e")]))
+        storage.save_run(payload("r2", worker_id="w2", minute=1))
+        diff = storage.diff_runs("r1", "r2")
+        assert (diff["base"]["run_id"], diff["base"]["failed"]) == ("r1", 1)
+        assert (diff["head"]["run_id"], diff["head"]["worker_id"]) == ("r2", "w2")
+        assert storage.diff_runs("missing", "r2") is None
+
+    def test_previous_run_skips_other_project_and_resubmits(self, storage):
+        storage.save_run(payload("r1"))
+        storage.save_run(payload("o1", project="other", minute=1))
+        storage.save_run(payload("r2", minute=2))
+        storage.save_run(payload("r1", minute=3))           # 重新上报：排到最新
+        assert storage.get_previous_run_id("r2") is None
+        assert storage.get_previous_run_id("r1") == "r2"
+        assert storage.get_previous_run_id("missing") is None
+
+
+class TestFailures:
+    def test_failure_stats_ranked_with_nodeid_tiebreak(self, storage):
+        storage.save_run(payload("r1", project="a", failures=[("t::b", "e"), ("t::a", "e")]))
+        storage.save_run(payload("r2", project="b", failures=[("t::b", "e")]))
+        assert storage.get_failure_stats() == [{"nodeid": "t::b", "fail_count": 2},
+                                               {"nodeid": "t::a", "fail_count": 1}]
+        assert [s["nodeid"] for s in storage.get_failure_stats(project="a")] == ["t::a", "t::b"]
+        assert storage.get_failure_stats(project="a", limit=1) == [{"nodeid": "t::a", "fail_count": 1}]
+
+    def test_clusters_group_same_root_cause(self, storage):
+        storage.save_run(payload("r1", failures=[("t::a", "KeyError: 'x1'"), ("t::b", "KeyError: 'x2'"),
+                                                 ("t::c", "TimeoutError: after 5s")]))
+        storage.save_run(payload("r2", minute=1, failures=[("t::a", "KeyError: 'x3'")]))
+        clusters = storage.get_failure_clusters(sample=1)
+        assert [(c["members"], c["tests"], c["runs"]) for c in clusters] == [(3, 2, 2), (1, 1, 1)]
+        assert clusters[0]["normalized"] == "KeyError: <str>"
+        assert len(clusters[0]["nodeids"]) == 1
+        only_r2 = storage.get_failure_clusters(run_id="r2")
+        assert [(c["cluster_id"], c["members"]) for c in only_r2] == [(clusters[0]["cluster_id"], 1)]
+        assert storage.get_failure_clusters(since="2026-01-02T00:00:00") == []
+
+
+class TestSearch:
+    @pytest.fixture
+    def indexed(self, storage):
+        storage.save_run(payload("r1", project="a", failures=[
+            ("tests/test_net.py::test_get", "ConnectionResetError: connection reset by peer"),
+            ("tests/test_db.py::test_query", "AssertionError: assert 1 == 2"),
+            ("tests/test_math.py::test_div", "ZeroDivisionError: division by zero"),
+            ("tests/test_math.py::test_parse", "ValueError: invalid literal for int()"),
+        ]))
+        storage.save_run(payload("r2", project="b", minute=60, failures=[
+            ("tests/test_net.py::test_post", "TimeoutError: timed out; connection reset, reset again"),
+        ]))
+        return storage
+
+    @pytest.mark.parametrize("q, expected", [
+        ("connection", {"test_get", "test_post"}),
+        ('"reset by peer"', {"test_get"}),
+        ("time*", {"test_post"}),
+        ("assert OR timeouterror", {"test_query", "test_post"}),
+        ("connection NOT timeouterror", {"test_get"}),
+        ("(peer OR timed) AND test_net", {"test_get", "test_post"}),
+        ("test_db", {"test_query"}),
+        ("nothingmatches", set()),
+    ])
+    def test_query_syntax(self, indexed, q, expected):
+        result = indexed.search_failures(q)
+        assert {r["nodeid"].rsplit("::", 1)[1] for r in result["results"]} == expected
+        assert result["total"] == len(expected)
+
+    def test_invalid_syntax_falls_back_to_literal_terms(self, indexed):
+        result = indexed.search_failures("assert 1 == 2")
+        assert result["query"] == '"assert" "1" "==" "2"'
+        assert [r["nodeid"] for r in result["results"]] == ["tests/test_db.py::test_query"]
+        assert indexed.search_failures("peer ==")["total"] == 1
+
+    @pytest.mark.parametrize("q, literal, expected", [
+        ('"assert 1', '"""assert" "1"', {"test_query"}),           # 未闭合引号
+        ('1 == "2', '"1" "==" """2"', {"test_query"}),
+        ("int()", '"int()"', {"test_parse"}),
+        ("(peer", '"(peer"', {"test_get"}),                          # 未闭合括号
+        ("timed out;", '"timed" "out;"', {"test_post"}),
+        ("division AND", '"division" "AND"', set()),                # 运算符按字面词匹配
+        ("-", '"-"', set()),
+    ])
+    def test_fallback_quotes_each_term(self, indexed, q, literal, expected):
+        result = indexed.search_failures(q)
+        assert result["query"] == literal
+        assert {r["nodeid"].rsplit("::", 1)[1] for r in result["results"]} == expected
+        assert result["total"] == len(expected)
+
+    def test_fallback_keeps_filters_order_and_snippets(self, indexed):
+        # Act - "reset (" 为非法语法，退回字面词组；"(" 不产生词元，只剩 reset
+        ranked = indexed.search_failures("reset (")
+        recent = indexed.search_failures("reset (", order="recent", limit=1, offset=1)
+        filtered = indexed.search_failures("reset (peer", project="a")
+        # Assert
+        assert ranked["query"] == '"reset" "("'
+        assert [r["nodeid"] for r in ranked["results"]][0].endswith("test_post")   # 出现两次
+        assert recent["total"] == 2 and recent["results"][0]["run_id"] == "r1"
+        assert filtered["total"] == 1
+        assert filtered["results"][0]["snippet"] == "ConnectionResetError: connection [reset] by [peer]"
+        assert indexed.search_failures("reset (", project="b", until="2026-01-01T00:30:00")["total"] == 0
+
+    def test_rank_filters_and_paging(self, indexed):
+        ranked = indexed.search_failures("reset")
+        assert [r["nodeid"] for r in ranked["results"]][0].endswith("test_post")   # 出现两次
+        assert all(r["score"] < 0 for r in ranked["results"])
+        assert "[reset]" in ranked["results"][0]["snippet"]
+        recent = indexed.search_failures("connection", order="recent", limit=1, offset=1)
+        assert recent["total"] == 2 and recent["results"][0]["run_id"] == "r1"
+        assert indexed.search_failures("connection", project="b")["total"] == 1
+        assert indexed.search_failures("connection", since="2026-01-01T01:00:00")["total"] == 1
+        assert indexed.search_failures("connection", until="2026-01-01T01:00:00")["total"] == 1
+
+
+class TestTestStats:
+    def test_flaky_ranking(self, storage):
+        for i in range(6):
+            tests = [("t::flip", "failed" if i % 2 else "passed", 0.1),
+                     ("t::broken", "failed", 0.1), ("t::ok", "passed", 0.1)]
+            storage.save_run(payload(f"r{i}", minute=i, tests=tests))
+        flaky = storage.get_flaky(project="p", min_runs=3)
+        assert [(f["nodeid"], f["flips"], f["recent"]["history"]) for f in flaky] == \
+            [("t::flip", 5, "FPFPFP")]
+
+    def test_flaky_batch_resubmit_skips_and_project_filter(self, storage):
+        # Arrange - 同一序列：a 项目逐条上报（含一次重复上报），b 项目整批导入
+        seq = ["failed", "passed", "skipped", "failed", "passed", "error"]
+        runs = {p: [payload(f"{p}{i}", project=p, minute=i,
+                            tests=[("t::x", o, 0.1), ("t::ok", "passed", 0.1)])
+                    for i, o in enumerate(seq)] for p in ("a", "b")}
+        for run in runs["a"]:
+            storage.save_run(run)
+        storage.save_run(runs["a"][2])
+        storage.save_runs(runs["b"])
+        # Act
+        ranked = storage.get_flaky(min_runs=3)
+        # Assert - 跳过不计入、error 按失败计；重复上报不重复累加；两种写入方式结果一致
+        assert [(f["project"], f["nodeid"]) for f in ranked] == [("a", "t::x"), ("b", "t::x")]
+        assert {(f["runs"], f["fails"], f["flips"], f["recent"]["history"]) for f in ranked} == \
+            {(5, 3, 4, "FPFPF")}
+        assert [f["project"] for f in storage.get_flaky(project="b", min_runs=3)] == ["b"]
+        assert storage.get_flaky(min_runs=6) == []
+
+    def test_duration_stats_and_outcome_history(self, storage):
+        storage.save_run(payload("r1", tests=[("t::a", "passed", 1.0), ("t::b", "skipped", 0.0)]))
+        storage.save_run(payload("r2", minute=1, tests=[("t::a", "failed", 3.0)]))
+        stats = storage.get_duration_stats(project="p")
+        assert [(s["nodeid"], s["runs"], s["avg"], s["last"], s["fail_count"]) for s in stats] == \
+            [("t::a", 2, 2.0, 3.0, 1)]
+        assert storage.get_outcome_history(limit=1) == {"t::a": {"outcomes": ["failed"], "avg": 3.0}}
+
+    def test_slowdowns_compare_latest_window_with_baseline(self, storage):
+        for i in range(20):
+            minute = i * 6                      # 第一个窗口 0.1s，第二个窗口 1.0s，各 10 次
+            slow = 1.0 if minute >= 60 else 0.1
+            storage.save_run(payload(f"r{i}", minute=minute,
+                                     tests=[("t::slow", "passed", slow), ("t::same", "passed", 0.2)]))
+        result = storage.get_slowdowns(project="p", baseline_windows=1, min_count=3)
+        assert result["current_window"] == "2026-01-01T01:00:00"
+        assert [s["nodeid"] for s in result["slowdowns"]] == ["t::slow"]
+        assert result["slowdowns"][0]["ratio_p50"] == pytest.approx(10, rel=0.05)
+        assert storage.get_slowdowns(project="none")["slowdowns"] == []
+
+    def test_future_timestamp_does_not_prune_retained_windows(self, storage):
+        # Arrange - 最近两个窗口的正常上报，再来一次时钟偏快到 2999 年的上报
+        now = datetime.now()
+        for i in range(6):
+            at = now - timedelta(seconds=WINDOW * (1 if i < 3 else 0))
+            run = payload(f"r{i}", tests=[("t::slow", "passed", 0.1 if i < 3 else 1.0)])
+            storage.save_run({**run, "timestamp": at.isoformat(timespec="seconds")})
+        skewed = payload("future", tests=[("t::slow", "passed", 1.0)])
+        storage.save_run({**skewed, "timestamp": "2999-01-01T00:00:00"})
+        # Act
+        result = storage.get_slowdowns(project="p", baseline_windows=1, min_count=3)
+        # Assert - 基线窗口仍在，未来上报计入当前窗口
+        current = datetime.fromtimestamp(now.timestamp() // WINDOW * WINDOW)
+        assert result["current_window"] == current.isoformat(timespec="seconds")
+        assert [s["nodeid"] for s in result["slowdowns"]] == ["t::slow"]
+        assert result["slowdowns"][0]["current"]["count"] == 4
@@ -0,0 +1,76 @@
+"""core.timings：nodeid 驻留、列存打包 / 解包与汇总"""
+import sqlite3
+
+import pytest
+
+from core import timings
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.executescript(timings.SCHEMA)
+    yield conn
+    conn.close()
+
+
+def _save(conn, run_id: str, tests: list[dict]):
+    count, ids, outcomes, durations = timings.pack(conn, tests)
+    conn.execute("INSERT INTO run_timings VALUES (?, ?, ?, ?, ?)",
+                 (run_id, count, ids, outcomes, durations))
+
+
+def _rows(conn):
+    return conn.execute("SELECT * FROM run_timings ORDER BY rowid DESC").fetchall()
+
+
+class TestPack:
+    def test_round_trip(self, conn):
+        # Arrange
+        tests = [
+            {"nodeid": "t.py::a", "outcome": "passed", "duration": 0.25},
+            {"nodeid": "t.py::b", "outcome": "failed", "duration": 1.5},
+            {"nodeid": "t.py::c", "outcome": "xpassed", "duration": 0},
+        ]
+        # Act
+        count, ids, outcomes, durations = timings.pack(conn, tests)
+        test_ids, codes, values = timings.unpack(ids, outcomes, durations)
+        # Assert
+        assert count == 3
+        names = timings.resolve_ids(conn, test_ids)
+        assert [names[i] for i in test_ids] == ["t.py::a", "t.py::b", "t.py::c"]
+        assert [timings.OUTCOMES[c] for c in codes] == ["passed", "failed", "xpassed"]
+        assert list(values) == pytest.approx([0.25, 1.5, 0.0])
+
+    def test_unknown_outcome_and_missing_duration(self, conn):
+        outcomes, durations = timings.encode([{"nodeid": "x", "outcome": "weird"},
+                                              {"nodeid": "y", "duration": None}])
+        assert list(outcomes) == [timings.OUTCOME_CODES["error"]] * 2
+        assert list(durations) == [0.0, 0.0]
+
+    def test_intern_is_stable_and_lookup_does_not_insert(self, conn):
+        cache = {}
+        first = timings.intern_nodeids(conn, ["a", "b", "a"], cache)
+        second = timings.intern_nodeids(conn, ["b", "c"])
+        assert first[0] == first[2] and first[1] == second[0]
+        assert cache == {"a": first[0], "b": first[1]}
+        assert timings.lookup_ids(conn, ["c", "missing"]) == {"c": second[1]}
+        assert conn.execute("SELECT COUNT(*) FROM test_ids").fetchone()[0] == 3
+
+
+class TestSummaries:
+    def test_summarize_skips_skipped_and_counts_failures(self, conn):
+        _save(conn, "r1", [{"nodeid": "a", "outcome": "passed", "duration": 1.0},
+                           {"nodeid": "b", "outcome": "skipped", "duration": 0.0}])
+        _save(conn, "r2", [{"nodeid": "a", "outcome": "error", "duration": 3.0},
+                           {"nodeid": "b", "outcome": "passed", "duration": 0.5}])
+        stats = timings.summarize(conn, _rows(conn))
+        assert [(s["nodeid"], s["runs"], s["avg"], s["last"], s["fail_count"]) for s in stats] == \
+            [("a", 2, 2.0, 3.0, 1), ("b", 1, 0.5, 0.5, 0)]
+
+    def test_outcome_history_newest_first(self, conn):
+        _save(conn, "r1", [{"nodeid": "a", "outcome": "passed", "duration": 1.0}])
+        _save(conn, "r2", [{"nodeid": "a", "outcome": "failed", "duration": 2.0}])
+        assert timings.outcome_history(conn, _rows(conn)) == \
+            {"a": {"outcomes": ["failed", "passed"], "avg": 1.5}}
@@ -14,7 +14,8 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from core.collector import AsyncCollector, RunResult
+from core.collector import (AsyncCollector, RunResult, failure_from_report, record_report,
+                            tests_from_records)
 from core.storage import TestStorage
 from worker.reporter import WorkerReporter
 
@@ -26,6 +27,7 @@ BRANCH    = os.environ.get("BRANCH", "")
 
 _collector: AsyncCollector | None = None
 _session_start: float = 0.0
+_tests: dict[str, list] = {}   # nodeid → [outcome, duration]
 
 
 def _get_collector() -> AsyncCollector:
@@ -44,9 +46,16 @@ def pytest_sessionstart(session):
     _get_collector().start()
 
 
+def pytest_runtest_logreport(report):
+    record_report(_tests, report)
+
+
 def pytest_sessionfinish(session, exitstatus):
     duration = round(time.monotonic() - _session_start, 2)
     collector = _get_collector()
+    if session.config.option.collectonly:
+        collector.stop(timeout=15.0)    # collect-only 不是一次测试运行，不上报
+        return
 
     # 从 terminalreporter 获取统计
     tr_plugin = session.config.pluginmanager.get_plugin("terminalreporter")
@@ -58,14 +67,11 @@ def pytest_sessionfinish(session, exitstatus):
     skipped = len(stats.get("skipped", []))
     total   = passed + failed + error + skipped
 
+    # 只取 longrepr 引用，类型 / 位置 / 信息由后台线程按预算提取
     failures = []
     for r in stats.get("failed", []):
         try:
-            failures.append({
-                "nodeid":   r.nodeid,
-                "duration": round(getattr(r, "duration", 0) or 0, 3),
-                "message":  str(getattr(r, "longrepr", "") or "")[:800],
-            })
+            failures.append(failure_from_report(r))
         except Exception as e:
             logger.warning(f"conftest: 采集失败详情时出错: {e}")
 
@@ -78,6 +84,7 @@ def pytest_sessionfinish(session, exitstatus):
         duration=duration,
         pass_rate=round(passed / max(total, 1) * 100, 1),
         failures=failures,
+        tests=tests_from_records(_tests),
     )
     result.__dict__.update({
         "run_id":    str(uuid.uuid4()),
@@ -17,10 +17,16 @@ MASTER_URL  = os.environ.get("MASTER_URL", "http://localhost:8080")
 MAX_RETRIES = int(os.environ.get("WORKER_UPLOAD_RETRIES", "3"))
 TIMEOUT     = int(os.environ.get("WORKER_UPLOAD_TIMEOUT", "10"))
 RETRY_DELAY = float(os.environ.get("WORKER_UPLOAD_RETRY_DELAY", "2.0"))
+# Master 限流（429 / 503 + Retry-After）时最多等待的秒数
+MAX_RETRY_AFTER = float(os.environ.get("WORKER_UPLOAD_MAX_RETRY_AFTER", "60"))
 
 
 class UploadError(Exception):
-    """上报失败（已重试耗尽）"""
+    """上报失败（已重试耗尽）；retry_after 为 Master 要求的等待秒数（限流时）"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
 
 
 class WorkerReporter:
@@ -49,11 +55,13 @@ class WorkerReporter:
             except UploadError as e:
                 last_error = e
                 if attempt < MAX_RETRIES:
+                    # 被限流时按 Master 给出的 Retry-After 退避，而不是固定间隔立即重试
+                    delay = RETRY_DELAY if e.retry_after is None else min(e.retry_after, MAX_RETRY_AFTER)
                     logger.warning(
                         f"WorkerReporter: upload failed (attempt {attempt}/{MAX_RETRIES}), "
-                        f"retry in {RETRY_DELAY}s — {e}"
+                        f"retry in {delay}s — {e}"
                     )
-                    time.sleep(RETRY_DELAY)
+                    time.sleep(delay)
 
         logger.error(
             f"WorkerReporter: all {MAX_RETRIES} attempts failed, "
@@ -84,7 +92,8 @@ class WorkerReporter:
         except urllib.error.HTTPError as e:
             # HTTP 非 2xx（如 422 参数错误、500 服务端错误）
             raw_body = e.read().decode(errors="replace")[:200]
-            raise UploadError(f"HTTP {e.code}: {raw_body}") from e
+            retry_after = _retry_after(e.headers) if e.code in (429, 503) else None
+            raise UploadError(f"HTTP {e.code}: {raw_body}", retry_after) from e
         except urllib.error.URLError as e:
             # 网络不可达、DNS 失败、连接拒绝
             raise UploadError(f"网络错误: {e.reason}") from e
@@ -105,3 +114,12 @@ class WorkerReporter:
 
         run_id = data.get("run_id", "unknown")
         return run_id
+
+
+def _retry_after(headers) -> Optional[float]:
+    """解析 Retry-After（秒数形式；HTTP 日期形式不处理，退回固定间隔）"""
+    value = headers.get("Retry-After") if headers else None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None